@@ -0,0 +1,28 @@
+"""
+Gunicorn settings, read from the working directory.
+
+With PDF_PRELOAD=true the app, the views and their PDF/S3 backends are
+imported once in the master and workers are forked warm, instead of
+paying the imports on every start and every recycle (max_requests).
+Connections, threads and the S3 client are released before forking and
+recreated in each worker.
+"""
+
+import os
+
+
+preload_app = os.getenv("PDF_PRELOAD", "False").lower() in ("true", "1")
+
+
+def when_ready(server):
+    if preload_app:
+        from pdf_tools.utils.startup import warmup
+
+        warmup()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from pdf_tools.utils.startup import after_fork
+
+        after_fork()
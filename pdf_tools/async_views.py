@@ -0,0 +1,562 @@
+import asyncio
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework import status
+
+from pdf_tools.renderers import dumps
+from pdf_tools.utils.aio import iterate_in_executor, run_cpu, run_io
+from pdf_tools.utils.artifacts import (
+    combine_fingerprints,
+    fingerprint_files,
+    get_artifact_store,
+)
+from pdf_tools.utils.batch import iter_batch_results
+from pdf_tools.utils.cache import get_result_cache, make_cache_key
+from pdf_tools.utils.layout import extract_layout
+from pdf_tools.utils.render import render_pages
+from pdf_tools.utils.s3_utils import (
+    fingerprint_s3_file,
+    get_file_etag,
+    get_file_from_s3,
+)
+from pdf_tools.utils.search import get_indexed_document, search_pages
+from pdf_tools.utils.utils import (
+    collect_text_pages,
+    extract_text_from_pdf,
+    iter_image_files,
+    iter_split_files,
+    iter_text_from_pdf,
+    iter_text_from_result,
+    open_input_pdf,
+    open_split,
+)
+from pdf_tools.utils.zip_stream import stream_zip
+from pdf_tools.views import (
+    PDFBatchView,
+    PDFCompressView,
+    PDFExtractImagesView,
+    PDFExtractLayoutView,
+    PDFExtractTextView,
+    PDFMergeView,
+    PDFRenderView,
+    PDFSearchView,
+    PDFSplitView,
+    get_bool_param,
+    index_text_result,
+    ndjson_lines,
+)
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines, for running under ASGI.
+    Authentication, permissions and throttling run in a thread as in a
+    sync view. Handlers keep the event loop free by sending S3 requests to
+    the I/O executor and PyMuPDF/Ghostscript work to the CPU executor.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            # Uploads are written to disk while parsing, do it off the event loop
+            if request.content_type.startswith("multipart/"):
+                await run_io(getattr, request, "data")
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+async def ndjson_stream(pages, store=None):
+    """
+    Serialize pages produced on the CPU executor as newline-delimited JSON.
+    With `store`, the collected pages are passed to it once all were sent.
+    """
+    items = []
+    try:
+        async for item in iterate_in_executor("cpu", pages):
+            if store is not None:
+                items.append(item)
+            yield dumps(item) + b"\n"
+        if store is not None:
+            await sync_to_async(store)(collect_text_pages(items))
+    except Exception as e:
+        yield dumps({"error": str(e)}) + b"\n"
+
+
+def zip_stream_response(entries, filename):
+    """Async counterpart of `zip_response`"""
+    response = StreamingHttpResponse(
+        iterate_in_executor("cpu", stream_zip(entries)),
+        content_type="application/zip",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+class AsyncPDFExtractTextView(AsyncAPIView, PDFExtractTextView):
+    __doc__ = PDFExtractTextView.__doc__
+
+    async def post(self, request, *args, **kwargs):
+        file_key = request.data.get("fileKey")
+
+        # Check if the file is present in the request
+        if not file_key:
+            return Response(
+                {"error": "No file key provided"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            start_page, end_page, limit = self.get_options(request)
+            ocr_language = self.get_ocr_language(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        stream = self.wants_stream(request)
+        full_document = start_page == 1 and end_page is None and limit is None
+
+        try:
+            cache = get_result_cache()
+
+            # Key the cache by the S3 ETag so a hit skips the download too
+            fingerprint, pdf_file = await run_io(fingerprint_s3_file, file_key)
+
+            cache_key = make_cache_key(
+                "extract_text", fingerprint, **self.cache_params(ocr_language)
+            )
+            result = await run_io(cache.get, cache_key)
+
+            def store(full_result):
+                cache.set(cache_key, full_result)
+                index_text_result(fingerprint, full_result, file_key, pdf_file)
+
+            if result is not None:
+                pages = iter_text_from_result(result, start_page, end_page, limit)
+                if await sync_to_async(get_indexed_document)(fingerprint) is None:
+                    await sync_to_async(index_text_result)(
+                        fingerprint, result, file_key
+                    )
+            else:
+                if pdf_file is None:
+                    pdf_file = await run_io(get_file_from_s3, file_key)
+                pages = iter_text_from_pdf(
+                    pdf_file,
+                    start_page,
+                    end_page,
+                    limit,
+                    ocr_language,
+                    fingerprint,
+                )
+
+            if stream:
+                keep = result is None and full_document
+                return StreamingHttpResponse(
+                    ndjson_stream(pages, store if keep else None),
+                    content_type="application/x-ndjson",
+                )
+
+            if result is None or not full_document:
+                result = await run_cpu(collect_text_pages, pages)
+                if full_document:
+                    await sync_to_async(store)(result)
+
+            return Response({"data": result}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncPDFExtractLayoutView(AsyncAPIView, PDFExtractLayoutView):
+    __doc__ = PDFExtractLayoutView.__doc__
+
+    async def post(self, request, *args, **kwargs):
+        file_key = request.data.get("fileKey")
+
+        if not file_key:
+            return Response(
+                {"error": "No file key provided"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            unit = self.get_unit(request)
+            start_page, end_page, limit = self.get_options(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            pdf_file = await run_io(get_file_from_s3, file_key)
+            result = await run_cpu(
+                extract_layout, pdf_file, unit, start_page, end_page, limit
+            )
+            data = await run_cpu(self.serialize, request, result)
+            return Response({"data": data}, status=status.HTTP_200_OK)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncPDFSearchView(AsyncAPIView, PDFSearchView):
+    __doc__ = PDFSearchView.__doc__
+
+    async def get(self, request, *args, **kwargs):
+        return await self.search(request, request.query_params)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.search(request, request.data)
+
+    async def search(self, request, data):
+        try:
+            query, file_key, limit = self.get_options(data)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            document = None
+            if file_key:
+                fingerprint, pdf_file = await run_io(fingerprint_s3_file, file_key)
+                document = await sync_to_async(get_indexed_document)(fingerprint)
+                if document is None:
+                    if pdf_file is None:
+                        pdf_file = await run_io(get_file_from_s3, file_key)
+                    result = await run_cpu(extract_text_from_pdf, pdf_file)
+                    document = await sync_to_async(self.store_document)(
+                        fingerprint, result, file_key, pdf_file
+                    )
+
+            hits = await sync_to_async(search_pages)(
+                query, document.id if document else None, limit
+            )
+            return Response(
+                {"data": {"query": query, "total": len(hits), "results": hits}},
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncPDFRenderView(AsyncAPIView, PDFRenderView):
+    __doc__ = PDFRenderView.__doc__
+
+    async def get(self, request, *args, **kwargs):
+        return await self.render(request, request.query_params)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.render(request, request.data)
+
+    async def render(self, request, data):
+        file_key = data.get("fileKey")
+
+        if not file_key:
+            return Response(
+                {"error": "No file key provided"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            options = self.get_options(data)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            fingerprint, pdf_file = await run_io(fingerprint_s3_file, file_key)
+            # The document is only downloaded when a page is not cached yet,
+            # which is decided while rendering
+            result = await run_cpu(
+                render_pages,
+                fingerprint,
+                lambda: pdf_file or get_file_from_s3(file_key),
+                **options,
+            )
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        return self.render_response(data, result)
+
+
+class AsyncPDFExtractImagesView(AsyncAPIView, PDFExtractImagesView):
+    __doc__ = PDFExtractImagesView.__doc__
+
+    async def post(self, request, *args, **kwargs):
+        file_key = request.data.get("fileKey")
+
+        # Check if the file is present in the request
+        if not file_key:
+            return Response(
+                {"error": "No file key provided"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            min_width, min_height, formats = self.get_options(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if request.data.get("output") == "zip":
+            try:
+                pdf_file = await run_io(get_file_from_s3, file_key)
+            except Exception as e:
+                return Response(
+                    {"error": str(e)},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+            # Open before streaming: failures past this point cut the ZIP short
+            try:
+                doc = await run_cpu(open_input_pdf, pdf_file)
+            except ValueError as e:
+                return Response(
+                    {"error": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return zip_stream_response(
+                iter_image_files(doc, min_width, min_height, formats),
+                "images.zip",
+            )
+
+        try:
+            fingerprint, pdf_file = await run_io(fingerprint_s3_file, file_key)
+            result = await run_cpu(
+                self.get_artifact,
+                fingerprint,
+                lambda: pdf_file or get_file_from_s3(file_key),
+                min_width,
+                min_height,
+                formats,
+            )
+
+            if not result["images"]:
+                return Response(
+                    {"error": "PDF doesn't contain any image"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            return Response({"data": result}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncPDFMergeView(AsyncAPIView, PDFMergeView):
+    __doc__ = PDFMergeView.__doc__
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            pdf_files, file_keys, page_ranges = self.get_inputs(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if get_bool_param(request.data, "async"):
+            # Queuing only touches the database and media storage
+            return await sync_to_async(super().post)(request, *args, **kwargs)
+
+        try:
+            # S3 inputs are fingerprinted by ETag so a hit downloads nothing
+            etags = await asyncio.gather(
+                *(run_io(get_file_etag, file_key) for file_key in file_keys)
+            )
+            fingerprints = await run_cpu(fingerprint_files, pdf_files)
+            # S3 inputs of a miss are prefetched by `iter_files_from_s3`
+            # threads while the executor thread merges
+            result = await run_cpu(
+                get_artifact_store().get_or_create,
+                "merge",
+                combine_fingerprints(fingerprints + list(etags)),
+                functools.partial(self.merge, pdf_files, file_keys, page_ranges),
+                page_ranges=json.dumps(page_ranges),
+            )
+            return Response({"data": result}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncPDFSplitView(AsyncAPIView, PDFSplitView):
+    __doc__ = PDFSplitView.__doc__
+
+    async def post(self, request, *args, **kwargs):
+        pdf_file = request.FILES.get("pdfFile")
+
+        if not pdf_file:
+            return Response(
+                {"error": "No PDF file provided"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            options = self.get_options(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if get_bool_param(request.data, "async"):
+            # Queuing only touches the database and media storage
+            return await sync_to_async(super().post)(request, *args, **kwargs)
+
+        try:
+            if request.data.get("output") == "zip":
+                # Resolve the parts before streaming: failures past this
+                # point cut the ZIP short
+                doc, parts = await run_cpu(open_split, pdf_file, **options)
+                return zip_stream_response(
+                    iter_split_files(doc, parts), "pages.zip"
+                )
+
+            fingerprints = await run_cpu(fingerprint_files, [pdf_file])
+            result = await run_cpu(
+                get_artifact_store().get_or_create,
+                "split",
+                combine_fingerprints(fingerprints),
+                functools.partial(self.split, pdf_file, options),
+                **options,
+            )
+            return Response({"data": result}, status=status.HTTP_200_OK)
+        except ValueError as e:
+            # Options the document doesn't satisfy, or an unreadable upload
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncPDFCompressView(AsyncAPIView, PDFCompressView):
+    __doc__ = PDFCompressView.__doc__
+
+    async def post(self, request, *args, **kwargs):
+        pdf_file = request.FILES.get("pdfFile")
+
+        if not pdf_file:
+            return Response(
+                {"error": "No PDF file provided"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            compression_level = self.get_compression_level(request)
+            engine = self.get_engine(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if get_bool_param(request.data, "async"):
+            # Queuing only touches the database and media storage
+            return await sync_to_async(super().post)(request, *args, **kwargs)
+
+        try:
+            fingerprints = await run_cpu(fingerprint_files, [pdf_file])
+            # Ghostscript runs as a subprocess; the executor thread waits on
+            # it while holding one of the PDF_ASYNC_CPU_WORKERS slots
+            compressed_url = await run_cpu(
+                get_artifact_store().get_or_create,
+                "compress",
+                combine_fingerprints(fingerprints),
+                functools.partial(self.compress, pdf_file, compression_level, engine),
+                compression_level=compression_level,
+                engine=engine,
+            )
+
+            return Response({"data": compressed_url}, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncPDFBatchView(AsyncAPIView, PDFBatchView):
+    __doc__ = PDFBatchView.__doc__
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            operation, file_keys = self.get_inputs(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # The batch waits on downloads and the process pool, so it is
+        # driven from the I/O executor rather than the event loop
+        results = iter_batch_results(
+            operation, file_keys, on_result=self.on_result(operation)
+        )
+        return StreamingHttpResponse(
+            iterate_in_executor("io", ndjson_lines(results)),
+            content_type="application/x-ndjson",
+        )
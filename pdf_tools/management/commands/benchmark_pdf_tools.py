@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pdf_tools.utils.benchmark import (
+    CASES,
+    build_corpus,
+    corpus_digest,
+    find_regressions,
+    load_baseline,
+    machine_info,
+    run_benchmarks,
+    save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark extract-text, extract-images, split, merge and compress on "
+        "a synthetic corpus and compare the results with a saved baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help="Multiply the page count of every corpus document",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--cases",
+            nargs="+",
+            help="Only run cases whose name contains one of these, e.g. compress split/",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "benchmarks", "baseline.json"),
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Write the results to --baseline",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if a case regressed compared to --baseline",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Allowed slowdown over the baseline (0.25 = 25%%)",
+        )
+        parser.add_argument(
+            "--memory-threshold",
+            type=float,
+            default=0.5,
+            help="Allowed peak memory growth over the baseline (0.5 = 50%%)",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print results as JSON"
+        )
+
+    def handle(self, *args, **options):
+        cases = CASES
+        if options["cases"]:
+            cases = [
+                (operation, name)
+                for operation, name in CASES
+                if any(
+                    pattern in f"{operation}/{name}" for pattern in options["cases"]
+                )
+            ]
+            if not cases:
+                raise CommandError("No benchmark case matches --cases")
+
+        baseline = None
+        if options["check"]:
+            try:
+                baseline = load_baseline(options["baseline"])
+            except FileNotFoundError:
+                raise CommandError(
+                    f"No baseline at {options['baseline']}, run with --save-baseline first"
+                )
+            if baseline["scale"] != options["scale"]:
+                raise CommandError(
+                    f"Baseline was recorded with --scale {baseline['scale']}"
+                )
+
+        with tempfile.TemporaryDirectory(prefix="pdf-benchmark-") as directory:
+            corpus = build_corpus(os.path.join(directory, "corpus"), options["scale"])
+            media_root = os.path.join(directory, "media")
+
+            if baseline and baseline.get("corpus") != corpus_digest(corpus):
+                self.stderr.write(
+                    "Warning: the corpus changed since the baseline was saved"
+                )
+            if baseline and baseline.get("machine") != machine_info():
+                self.stderr.write(
+                    "Warning: the baseline was recorded on a different machine "
+                    f"or library version: {baseline.get('machine')}"
+                )
+
+            if not options["json"]:
+                self.stdout.write(
+                    f"{'case':<34} {'pages':>6} {'seconds':>9} "
+                    f"{'pages/s':>9} {'peak MB':>8}"
+                )
+
+            results = []
+            for result in run_benchmarks(
+                corpus, media_root, cases, options["repeat"]
+            ):
+                results.append(result)
+                if options["json"]:
+                    continue
+                if "skipped" in result:
+                    self.stdout.write(
+                        f"{result['case']:<34} skipped: {result['skipped']}"
+                    )
+                else:
+                    self.stdout.write(
+                        f"{result['case']:<34} {result['pages']:>6} "
+                        f"{result['seconds']:>9.3f} "
+                        f"{result['pages_per_second']:>9.1f} "
+                        f"{result['peak_rss_mb']:>8.1f}"
+                    )
+
+            if options["save_baseline"]:
+                save_baseline(options["baseline"], results, options["scale"], corpus)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        if options["save_baseline"]:
+            self.stdout.write(f"Baseline saved to {options['baseline']}")
+
+        if baseline:
+            regressions = find_regressions(
+                results,
+                baseline,
+                options["threshold"],
+                options["memory_threshold"],
+            )
+            if regressions:
+                raise CommandError(
+                    "Performance regressions:\n" + "\n".join(regressions)
+                )
+            self.stdout.write("No regressions against the baseline")
@@ -0,0 +1,89 @@
+import io
+import multiprocessing
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pdf_tools.utils.benchmark import build_text_document
+from pdf_tools.utils.files import SharedDocument
+from pdf_tools.utils.parallel import iter_text_parallel
+
+
+class Command(BaseCommand):
+    help = "Measure text extraction throughput for increasing worker counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            help="Worker counts to measure (default: 1, 2, 4... up to CPU count)",
+        )
+
+    def handle(self, *args, **options):
+        pages = options["pages"]
+        worker_counts = options["workers"] or self.default_worker_counts()
+        pdf_bytes = build_text_document(pages)
+
+        self.stdout.write(
+            f"{pages} pages, {len(pdf_bytes) / 1024 / 1024:.1f} MB, "
+            f"best of {options['repeat']}"
+        )
+        self.stdout.write(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+
+        baseline = None
+        for workers in worker_counts:
+            elapsed = self.measure(pdf_bytes, pages, workers, options["repeat"])
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f"{workers:>8} {elapsed:>9.3f} {pages / elapsed:>9.0f} "
+                f"{baseline / elapsed:>7.2f}x"
+            )
+
+    @staticmethod
+    def default_worker_counts():
+        cpus = os.cpu_count() or 1
+        counts = [1]
+        while counts[-1] * 2 <= cpus:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != cpus:
+            counts.append(cpus)
+        return counts
+
+    @staticmethod
+    def measure(pdf_bytes, pages, workers, repeat):
+        if workers == 1:
+            def run():
+                doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+                for page in doc:
+                    page.get_text()
+                doc.close()
+        else:
+            context = multiprocessing.get_context(settings.PDF_PARALLEL_START_METHOD)
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            # Start the workers before timing
+            list(pool.map(abs, range(workers)))
+
+            def run():
+                with SharedDocument(io.BytesIO(pdf_bytes)) as document:
+                    for _ in iter_text_parallel(document, 1, pages, workers, pool):
+                        pass
+
+        try:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+            return min(timings)
+        finally:
+            if workers != 1:
+                pool.shutdown()
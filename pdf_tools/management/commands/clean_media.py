@@ -0,0 +1,45 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pdf_tools.utils.janitor import run_janitor, sweep
+
+
+class Command(BaseCommand):
+    help = "Delete expired temporary files, outputs, finished jobs, artifacts and rendered pages and enforce the media quota"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep sweeping every PDF_JANITOR_INTERVAL seconds",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.PDF_JANITOR_INTERVAL or 300,
+            help="Seconds between sweeps with --loop",
+        )
+
+    def handle(self, *args, **options):
+        if not options["loop"]:
+            stats = sweep()
+            self.stdout.write(
+                f"Removed {stats['expired_files']} expired files, "
+                f"{stats['expired_jobs']} finished jobs, "
+                f"{stats['expired_artifacts']} artifacts, "
+                f"{stats['expired_renders']} rendered pages and "
+                f"{stats['quota_removed']} entries over quota "
+                f"({stats['freed_bytes']} bytes freed, "
+                f"{stats['total_bytes']} bytes in use)"
+            )
+            return
+
+        self.stdout.write(
+            f"Sweeping media every {options['interval']} seconds (Ctrl-C to stop)"
+        )
+        try:
+            run_janitor(threading.Event(), options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,111 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def send_request(url, method, body, timeout):
+    """Send one request; returns (status, seconds)"""
+    request = urllib.request.Request(url, data=body, method=method)
+    if body is not None:
+        request.add_header("Content-Type", "application/json")
+
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent requests to a running server and report throughput "
+        "and latency, e.g. to compare the WSGI and ASGI (PDF_ASYNC_VIEWS) "
+        "deployments under the same load"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "url", help="e.g. http://127.0.0.1:8000/api/v1/pdfs/extract-text/"
+        )
+        parser.add_argument("--method", default="POST")
+        parser.add_argument(
+            "--data",
+            help='JSON request body, e.g. \'{"fileKey": "uploads/sample.pdf"}\'',
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=50,
+            help="Requests in flight at any time",
+        )
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--timeout", type=float, default=120)
+        parser.add_argument(
+            "--json", action="store_true", help="Print results as JSON"
+        )
+
+    def handle(self, *args, **options):
+        body = None
+        if options["data"]:
+            try:
+                body = json.dumps(json.loads(options["data"])).encode("utf-8")
+            except ValueError as e:
+                raise CommandError(f"--data is not valid JSON: {e}")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            results = list(
+                executor.map(
+                    lambda _: send_request(
+                        options["url"], options["method"], body, options["timeout"]
+                    ),
+                    range(options["requests"]),
+                )
+            )
+        elapsed = time.perf_counter() - started
+
+        latencies = [seconds for _, seconds in results]
+        statuses = Counter(str(status) for status, _ in results)
+        report = {
+            "url": options["url"],
+            "requests": len(results),
+            "concurrency": options["concurrency"],
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(results) / elapsed, 1),
+            "statuses": dict(statuses),
+            "latency_ms": {
+                name: round(percentile(latencies, fraction) * 1000, 1)
+                for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+            },
+        }
+        report["latency_ms"]["max"] = round(max(latencies) * 1000, 1)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report['requests']} requests, concurrency {report['concurrency']}: "
+            f"{report['seconds']}s, {report['requests_per_second']} req/s"
+        )
+        self.stdout.write(
+            "latency ms: "
+            + ", ".join(f"{name} {value}" for name, value in report["latency_ms"].items())
+        )
+        self.stdout.write(f"statuses: {report['statuses']}")
@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pdf_tools.utils.startup import measure_import_times, summarize_import_times
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the import time of each module loaded at startup (python -X "
+        "importtime in a fresh interpreter), to track process start-up cost"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "modules",
+            nargs="*",
+            help="Modules to import after django.setup() (default: ROOT_URLCONF)",
+        )
+        parser.add_argument(
+            "--warm",
+            action="store_true",
+            help="Also import the lazily loaded backends, as the warmup hook does",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--top", type=int, default=30, help="Number of modules listed"
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            runs = [
+                measure_import_times(options["modules"], options["warm"])
+                for _ in range(max(options["repeat"], 1))
+            ]
+        except Exception as e:
+            raise CommandError(str(e))
+        modules, packages, total_ms = summarize_import_times(runs)
+
+        if options["json"]:
+            self.stdout.write(
+                json.dumps(
+                    {
+                        "total_ms": round(total_ms, 3),
+                        "packages": packages,
+                        "modules": modules,
+                    },
+                    indent=2,
+                )
+            )
+            return
+
+        self.stdout.write(f"{'module':<52} {'self ms':>9} {'cumul. ms':>10}")
+        for entry in modules[: options["top"]]:
+            self.stdout.write(
+                f"{entry['module']:<52} {entry['self_ms']:>9.1f} "
+                f"{entry['cumulative_ms']:>10.1f}"
+            )
+        self.stdout.write(f"\n{'package':<52} {'self ms':>9}")
+        for entry in packages[: options["top"]]:
+            self.stdout.write(f"{entry['package']:<52} {entry['self_ms']:>9.1f}")
+        self.stdout.write(f"\nTotal import time: {total_ms:.1f} ms")
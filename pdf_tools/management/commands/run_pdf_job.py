@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from pdf_tools.utils.jobs import execute_job
+
+
+class Command(BaseCommand):
+    help = "Execute a single claimed PDF job (used internally by run_pdf_workers)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("job_id")
+
+    def handle(self, *args, **options):
+        execute_job(options["job_id"])
@@ -0,0 +1,30 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pdf_tools.utils.janitor import start_janitor
+from pdf_tools.utils.jobs import run_worker_pool
+
+
+class Command(BaseCommand):
+    help = "Run the background worker pool for asynchronous compress/merge/split jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.PDF_JOBS_CONCURRENCY or os.cpu_count() or 1,
+            help="Maximum number of jobs running at the same time",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Starting {options['concurrency']} PDF job workers (Ctrl-C to stop)"
+        )
+        # Media cleanup runs alongside the workers
+        start_janitor()
+        try:
+            run_worker_pool(options["concurrency"])
+        except KeyboardInterrupt:
+            self.stdout.write("Waiting for running jobs to finish...")
@@ -0,0 +1,312 @@
+import json
+import logging
+import time
+import zlib
+
+import zstandard
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from pdf_tools.utils import metrics
+from pdf_tools.utils.aio import run_cpu
+
+logger = logging.getLogger("pdf_tools.requests")
+
+
+class RequestMetricsMiddleware:
+    """
+    Time every request, collect the stage spans recorded while it runs and
+    emit one structured (JSON) log line per request.
+    Streaming responses are finished once their body has been sent, so
+    their latency and spans cover the whole stream.
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        trace = metrics.RequestTrace(method=request.method)
+        token = metrics.activate_trace(trace)
+        try:
+            try:
+                response = self.get_response(request)
+            except Exception:
+                self.finish(request, trace, 500)
+                raise
+            return self.complete(request, trace, response)
+        finally:
+            metrics.end_trace(token)
+
+    async def __acall__(self, request):
+        trace = metrics.RequestTrace(method=request.method)
+        token = metrics.activate_trace(trace)
+        try:
+            try:
+                response = await self.get_response(request)
+            except Exception:
+                self.finish(request, trace, 500)
+                raise
+            return self.complete(request, trace, response)
+        finally:
+            metrics.end_trace(token)
+
+    def complete(self, request, trace, response):
+        if not response.streaming:
+            metrics.record(bytes_out=len(response.content))
+            self.finish(request, trace, response.status_code)
+        elif response.is_async:
+            response.streaming_content = self.astream(
+                request, trace, response.status_code, response.streaming_content
+            )
+        else:
+            response.streaming_content = self.stream(
+                request, trace, response.status_code, response.streaming_content
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trace = metrics.current_trace()
+        match = request.resolver_match
+        if trace is None or match is None:
+            return None
+
+        trace.endpoint = match.url_name or match.route
+        try:
+            metrics.record(bytes_in=int(request.META.get("CONTENT_LENGTH") or 0))
+        except ValueError:
+            pass
+        return None
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook
+        trace = metrics.current_trace()
+        if trace is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: trace.add_stage(
+                    "render", time.perf_counter() - started
+                )
+            )
+        return response
+
+    def stream(self, request, trace, status_code, content):
+        """Pass the body through with `trace` active while each chunk is produced"""
+        try:
+            iterator = iter(content)
+            while True:
+                token = metrics.activate_trace(trace)
+                try:
+                    chunk = next(iterator, None)
+                    if chunk is not None:
+                        metrics.record(bytes_out=len(chunk))
+                finally:
+                    metrics.end_trace(token)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            token = metrics.activate_trace(trace)
+            try:
+                self.finish(request, trace, status_code)
+            finally:
+                metrics.end_trace(token)
+
+    async def astream(self, request, trace, status_code, content):
+        """Async counterpart of `stream` for async streaming responses"""
+        try:
+            iterator = aiter(content)
+            while True:
+                token = metrics.activate_trace(trace)
+                try:
+                    chunk = await anext(iterator, None)
+                    if chunk is not None:
+                        metrics.record(bytes_out=len(chunk))
+                finally:
+                    metrics.end_trace(token)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            token = metrics.activate_trace(trace)
+            try:
+                self.finish(request, trace, status_code)
+            finally:
+                metrics.end_trace(token)
+
+    @staticmethod
+    def finish(request, trace, status_code):
+        seconds = metrics.observe_request(trace, status_code)
+        logger.info(
+            json.dumps(
+                {
+                    "event": "request",
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": trace.endpoint,
+                    "status": status_code,
+                    "duration_ms": round(seconds * 1000, 2),
+                    **trace.to_dict(),
+                    "max_rss_bytes": metrics.max_rss_bytes(),
+                }
+            )
+        )
+
+
+# Content types that are compressed already (prefixes)
+INCOMPRESSIBLE_TYPES = ("application/pdf", "application/zip", "image/")
+
+
+def new_compressor(encoding):
+    """
+    Return (compressobj, flush mode) for `encoding`; flushing with the mode
+    ends a block the client can decode without closing the stream
+    """
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=settings.PDF_RESPONSE_ZSTD_LEVEL)
+        return compressor.compressobj(), zstandard.COMPRESSOBJ_FLUSH_BLOCK
+    # wbits 31: deflate with a gzip header and trailer
+    compressor = zlib.compressobj(settings.PDF_RESPONSE_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor, zlib.Z_SYNC_FLUSH
+
+
+def compress_body(encoding, content):
+    with metrics.span("compress"):
+        compressor, _ = new_compressor(encoding)
+        return compressor.compress(content) + compressor.flush()
+
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the PDF_RESPONSE_ENCODINGS entry with the highest q-value in an
+    Accept-Encoding header (ties go to the earlier entry), or None
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in settings.PDF_RESPONSE_ENCODINGS:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with zstd or gzip, negotiated from the
+    request's Accept-Encoding (see `choose_encoding`).
+    Bodies smaller than PDF_RESPONSE_COMPRESSION_MIN_SIZE and content that
+    is compressed already (PDFs, ZIPs, images) are sent as is. Streaming
+    responses are compressed chunk by chunk and flushed after every chunk,
+    so NDJSON lines still reach the client as soon as they are produced.
+    Under ASGI whole bodies are compressed on the CPU executor.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        encoding = self.negotiate(request, response)
+        if encoding is None:
+            return response
+        if response.streaming:
+            return self.compress_stream(response, encoding)
+        return self.set_body(
+            response, encoding, compress_body(encoding, response.content)
+        )
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        encoding = self.negotiate(request, response)
+        if encoding is None:
+            return response
+        if response.streaming:
+            return self.compress_stream(response, encoding)
+        return self.set_body(
+            response, encoding, await run_cpu(compress_body, encoding, response.content)
+        )
+
+    @staticmethod
+    def negotiate(request, response):
+        """Encoding to compress `response` with, or None to send it as is"""
+        content_type = response.get("Content-Type", "")
+        if (
+            response.has_header("Content-Encoding")
+            or content_type.startswith(INCOMPRESSIBLE_TYPES)
+            or (
+                not response.streaming
+                and len(response.content) < settings.PDF_RESPONSE_COMPRESSION_MIN_SIZE
+            )
+        ):
+            return None
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+
+    @staticmethod
+    def set_body(response, encoding, body):
+        response.content = body
+        response["Content-Length"] = str(len(body))
+        response["Content-Encoding"] = encoding
+        return response
+
+    def compress_stream(self, response, encoding):
+        if response.is_async:
+            response.streaming_content = self.acompress(
+                encoding, response.streaming_content
+            )
+        else:
+            response.streaming_content = self.compress(
+                encoding, response.streaming_content
+            )
+        del response["Content-Length"]
+        response["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def compress(encoding, content):
+        compressor, flush_mode = new_compressor(encoding)
+        for chunk in content:
+            data = compressor.compress(chunk) + compressor.flush(flush_mode)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @staticmethod
+    async def acompress(encoding, content):
+        compressor, flush_mode = new_compressor(encoding)
+        async for chunk in content:
+            data = compressor.compress(chunk) + compressor.flush(flush_mode)
+            if data:
+                yield data
+        yield compressor.flush()
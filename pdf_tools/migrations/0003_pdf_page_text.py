@@ -0,0 +1,131 @@
+# Generated by Django 5.1.6 on 2026-10-17 02:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQLITE_FTS = [
+    # External-content FTS5 table over pdf_tools_pdfpagetext, kept in sync
+    # by triggers
+    """
+    CREATE VIRTUAL TABLE pdf_tools_pdfpagetext_fts USING fts5(
+        text, content='pdf_tools_pdfpagetext', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER pdf_tools_pdfpagetext_ai AFTER INSERT ON pdf_tools_pdfpagetext
+    BEGIN
+        INSERT INTO pdf_tools_pdfpagetext_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER pdf_tools_pdfpagetext_ad AFTER DELETE ON pdf_tools_pdfpagetext
+    BEGIN
+        INSERT INTO pdf_tools_pdfpagetext_fts(pdf_tools_pdfpagetext_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER pdf_tools_pdfpagetext_au AFTER UPDATE ON pdf_tools_pdfpagetext
+    BEGIN
+        INSERT INTO pdf_tools_pdfpagetext_fts(pdf_tools_pdfpagetext_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO pdf_tools_pdfpagetext_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS pdf_tools_pdfpagetext_au",
+    "DROP TRIGGER IF EXISTS pdf_tools_pdfpagetext_ad",
+    "DROP TRIGGER IF EXISTS pdf_tools_pdfpagetext_ai",
+    "DROP TABLE IF EXISTS pdf_tools_pdfpagetext_fts",
+]
+
+# Replaced in 0004: Django compiles SearchVector to a different expression
+# (regconfig cast, COALESCE), so PostgreSQL never used this index
+POSTGRES_FTS = [
+    """
+    CREATE INDEX pdf_tools_pdfpagetext_tsv
+    ON pdf_tools_pdfpagetext USING GIN (to_tsvector('english', text))
+    """,
+]
+
+POSTGRES_FTS_DROP = ["DROP INDEX IF EXISTS pdf_tools_pdfpagetext_tsv"]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pdf_tools", "0002_pdfjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pdfmetadata",
+            name="file_key",
+            field=models.CharField(blank=True, default="", max_length=1024),
+        ),
+        migrations.AddField(
+            model_name="pdfmetadata",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True,
+                help_text="Content hash (SHA-256, or the S3 ETag) identifying the document",
+                max_length=128,
+                null=True,
+                unique=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="pdfmetadata",
+            name="indexed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="PDFPageText",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("page_number", models.PositiveIntegerField()),
+                ("text", models.TextField()),
+                (
+                    "document",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pages",
+                        to="pdf_tools.pdfmetadata",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["document", "page_number"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("document", "page_number"), name="unique_document_page"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(
+            run_for_vendor({"sqlite": SQLITE_FTS, "postgresql": POSTGRES_FTS}),
+            run_for_vendor(
+                {"sqlite": SQLITE_FTS_DROP, "postgresql": POSTGRES_FTS_DROP}
+            ),
+        ),
+    ]
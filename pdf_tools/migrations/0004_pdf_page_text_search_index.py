@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Index name shared with 0003, whose index used a different expression
+INDEX_NAME = "pdf_tools_pdfpagetext_tsv"
+
+# The expression Django compiles `pdf_tools.utils.search.search_vector` to,
+# so PostgreSQL can use the index for the search query
+SEARCH_INDEX = (
+    f'CREATE INDEX "{INDEX_NAME}" ON "pdf_tools_pdfpagetext" '
+    "USING gin ((to_tsvector('english'::regconfig, COALESCE(\"text\", ''))))"
+)
+
+# The index created by 0003
+PREVIOUS_INDEX = (
+    f"CREATE INDEX {INDEX_NAME} ON pdf_tools_pdfpagetext "
+    "USING GIN (to_tsvector('english', text))"
+)
+
+
+def replace_index(create_sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+        schema_editor.execute(create_sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pdf_tools", "0003_pdf_page_text"),
+    ]
+
+    operations = [
+        migrations.RunPython(replace_index(SEARCH_INDEX), replace_index(PREVIOUS_INDEX)),
+    ]
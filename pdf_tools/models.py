@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 
@@ -9,6 +11,107 @@ class PDFMetadata(models.Model):
     text_extracted = models.BooleanField(default=False)
     images_extracted = models.PositiveIntegerField(default=0)
     merged_pdf = models.BooleanField(default=False)
+    fingerprint = models.CharField(
+        max_length=128,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Content hash (SHA-256, or the S3 ETag) identifying the document",
+    )
+    file_key = models.CharField(max_length=1024, blank=True, default="")
+    indexed_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.file_name
+
+
+class PDFPageText(models.Model):
+    """
+    Extracted text of one page, indexed for full-text search (FTS5 on
+    SQLite, a tsvector GIN index on PostgreSQL; see migrations 0003 and 0004)
+    """
+
+    document = models.ForeignKey(
+        PDFMetadata, on_delete=models.CASCADE, related_name="pages"
+    )
+    page_number = models.PositiveIntegerField()
+    text = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["document", "page_number"], name="unique_document_page"
+            )
+        ]
+        ordering = ["document", "page_number"]
+
+    def __str__(self):
+        return f"{self.document} page {self.page_number}"
+
+
+class PDFJob(models.Model):
+    """A compress/merge/split request executed by the background workers"""
+
+    OPERATION_COMPRESS = "compress"
+    OPERATION_MERGE = "merge"
+    OPERATION_SPLIT = "split"
+    OPERATION_CHOICES = [
+        (OPERATION_COMPRESS, "Compress"),
+        (OPERATION_MERGE, "Merge"),
+        (OPERATION_SPLIT, "Split"),
+    ]
+
+    STATE_QUEUED = "queued"
+    STATE_RUNNING = "running"
+    STATE_SUCCEEDED = "succeeded"
+    STATE_FAILED = "failed"
+    STATE_CHOICES = [
+        (STATE_QUEUED, "Queued"),
+        (STATE_RUNNING, "Running"),
+        (STATE_SUCCEEDED, "Succeeded"),
+        (STATE_FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    operation = models.CharField(max_length=16, choices=OPERATION_CHOICES)
+    state = models.CharField(
+        max_length=16, choices=STATE_CHOICES, default=STATE_QUEUED, db_index=True
+    )
+    params = models.JSONField(default=dict, blank=True)
+    input_paths = models.JSONField(default=list, blank=True)
+    progress = models.PositiveIntegerField(
+        default=0, help_text="Pages processed so far"
+    )
+    total = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Pages to process, if known"
+    )
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    worker = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.operation} job {self.id} ({self.state})"
+
+    def to_dict(self):
+        return {
+            "id": str(self.id),
+            "operation": self.operation,
+            "state": self.state,
+            "progress": self.progress,
+            "total": self.total,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error or None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
@@ -0,0 +1,84 @@
+import json
+
+import msgpack
+import orjson
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Types orjson does not serialize natively (lazy strings, querysets, ...)
+# and datetimes (so they keep DRF's format) go through DRF's encoder
+_encoder = JSONEncoder()
+_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_SERIALIZE_NUMPY
+)
+
+
+def dumps(data, indent=False):
+    """Serialize `data` to compact UTF-8 JSON bytes with orjson"""
+    option = _OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS
+    return orjson.dumps(data, default=_encoder.default, option=option)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer on orjson: same output for API data, several
+    times faster on large results such as extracted text and layouts.
+    Any requested indent is rendered as two spaces.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps(data, indent=bool(indent))
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Render newline-delimited JSON.
+    Streaming views bypass the renderer and write their own lines; this
+    makes `Accept: application/x-ndjson` negotiable and renders plain
+    responses (such as errors) as a single line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return dumps(data) + b"\n"
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Render pre-formatted Prometheus text exposition output as is"""
+
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return (json.dumps(data) + "\n").encode(self.charset)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Render MessagePack. Bytes values are kept as binary, so columnar
+    payloads travel without any text encoding.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, use_bin_type=True)
@@ -1,3 +1,1802 @@
-from django.test import TestCase
+import functools
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+import zlib
 
-# Create your tests here.
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import boto3
+import msgpack
+import numpy as np
+import pymupdf
+import zstandard
+
+from django.conf import settings
+from django.http.multipartparser import MultiPartParser
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import (
+    BOUNDARY,
+    MULTIPART_CONTENT,
+    AsyncRequestFactory,
+    encode_multipart,
+)
+from django.utils import timezone
+from moto import mock_aws
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from pdf_tools.async_views import (
+    AsyncPDFExtractImagesView,
+    AsyncPDFSearchView,
+    AsyncPDFSplitView,
+)
+from pdf_tools.middleware import choose_encoding
+from pdf_tools.models import PDFJob
+from pdf_tools.renderers import ORJSONRenderer
+from pdf_tools.upload_handlers import PDFUpload, PDFUploadHandler, UploadRejected
+from pdf_tools.utils import (
+    aio,
+    artifacts,
+    benchmark,
+    cache,
+    jobs,
+    lazy,
+    metrics,
+    ocr,
+    render,
+    s3_utils,
+    search,
+    startup,
+)
+from pdf_tools.utils.batch import iter_batch_results
+from pdf_tools.utils.cache import write_file
+from pdf_tools.utils.files import SharedDocument, SpooledPDF, get_shared_dir
+from pdf_tools.utils.janitor import sweep
+from pdf_tools.utils.layout import (
+    extract_layout,
+    layout_to_binary,
+    layout_to_json,
+)
+from pdf_tools.utils.parallel import (
+    _is_usable,
+    get_process_pool,
+    iter_text_parallel,
+    partition_pages,
+    should_parallelize,
+    shutdown_process_pool,
+)
+from pdf_tools.utils.search import index_document
+from pdf_tools.utils.s3_utils import get_file_from_s3
+from pdf_tools.utils.split import chunk_page_ranges, parse_page_ranges
+from pdf_tools.utils.utils import iter_text_from_pdf, resolve_page_range
+from pdf_tools.utils.zip_stream import stream_zip
+
+TEST_BUCKET = "pdf-tools-test"
+TEST_REGION = "us-east-1"
+
+
+def make_pdf(pages=1):
+    doc = pymupdf.open()
+    for _ in range(pages):
+        doc.new_page()
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def named_file(data, name="test.pdf"):
+    file = io.BytesIO(data)
+    file.name = name
+    return file
+
+
+def make_text_pdf(*texts):
+    """PDF with one page per text"""
+    doc = pymupdf.open()
+    for text in texts:
+        doc.new_page().insert_text((72, 72), text)
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def make_image_pdf(pages=1):
+    """PDF showing the same PNG on every page"""
+    pixmap = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, 8, 8), False)
+    pixmap.set_rect(pixmap.irect, (255, 0, 0))
+    image = pixmap.tobytes("png")
+    doc = pymupdf.open()
+    for _ in range(pages):
+        doc.new_page().insert_image(pymupdf.Rect(72, 72, 144, 144), stream=image)
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def make_scanned_pdf(*texts):
+    """PDF whose pages are text, or a full-page image for None (a scan)"""
+    pixmap = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, 8, 8), False)
+    pixmap.set_rect(pixmap.irect, (200, 200, 200))
+    image = pixmap.tobytes("png")
+    doc = pymupdf.open()
+    for text in texts:
+        page = doc.new_page()
+        if text is None:
+            page.insert_image(page.rect, stream=image)
+        else:
+            page.insert_text((72, 72), text)
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def spooled(data):
+    pdf_file = SpooledPDF()
+    pdf_file.write(data)
+    pdf_file.seek(0)
+    return pdf_file
+
+
+class IsolatedStorageMixin:
+    """
+    Point MEDIA_ROOT and the result cache at a temporary directory and
+    start every test with fresh process-wide caches and stores
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        result_cache = dict(settings.PDF_RESULT_CACHE)
+        result_cache.update(
+            BACKENDS=["memory"], DIR=os.path.join(self.media_root, "cache")
+        )
+        overrides = override_settings(
+            MEDIA_ROOT=self.media_root, PDF_RESULT_CACHE=result_cache
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        for module, name in (
+            (cache, "_result_cache"),
+            (artifacts, "_artifact_store"),
+            (render, "_render_cache"),
+        ):
+            patcher = mock.patch.object(module, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class LayoutTests(SimpleTestCase):
+    def setUp(self):
+        self.result = extract_layout(
+            spooled(make_text_pdf("héllo wörld", "second page")), end_page=1
+        )
+
+    def test_words_are_columnar(self):
+        self.assertEqual((self.result["pages"], self.result["next_cursor"]), (1, None))
+        page = self.result["content"][0]
+        self.assertEqual(page["count"], 2)
+        self.assertEqual(page["text"], "héllowörld".encode("utf-8"))
+        self.assertEqual(page["offsets"].tolist(), [0, 6, 12])
+        self.assertEqual(page["word"].tolist(), [0, 1])
+        self.assertTrue((page["x0"] < page["x1"]).all())
+
+    def test_json_offsets_count_characters(self):
+        page = layout_to_json(self.result)["content"][0]
+        self.assertEqual(page["text"], "héllowörld")
+        self.assertEqual(page["offsets"], [0, 5, 10])
+        self.assertEqual(page["x0"][0], round(self.result["content"][0]["x0"][0], 2))
+
+    def test_binary_columns(self):
+        binary = layout_to_binary(self.result)
+        page = binary["content"][0]
+        self.assertEqual(binary["dtypes"]["x0"], "<f4")
+        self.assertEqual(
+            np.frombuffer(page["offsets"], binary["dtypes"]["offsets"]).tolist(),
+            [0, 6, 12],
+        )
+        np.testing.assert_array_equal(
+            np.frombuffer(page["y1"], binary["dtypes"]["y1"]),
+            self.result["content"][0]["y1"],
+        )
+
+    def test_blocks_and_bad_units(self):
+        result = extract_layout(spooled(make_text_pdf("one block")), "blocks")
+        self.assertEqual(result["content"][0]["type"].tolist(), [0])
+        with self.assertRaises(ValueError):
+            extract_layout(spooled(make_pdf(1)), "lines")
+
+
+@override_settings(AWS_S3_ENDPOINT_URL=None)
+class LayoutViewTests(TestCase):
+    def post(self, **headers):
+        with mock.patch(
+            "pdf_tools.views.get_file_from_s3",
+            return_value=spooled(make_text_pdf("two words")),
+        ):
+            return self.client.post(
+                "/api/v1/pdfs/extract-layout/", {"fileKey": "docs/a.pdf"}, **headers
+            )
+
+    def test_msgpack(self):
+        response = self.post(HTTP_ACCEPT="application/msgpack")
+
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        data = msgpack.unpackb(response.content)["data"]
+        page = data["content"][0]
+        self.assertEqual(page["text"], b"twowords")
+        words = np.frombuffer(page["word"], data["dtypes"]["word"])
+        self.assertEqual(words.tolist(), [0, 1])
+
+    def test_json(self):
+        page = self.post().json()["data"]["content"][0]
+        self.assertEqual((page["text"], page["offsets"]), ("twowords", [0, 3, 8]))
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_memory_cache_is_bounded(self):
+        memory = cache.MemoryCache(max_entries=2, max_bytes=10, ttl=None)
+        memory.set("a", b"1234")
+        memory.set("b", b"1234")
+        memory.get("a")
+        memory.set("c", b"1234")
+
+        self.assertIsNone(memory.get("b"))
+        self.assertEqual(memory.get("a"), b"1234")
+        memory.set("d", b"123456")
+        self.assertEqual(memory.stats(), {"entries": 2, "bytes": 10})
+
+    def test_entries_expire(self):
+        memory = cache.MemoryCache(max_entries=10, max_bytes=100, ttl=60)
+        disk = cache.DiskCache(self.directory, max_bytes=100, ttl=60)
+        for tier in (memory, disk):
+            tier.set("a", b"payload")
+
+        later = time.time() + 61
+        with mock.patch("pdf_tools.utils.cache.time.time", return_value=later):
+            self.assertIsNone(memory.get("a"))
+            self.assertIsNone(disk.get("a"))
+        self.assertEqual(disk.stats()["entries"], 0)
+
+    def test_disk_cache_evicts_least_recently_used(self):
+        disk = cache.DiskCache(self.directory, max_bytes=20, ttl=None)
+        disk.set("a", b"x" * 8)
+        disk.set("b", b"x" * 8)
+        os.utime(disk._path("b"), (time.time() - 60, time.time()))
+        disk.set("c", b"x" * 8)
+
+        self.assertIsNone(disk.get("b"))
+        self.assertIsNotNone(disk.get("a"))
+        self.assertEqual(disk._size, 16)
+
+    def test_hits_are_copied_to_faster_tiers(self):
+        memory = cache.MemoryCache(max_entries=10, max_bytes=1000, ttl=None)
+        disk = cache.DiskCache(self.directory, max_bytes=1000, ttl=None)
+        disk.set("key", b'{"pages": 1}')
+        result_cache = cache.ResultCache([memory, disk])
+
+        self.assertEqual(result_cache.get("key"), {"pages": 1})
+        self.assertEqual(memory.get("key"), b'{"pages": 1}')
+        self.assertIsNone(result_cache.get("missing"))
+        stats = result_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_cache_key_ignores_parameter_order(self):
+        self.assertEqual(
+            cache.make_cache_key("op", "etag", a=1, b=2),
+            cache.make_cache_key("op", "etag", b=2, a=1),
+        )
+        self.assertNotEqual(
+            cache.make_cache_key("op", "etag", a=1),
+            cache.make_cache_key("op", "etag", a=2),
+        )
+
+
+@override_settings(AWS_S3_ENDPOINT_URL=None)
+class ExtractTextCacheTests(IsolatedStorageMixin, TestCase):
+    def extract(self, **params):
+        return self.client.post(
+            "/api/v1/pdfs/extract-text/", {"fileKey": "docs/a.pdf", **params}
+        )
+
+    def test_hit_skips_the_download(self):
+        data = make_text_pdf("first page", "second page")
+        with mock.patch(
+            "pdf_tools.views.fingerprint_s3_file", return_value=("etag-1", None)
+        ), mock.patch(
+            "pdf_tools.views.get_file_from_s3", side_effect=lambda key: spooled(data)
+        ) as download:
+            first = self.extract()
+            second = self.extract()
+            pages = self.extract(startPage="2")
+
+        self.assertEqual(download.call_count, 1)
+        self.assertEqual(first.json(), second.json())
+        self.assertIn("second page", first.json()["data"]["content"]["page_2"])
+        self.assertEqual(list(pages.json()["data"]["content"]), ["page_2"])
+        self.assertEqual(cache.get_result_cache().stats()["hits"], 2)
+
+
+@override_settings(AWS_S3_ENDPOINT_URL=None)
+class GetFileFromS3Tests(SimpleTestCase):
+    def setUp(self):
+        self.aws = mock_aws()
+        self.aws.start()
+        self.addCleanup(self.aws.stop)
+
+        for name, value in (
+            ("S3_BUCKET", TEST_BUCKET),
+            ("AWS_REGION", TEST_REGION),
+            ("AWS_ACCESS_KEY_ID", "testing"),
+            ("AWS_SECRET_ACCESS_KEY", "testing"),
+        ):
+            patcher = mock.patch.object(s3_utils, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        s3_utils.reset_s3_client()
+        self.addCleanup(s3_utils.reset_s3_client)
+        self.client = boto3.client("s3", region_name=TEST_REGION)
+        self.client.create_bucket(Bucket=TEST_BUCKET)
+
+    def put(self, key, data):
+        self.client.put_object(Bucket=TEST_BUCKET, Key=key, Body=data)
+
+    def get_object_calls(self, file_key):
+        """get_file_from_s3 with the shared client's get_object recorded"""
+        s3_client = s3_utils.get_s3_client()
+        with mock.patch.object(
+            s3_client, "get_object", wraps=s3_client.get_object
+        ) as get_object:
+            pdf_file = get_file_from_s3(file_key)
+        self.addCleanup(pdf_file.close)
+        return pdf_file, [call.kwargs["Range"] for call in get_object.call_args_list]
+
+    def test_single_part(self):
+        data = os.urandom(64 * 1024)
+        self.put("docs/small.pdf", data)
+
+        pdf_file, ranges = self.get_object_calls("docs/small.pdf")
+
+        self.assertEqual(ranges, [f"bytes=0-{settings.S3_MULTIPART_CHUNKSIZE - 1}"])
+        self.assertTrue(pdf_file.in_memory)
+        self.assertEqual(pdf_file.read(), data)
+
+    @override_settings(
+        S3_MULTIPART_CHUNKSIZE=100 * 1024,
+        S3_MULTIPART_THRESHOLD=100 * 1024,
+        S3_TRANSFER_CONCURRENCY=3,
+    )
+    def test_ranged_multipart(self):
+        data = os.urandom(350 * 1024)
+        self.put("docs/large.pdf", data)
+
+        pdf_file, ranges = self.get_object_calls("docs/large.pdf")
+
+        self.assertEqual(ranges[0], f"bytes=0-{100 * 1024 - 1}")
+        self.assertCountEqual(
+            ranges[1:],
+            [
+                f"bytes={100 * 1024}-{200 * 1024 - 1}",
+                f"bytes={200 * 1024}-{300 * 1024 - 1}",
+                f"bytes={300 * 1024}-{350 * 1024 - 1}",
+            ],
+        )
+        self.assertEqual(pdf_file.read(), data)
+
+    @override_settings(PDF_SPOOL_MAX_MEMORY=16 * 1024, S3_MULTIPART_CHUNKSIZE=32 * 1024)
+    def test_spill_to_disk(self):
+        data = os.urandom(100 * 1024)
+        self.put("docs/spilled.pdf", data)
+
+        pdf_file, _ = self.get_object_calls("docs/spilled.pdf")
+
+        self.assertFalse(pdf_file.in_memory)
+        self.assertTrue(os.path.exists(pdf_file.path))
+        with open(pdf_file.path, "rb") as spilled:
+            self.assertEqual(spilled.read(), data)
+        self.assertEqual(pdf_file.read(), data)
+
+        path = pdf_file.path
+        pdf_file.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_missing_key(self):
+        with self.assertRaisesMessage(Exception, "Failed to fetch file from S3"):
+            get_file_from_s3("docs/missing.pdf")
+
+    def test_client_is_shared_across_threads(self):
+        with ThreadPoolExecutor(4) as executor:
+            clients = set(
+                map(id, executor.map(lambda _: s3_utils.get_s3_client(), range(8)))
+            )
+        self.assertEqual(len(clients), 1)
+        self.assertEqual(
+            s3_utils.get_s3_client().meta.config.max_pool_connections,
+            settings.S3_MAX_POOL_CONNECTIONS,
+        )
+
+        s3_utils.reset_s3_client()
+        self.assertNotIn(id(s3_utils.get_s3_client()), clients)
+
+    @override_settings(
+        S3_MULTIPART_CHUNKSIZE=100 * 1024, S3_MULTIPART_THRESHOLD=100 * 1024
+    )
+    def test_object_replaced_mid_download(self):
+        self.put("docs/large.pdf", os.urandom(250 * 1024))
+        s3_client = s3_utils.get_s3_client()
+        get_object = s3_client.get_object
+
+        def replace_after_first_part(**kwargs):
+            response = get_object(**kwargs)
+            if kwargs["Range"].startswith("bytes=0-"):
+                self.put("docs/large.pdf", os.urandom(250 * 1024))
+            return response
+
+        with mock.patch.object(
+            s3_client, "get_object", side_effect=replace_after_first_part
+        ):
+            with self.assertRaisesMessage(Exception, "Failed to fetch file from S3"):
+                get_file_from_s3("docs/large.pdf")
+
+
+class ParsePageRangesTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(
+            parse_page_ranges("1-3, 7,10-", 12), [(1, 3), (7, 7), (10, 12)]
+        )
+
+    def test_empty_parts_are_skipped(self):
+        self.assertEqual(parse_page_ranges("2,,4", 5), [(2, 2), (4, 4)])
+
+    def test_invalid(self):
+        for expression in ("", ",", "a", "1-2-3", "-3", "0", "3-2", "1-6", "6"):
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError):
+                    parse_page_ranges(expression, 5)
+
+
+class ChunkPageRangesTests(SimpleTestCase):
+    def test_chunks(self):
+        self.assertEqual(chunk_page_ranges(7, 3), [(1, 3), (4, 6), (7, 7)])
+        self.assertEqual(chunk_page_ranges(12, 2, 5, 8), [(5, 6), (7, 8)])
+        self.assertEqual(chunk_page_ranges(5, 1, 4, 50), [(4, 4), (5, 5)])
+
+    def test_invalid(self):
+        for args in ((12, 0), (12, 1, 0), (12, 1, 20), (12, 1, 5, 4)):
+            with self.subTest(args=args):
+                with self.assertRaises(ValueError):
+                    chunk_page_ranges(*args)
+
+
+class ResolvePageRangeTests(SimpleTestCase):
+    def test_whole_document(self):
+        self.assertEqual(resolve_page_range(10), (1, 10, None))
+
+    def test_end_page_is_clamped(self):
+        self.assertEqual(resolve_page_range(10, 3, 50), (3, 10, None))
+
+    def test_limit_returns_next_cursor(self):
+        self.assertEqual(resolve_page_range(10, 2, None, 4), (2, 5, 6))
+        self.assertEqual(resolve_page_range(10, 6, 8, 4), (6, 8, None))
+
+    def test_invalid(self):
+        for args in ((10, 0), (10, 5, 4), (10, 1, None, 0)):
+            with self.subTest(args=args):
+                with self.assertRaises(ValueError):
+                    resolve_page_range(*args)
+
+
+class SharedDocumentTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        overrides = override_settings(
+            PDF_SHARED_DIR=self.directory, PDF_SPOOL_DIR=self.directory
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_in_memory_data_is_written_once_and_removed(self):
+        data = make_pdf(2)
+        with SharedDocument(spooled(data)) as document:
+            self.assertTrue(document.owned)
+            self.assertEqual(os.path.dirname(document.path), self.directory)
+            with open(document.path, "rb") as f:
+                self.assertEqual(f.read(), data)
+        self.assertFalse(os.path.exists(document.path))
+
+    def test_files_on_disk_are_used_in_place(self):
+        path = os.path.join(self.directory, "input.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(1))
+
+        with SharedDocument(path) as document:
+            self.assertFalse(document.owned)
+            self.assertEqual(document.path, path)
+        self.assertTrue(os.path.exists(path))
+
+    def test_held_futures_keep_the_file(self):
+        future = Future()
+        with SharedDocument(named_file(make_pdf(1))) as document:
+            document.hold(future)
+        self.assertTrue(os.path.exists(document.path))
+
+        future.set_result(None)
+        self.assertFalse(os.path.exists(document.path))
+        with self.assertRaises(ValueError):
+            document.acquire()
+
+    def test_falls_back_to_the_spool_dir(self):
+        spool_dir = tempfile.mkdtemp(dir=self.directory)
+        with override_settings(
+            PDF_SHARED_DIR=os.path.join(self.directory, "missing"),
+            PDF_SPOOL_DIR=spool_dir,
+        ):
+            self.assertEqual(get_shared_dir(1024), spool_dir)
+
+
+@override_settings(PDF_PARALLEL_WORKERS=1, PDF_OCR_MIN_CHARS=16)
+class OCRTests(IsolatedStorageMixin, TestCase):
+    text = "A page with a proper text layer"
+
+    def test_validate_language(self):
+        self.assertEqual(ocr.validate_language("eng+deu"), "eng+deu")
+        self.assertEqual(ocr.validate_language(""), settings.PDF_OCR_LANGUAGE)
+        for language in ("eng;rm", "ENG", "eng+"):
+            with self.subTest(language=language), self.assertRaises(ValueError):
+                ocr.validate_language(language)
+
+    def test_only_scanned_pages_need_ocr(self):
+        with pymupdf.open(stream=make_scanned_pdf(self.text, None, "")) as doc:
+            self.assertEqual(
+                [ocr.needs_ocr(page, page.get_text()) for page in doc],
+                [False, True, False],
+            )
+
+    def test_scanned_pages_are_ocred_and_cached(self):
+        data = make_scanned_pdf(self.text, None)
+        with mock.patch.object(ocr, "ocr_page", return_value="scanned") as ocr_page:
+            first = list(iter_text_from_pdf(spooled(data), ocr_language="eng"))
+            second = list(iter_text_from_pdf(spooled(data), ocr_language="eng"))
+
+        ocr_page.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertNotIn("ocr", first[0])
+        self.assertEqual(first[1], {"page": 2, "text": "scanned", "ocr": True})
+
+    def test_ocr_errors_name_the_page(self):
+        data = make_scanned_pdf(None)
+        with mock.patch.object(ocr, "ocr_page", side_effect=RuntimeError("boom")):
+            with self.assertRaisesMessage(Exception, "Error running OCR on page 1"):
+                list(iter_text_from_pdf(spooled(data), ocr_language="eng"))
+
+    @override_settings(AWS_S3_ENDPOINT_URL=None)
+    def test_extract_text_view(self):
+        data = make_scanned_pdf(self.text, None)
+        with mock.patch(
+            "pdf_tools.views.fingerprint_s3_file",
+            side_effect=lambda key: ("etag-1", spooled(data)),
+        ), mock.patch.object(ocr, "ocr_page", return_value="scanned"):
+            plain = self.client.post(
+                "/api/v1/pdfs/extract-text/", {"fileKey": "docs/a.pdf"}
+            )
+            ocred = self.client.post(
+                "/api/v1/pdfs/extract-text/",
+                {"fileKey": "docs/a.pdf", "ocr": "true", "ocrLanguage": "eng"},
+            )
+            bad = self.client.post(
+                "/api/v1/pdfs/extract-text/",
+                {"fileKey": "docs/a.pdf", "ocr": "true", "ocrLanguage": "x;y"},
+            )
+
+        self.assertNotIn("ocr_pages", plain.json()["data"])
+        self.assertEqual(ocred.json()["data"]["ocr_pages"], [2])
+        self.assertEqual(ocred.json()["data"]["content"]["page_2"], "scanned")
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PartitionPagesTests(SimpleTestCase):
+    def test_chunks_cover_the_range_in_order(self):
+        chunks = partition_pages(3, 40, workers=2)
+        self.assertEqual(chunks[0][0], 3)
+        self.assertEqual(chunks[-1][1], 40)
+        for (_, last), (first, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(first, last + 1)
+        self.assertEqual(len(chunks), 8)
+
+    def test_small_and_empty_ranges(self):
+        self.assertEqual(partition_pages(1, 3, workers=4), [(1, 1), (2, 2), (3, 3)])
+        self.assertEqual(partition_pages(5, 4, workers=4), [])
+
+    @override_settings(PDF_PARALLEL_MIN_PAGES=10)
+    def test_threshold(self):
+        self.assertTrue(should_parallelize(10, workers=2))
+        self.assertFalse(should_parallelize(9, workers=2))
+        self.assertFalse(should_parallelize(100, workers=1))
+
+
+@override_settings(
+    PDF_PARALLEL_START_METHOD="spawn", PDF_PARALLEL_WORKERS=2, PDF_PARALLEL_MIN_PAGES=4
+)
+class ParallelTextTests(SimpleTestCase):
+    def setUp(self):
+        shutdown_process_pool()
+        self.addCleanup(shutdown_process_pool)
+
+    def test_matches_serial_extraction(self):
+        data = make_text_pdf(*(f"page {number}" for number in range(1, 13)))
+
+        with mock.patch(
+            "pdf_tools.utils.utils.iter_text_parallel", wraps=iter_text_parallel
+        ) as spread:
+            parallel = list(
+                iter_text_from_pdf(spooled(data), start_page=2, end_page=11)
+            )
+        spread.assert_called_once()
+        with override_settings(PDF_PARALLEL_MIN_PAGES=1000):
+            serial = list(iter_text_from_pdf(spooled(data), start_page=2, end_page=11))
+
+        self.assertEqual(parallel, serial)
+        self.assertEqual(
+            [item.get("page") for item in parallel[:-1]], list(range(2, 12))
+        )
+        self.assertIn("page 11", parallel[-2]["text"])
+        self.assertEqual(parallel[-1]["total_pages"], 12)
+
+    def test_early_exit_cancels_queued_chunks(self):
+        data = make_text_pdf(*(f"page {number}" for number in range(1, 41)))
+        pages = iter_text_from_pdf(spooled(data))
+        self.assertEqual(next(pages)["page"], 1)
+        pages.close()
+        self.assertTrue(_is_usable(get_process_pool()))
+
+
+class StreamZipTests(SimpleTestCase):
+    def test_archive(self):
+        entries = [("a.pdf", b"first"), ("dir/b.png", os.urandom(4096))]
+
+        chunks = list(stream_zip(iter(entries)))
+
+        # One chunk per entry, then the central directory
+        self.assertEqual(len(chunks), len(entries) + 1)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(
+                [(name, archive.read(name)) for name in archive.namelist()], entries
+            )
+            self.assertEqual(archive.getinfo("a.pdf").compress_type, zipfile.ZIP_STORED)
+
+    def test_empty(self):
+        with zipfile.ZipFile(io.BytesIO(b"".join(stream_zip([])))) as archive:
+            self.assertEqual(archive.namelist(), [])
+
+
+class MetricsTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("h", "help", buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value, stage="open")
+
+        self.assertEqual(
+            histogram.expose()[2:],
+            [
+                'h_bucket{stage="open",le="0.1"} 1',
+                'h_bucket{stage="open",le="1"} 3',
+                'h_bucket{stage="open",le="+Inf"} 4',
+                'h_sum{stage="open"} 6.05',
+                'h_count{stage="open"} 4',
+            ],
+        )
+
+    def test_labels_are_escaped(self):
+        self.assertEqual(
+            metrics.format_labels((("path", 'a"b\\c\n'),)), '{path="a\\"b\\\\c\\n"}'
+        )
+
+    def test_spans_and_counters_go_to_the_active_trace(self):
+        trace = metrics.RequestTrace("pdf-split", "POST")
+        token = metrics.activate_trace(trace)
+        try:
+            with metrics.span("pdf.open"):
+                pass
+            metrics.record(bytes_in=10, pages=2)
+            metrics.record(pages=1)
+        finally:
+            metrics.end_trace(token)
+        metrics.record(pages=5)
+
+        data = trace.to_dict()
+        self.assertEqual(list(data["stages_ms"]), ["pdf.open"])
+        self.assertEqual((data["bytes_in"], data["pages"]), (10, 3))
+
+
+@override_settings(AWS_S3_ENDPOINT_URL=None)
+class RequestMetricsTests(IsolatedStorageMixin, TestCase):
+    def request_logs(self, logs):
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_request_is_logged_and_exported(self):
+        with self.assertLogs("pdf_tools.requests", "INFO") as logs:
+            response = self.client.post(
+                "/api/v1/pdfs/split/", {"pdfFile": named_file(make_pdf(3))}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        (entry,) = self.request_logs(logs)
+        self.assertEqual(entry["endpoint"], "pdf-split")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["pages"], 3)
+        self.assertIn("pdf.open", entry["stages_ms"])
+
+        exposition = self.client.get("/metrics").content.decode()
+        self.assertIn(
+            'pdf_tools_requests_total{endpoint="pdf-split",method="POST",status="200"}',
+            exposition,
+        )
+        self.assertIn(
+            'pdf_tools_stage_duration_seconds_count{stage="pdf.open"}', exposition
+        )
+
+    def test_streamed_responses_are_logged_once_sent(self):
+        data = make_text_pdf("one", "two")
+        with mock.patch(
+            "pdf_tools.views.fingerprint_s3_file",
+            return_value=("etag-1", spooled(data)),
+        ), self.assertLogs("pdf_tools.requests", "INFO") as logs:
+            response = self.client.post(
+                "/api/v1/pdfs/extract-text/",
+                {"fileKey": "docs/a.pdf", "stream": "true"},
+            )
+            self.assertEqual(logs.records, [])
+            lines = b"".join(response.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 3)
+        (entry,) = self.request_logs(logs)
+        self.assertEqual(entry["pages"], 2)
+        self.assertIn("extract_text.pages", entry["stages_ms"])
+
+
+@override_settings(PDF_RESPONSE_ENCODINGS=["zstd", "gzip"])
+class ChooseEncodingTests(SimpleTestCase):
+    def test_preference_order_breaks_ties(self):
+        self.assertEqual(choose_encoding("gzip, deflate, br, zstd"), "zstd")
+
+    def test_highest_quality(self):
+        self.assertEqual(choose_encoding("zstd;q=0.5, gzip;q=0.8"), "gzip")
+        self.assertEqual(choose_encoding("GZIP"), "gzip")
+
+    def test_wildcard(self):
+        self.assertEqual(choose_encoding("*"), "zstd")
+        self.assertEqual(choose_encoding("zstd;q=0, *;q=0.1"), "gzip")
+
+    def test_nothing_acceptable(self):
+        for header in ("", "identity", "br, deflate", "gzip;q=0, zstd;q=0", "gzip;q=x"):
+            with self.subTest(header=header):
+                self.assertIsNone(choose_encoding(header))
+
+    @override_settings(PDF_RESPONSE_ENCODINGS=[])
+    def test_disabled(self):
+        self.assertIsNone(choose_encoding("gzip, zstd"))
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def test_matches_the_drf_renderer(self):
+        data = {
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "created_at": datetime(2026, 1, 2, 3, 4, 5, 678000),
+            "price": Decimal("1.50"),
+            "pages": {1: "é"},
+            "empty": None,
+        }
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+
+    def test_numpy_and_indent(self):
+        rendered = ORJSONRenderer().render(
+            {"x": np.array([1, 2], dtype=np.uint32)},
+            "application/json; indent=4",
+        )
+        self.assertEqual(rendered, b'{\n  "x": [\n    1,\n    2\n  ]\n}')
+
+
+@override_settings(
+    AWS_S3_ENDPOINT_URL=None,
+    PDF_RESPONSE_ENCODINGS=["zstd", "gzip"],
+    PDF_RESPONSE_COMPRESSION_MIN_SIZE=512,
+)
+class CompressionMiddlewareTests(IsolatedStorageMixin, TestCase):
+    def extract_text(self, pages, encoding, **params):
+        data = make_text_pdf(
+            *("\n".join([f"page {number} text"] * 40) for number in range(pages))
+        )
+        with mock.patch(
+            "pdf_tools.views.fingerprint_s3_file",
+            return_value=("etag-1", spooled(data)),
+        ):
+            return self.client.post(
+                "/api/v1/pdfs/extract-text/",
+                {"fileKey": "docs/a.pdf", **params},
+                HTTP_ACCEPT_ENCODING=encoding,
+            )
+
+    def test_json_is_compressed(self):
+        response = self.extract_text(3, "gzip, zstd")
+
+        self.assertEqual(response["Content-Encoding"], "zstd")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(
+            response.content
+        )
+        self.assertEqual(json.loads(body)["data"]["pages"], 3)
+
+    def test_small_bodies_are_sent_as_is(self):
+        response = self.client.get(
+            "/api/v1/pdfs/search/", {"q": " "}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_streams_are_flushed_per_chunk(self):
+        response = self.extract_text(3, "gzip", stream="true")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        decompressor = zlib.decompressobj(31)
+        lines = []
+        for chunk in response.streaming_content:
+            # Every chunk decodes on its own to whole lines
+            text = decompressor.decompress(chunk)
+            if text:
+                self.assertTrue(text.endswith(b"\n"))
+                lines.extend(text.splitlines())
+        self.assertEqual(len(lines), 4)
+
+    def test_zip_responses_are_not_recompressed(self):
+        response = self.client.post(
+            "/api/v1/pdfs/split/",
+            {"pdfFile": named_file(make_pdf(2)), "output": "zip"},
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class PDFUploadHandlerTests(SimpleTestCase):
+    def parse(self, files):
+        body = encode_multipart(BOUNDARY, files)
+        meta = {
+            "CONTENT_TYPE": MULTIPART_CONTENT,
+            "CONTENT_LENGTH": str(len(body)),
+        }
+        parser = MultiPartParser(meta, io.BytesIO(body), [PDFUploadHandler()])
+        return parser.parse()[1]
+
+    def test_upload_is_hashed_on_disk(self):
+        data = make_pdf(2)
+
+        upload = self.parse({"pdfFile": named_file(data)})["pdfFile"]
+        self.addCleanup(upload.close)
+
+        self.assertIsInstance(upload, PDFUpload)
+        self.assertEqual(upload.size, len(data))
+        self.assertEqual(upload.sha256, hashlib.sha256(data).hexdigest())
+        with open(upload.temporary_file_path(), "rb") as file:
+            self.assertEqual(file.read(), data)
+
+    def test_not_a_pdf(self):
+        with self.assertRaises(UploadRejected) as context:
+            self.parse({"pdfFile": named_file(b"hello world", "test.txt")})
+        self.assertEqual(context.exception.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(MAX_PDF_SIZE=1024)
+    def test_file_too_large(self):
+        data = b"%PDF-1.7\n" + b"0" * 4096
+        with self.assertRaises(UploadRejected) as context:
+            self.parse({"pdfFile": named_file(data)})
+        self.assertEqual(
+            context.exception.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    @override_settings(PDF_UPLOAD_MAX_REQUEST_SIZE=1024)
+    def test_request_too_large(self):
+        data = b"%PDF-1.7\n" + b"0" * 4096
+        with self.assertRaises(UploadRejected) as context:
+            self.parse({"pdfFile": named_file(data)})
+        self.assertEqual(
+            context.exception.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    @override_settings(MAX_PDF_SIZE=0, PDF_UPLOAD_MAX_REQUEST_SIZE=0)
+    def test_limits_disabled(self):
+        data = make_pdf(1)
+        upload = self.parse({"pdfFile": named_file(data)})["pdfFile"]
+        self.addCleanup(upload.close)
+        self.assertEqual(upload.size, len(data))
+
+
+class UploadViewTests(IsolatedStorageMixin, TestCase):
+    def test_upload_view_rejects_non_pdf(self):
+        response = self.client.post(
+            "/api/v1/pdfs/split/", {"pdfFile": named_file(b"hello", "test.txt")}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"error": "Please upload PDF files"})
+
+    @override_settings(PDF_UPLOAD_MAX_REQUEST_SIZE=1024)
+    def test_upload_view_rejects_large_request(self):
+        response = self.client.post(
+            "/api/v1/pdfs/split/", {"pdfFile": named_file(make_pdf(1) + b" " * 4096)}
+        )
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_split_start_page_past_the_end(self):
+        response = self.client.post(
+            "/api/v1/pdfs/split/",
+            {"pdfFile": named_file(make_pdf(12)), "startPage": "20"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("startPage 20", response.json()["error"])
+
+    def test_compress_rejects_unknown_level(self):
+        response = self.client.post(
+            "/api/v1/pdfs/compress/",
+            {"pdfFile": named_file(make_pdf(1)), "compressionLevel": "LOW"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json(),
+            {"error": "compressionLevel must be one of: low, mid, high"},
+        )
+
+    @override_settings(PDF_UPLOAD_MAX_REQUEST_SIZE=1024)
+    def test_other_views_keep_default_handlers(self):
+        response = self.client.post(
+            "/api/v1/pdfs/search/",
+            {"q": "", "attachment": named_file(b"x" * 4096, "notes.txt")},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"error": "No search query provided"})
+
+
+@override_settings(AWS_S3_ENDPOINT_URL=None)
+class ExtractImagesViewTests(IsolatedStorageMixin, TestCase):
+    def extract(self, data, **params):
+        with mock.patch(
+            "pdf_tools.views.fingerprint_s3_file",
+            return_value=("etag-1", spooled(data)),
+        ):
+            return self.client.post(
+                "/api/v1/pdfs/extract-images/", {"fileKey": "docs/a.pdf", **params}
+            )
+
+    def test_images_stay_available(self):
+        response = self.extract(make_image_pdf(2))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()["data"]
+        self.assertEqual(data["total_images"], 1)
+        self.assertEqual(data["images"][0]["pages"], [1, 2])
+        path = data["images"][0]["url"].removeprefix(settings.MEDIA_URL.lstrip("/"))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, path)))
+
+    def test_repeated_calls_reuse_the_artifact(self):
+        first = self.extract(make_image_pdf(1)).json()["data"]
+        second = self.extract(make_image_pdf(1)).json()["data"]
+        self.assertEqual(first, second)
+        self.assertEqual(artifacts.get_artifact_store().stats()["hits"], 1)
+
+    def test_filters_are_part_of_the_key(self):
+        response = self.extract(make_image_pdf(1), formats="jpeg")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.extract(make_image_pdf(1), formats="png")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+def text_result(*texts):
+    """`extract_text_from_pdf` style result for the given page texts"""
+    return {
+        "total_pages": len(texts),
+        "content": {f"page_{number}": text for number, text in enumerate(texts, 1)},
+    }
+
+
+class SearchTests(TestCase):
+    def test_fts5_query_quotes_every_word(self):
+        self.assertEqual(
+            search.fts5_query('revenue" OR NEAR(x*) -2024'),
+            '"revenue" "OR" "NEAR" "x" "2024"',
+        )
+        self.assertEqual(search.fts5_query('"*"'), "")
+
+    def test_hits_are_ranked_and_escaped(self):
+        report = search.index_document(
+            "etag-1",
+            text_result("<b>revenue</b> & costs", "revenue revenue revenue"),
+            file_key="docs/report.pdf",
+        )
+        search.index_document("etag-2", text_result("no match here"))
+
+        hits = search.search_pages("revenue")
+
+        self.assertEqual(
+            [(hit["document"], hit["page"]) for hit in hits],
+            [(report.id, 2), (report.id, 1)],
+        )
+        self.assertEqual(hits[0]["file_name"], "report.pdf")
+        self.assertEqual(
+            hits[1]["snippet"], "&lt;b&gt;<mark>revenue</mark>&lt;/b&gt; &amp; costs"
+        )
+
+    def test_reindexing_replaces_pages(self):
+        document = search.index_document("etag-1", text_result("old words"))
+        search.index_document("etag-1", text_result("new words", "more"))
+
+        self.assertEqual(search.search_pages("old"), [])
+        self.assertEqual(len(search.search_pages("new", document.id)), 1)
+        self.assertEqual(search.get_indexed_document("etag-1").num_pages, 2)
+
+    def test_search_is_limited_to_a_document(self):
+        first = search.index_document("etag-1", text_result("shared word"))
+        search.index_document("etag-2", text_result("shared word"))
+
+        hits = search.search_pages("shared", first.id)
+        self.assertEqual([hit["document"] for hit in hits], [first.id])
+        self.assertEqual(len(search.search_pages("shared", limit=1)), 1)
+
+    def test_fallback_escapes_snippets(self):
+        search.index_document("etag-1", text_result("a <i>Revenue</i> line"))
+
+        (hit,) = search._search_fallback("revenue", None, 10)
+
+        self.assertEqual(
+            hit["snippet"], "a &lt;i&gt;<mark>Revenue</mark>&lt;/i&gt; line"
+        )
+        self.assertIsNone(hit["score"])
+
+    def test_search_view(self):
+        search.index_document("etag-1", text_result("quarterly revenue"))
+
+        response = self.client.get("/api/v1/pdfs/search/", {"q": "revenue"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["total"], 1)
+
+
+class JobTests(IsolatedStorageMixin, TestCase):
+    def submit_split(self, data=None, **params):
+        return jobs.submit_job(
+            PDFJob.OPERATION_SPLIT, [named_file(data or make_pdf(3))], params
+        )
+
+    def test_async_request_queues_a_job(self):
+        response = self.client.post(
+            "/api/v1/pdfs/split/",
+            {"pdfFile": named_file(make_pdf(2)), "async": "true", "every": "1"},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        data = response.json()["data"]
+        self.assertEqual(data["state"], PDFJob.STATE_QUEUED)
+        job = PDFJob.objects.get(id=data["id"])
+        self.assertEqual(job.params["every"], 1)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.media_root, job.input_paths[0]))
+        )
+
+        response = self.client.get(data["status_url"])
+        self.assertEqual(response.json()["data"]["state"], PDFJob.STATE_QUEUED)
+
+    def test_job_runs_to_completion(self):
+        job = self.submit_split()
+
+        claimed = jobs.claim_next_job("worker-1")
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual(claimed.state, PDFJob.STATE_RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(jobs.claim_next_job("worker-2"))
+
+        jobs.execute_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, PDFJob.STATE_SUCCEEDED)
+        self.assertEqual(job.result["total_pages"], 3)
+        self.assertEqual((job.progress, job.total), (3, 3))
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.media_root, job.input_paths[0]))
+        )
+
+    def test_failed_job_records_the_error(self):
+        job = self.submit_split(b"%PDF-1.4 broken")
+        jobs.claim_next_job("worker-1")
+
+        jobs.execute_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, PDFJob.STATE_FAILED)
+        self.assertTrue(job.error)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.media_root, job.input_paths[0]))
+        )
+
+    @override_settings(PDF_JOBS_MAX_ATTEMPTS=2)
+    def test_crashed_jobs_are_retried_then_failed(self):
+        job = self.submit_split()
+
+        with self.assertLogs("pdf_tools.utils.jobs", "WARNING"):
+            jobs.retry_or_fail(jobs.claim_next_job("worker-1"), "crashed")
+        job.refresh_from_db()
+        self.assertEqual(job.state, PDFJob.STATE_QUEUED)
+        self.assertEqual(job.worker, "")
+
+        jobs.retry_or_fail(jobs.claim_next_job("worker-1"), "crashed again")
+        job.refresh_from_db()
+        self.assertEqual(job.state, PDFJob.STATE_FAILED)
+        self.assertEqual(job.error, "crashed again")
+
+    def test_stale_jobs_are_requeued(self):
+        job = self.submit_split()
+        jobs.claim_next_job("worker-1")
+        PDFJob.objects.filter(id=job.id).update(
+            heartbeat_at=timezone.now()
+            - timedelta(seconds=settings.PDF_JOBS_STALE_AFTER + 1)
+        )
+
+        with self.assertLogs("pdf_tools.utils.jobs", "WARNING"):
+            jobs.requeue_stale_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, PDFJob.STATE_QUEUED)
+
+    def test_progress_is_throttled(self):
+        job = self.submit_split()
+        progress = jobs.JobProgress(job.id, interval=3600)
+        progress._last_update = time.monotonic()
+
+        progress(1, 10)
+        job.refresh_from_db()
+        self.assertEqual(job.progress, 0)
+
+        progress.flush()
+        job.refresh_from_db()
+        self.assertEqual((job.progress, job.total), (1, 10))
+
+        progress(10, 10)
+        job.refresh_from_db()
+        self.assertEqual(job.progress, 10)
+
+
+class IterFilesFromS3Tests(SimpleTestCase):
+    def test_files_are_yielded_in_order_and_closed(self):
+        def download(file_key):
+            # Later keys finish first
+            time.sleep(0.05 * (3 - int(file_key)))
+            return mock.Mock(key=file_key)
+
+        with mock.patch.object(s3_utils, "get_file_from_s3", side_effect=download):
+            files = []
+            for pdf_file in s3_utils.iter_files_from_s3(["0", "1", "2"], prefetch=2):
+                pdf_file.close.assert_not_called()
+                files.append(pdf_file)
+
+        self.assertEqual([pdf_file.key for pdf_file in files], ["0", "1", "2"])
+        for pdf_file in files:
+            pdf_file.close.assert_called_once()
+
+    def test_prefetched_files_are_closed_when_the_consumer_stops(self):
+        downloaded = []
+
+        def download(file_key):
+            downloaded.append(mock.Mock(key=file_key))
+            return downloaded[-1]
+
+        with mock.patch.object(s3_utils, "get_file_from_s3", side_effect=download):
+            files = s3_utils.iter_files_from_s3(["0", "1", "2", "3"], prefetch=2)
+            next(files)
+            files.close()
+
+        self.assertLessEqual(len(downloaded), 3)
+        for pdf_file in downloaded:
+            pdf_file.close.assert_called_once()
+
+
+@override_settings(AWS_S3_ENDPOINT_URL=None)
+class MergeViewTests(IsolatedStorageMixin, TestCase):
+    def merge(self, data, s3_files=None):
+        s3_files = s3_files or {}
+        with mock.patch(
+            "pdf_tools.views.get_file_etag", side_effect=lambda key: f"etag-{key}"
+        ), mock.patch.object(
+            s3_utils,
+            "get_file_from_s3",
+            side_effect=lambda key: spooled(s3_files[key]),
+        ) as download:
+            response = self.client.post("/api/v1/pdfs/merge/", data)
+        return response, download
+
+    def merged_page_count(self, response):
+        url = response.json()["data"]
+        path = url.removeprefix(settings.MEDIA_URL)
+        with pymupdf.open(os.path.join(self.media_root, path)) as doc:
+            return doc.page_count
+
+    def test_uploads_then_s3_keys_with_ranges(self):
+        response, _ = self.merge(
+            {
+                "pdfs": [
+                    named_file(make_pdf(2), "a.pdf"),
+                    named_file(make_pdf(3), "b.pdf"),
+                ],
+                "fileKeys": ["docs/c.pdf"],
+                "ranges": ["", "2-3", "1"],
+            },
+            {"docs/c.pdf": make_pdf(4)},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.merged_page_count(response), 5)
+
+    def test_repeated_merge_downloads_nothing(self):
+        data = {"fileKeys": ["docs/a.pdf", "docs/b.pdf"]}
+        s3_files = {"docs/a.pdf": make_pdf(1), "docs/b.pdf": make_pdf(2)}
+
+        first, download = self.merge(data, s3_files)
+        self.assertEqual(download.call_count, 2)
+        second, download = self.merge(data, s3_files)
+        self.assertEqual(download.call_count, 0)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(self.merged_page_count(second), 3)
+
+    def test_bad_range_is_rejected_before_downloading(self):
+        response, download = self.merge(
+            {"fileKeys": ["docs/a.pdf"], "ranges": ["1-x"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        download.assert_not_called()
+
+
+class ArtifactStoreTests(IsolatedStorageMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = artifacts.get_artifact_store()
+        self.calls = 0
+
+    def produce(self, output_subdir, delay=0):
+        self.calls += 1
+        time.sleep(delay)
+        path = os.path.join(settings.MEDIA_ROOT, output_subdir, "out.pdf")
+        with open(path, "wb") as f:
+            f.write(b"x" * 10)
+        return {"path": path}
+
+    def test_results_are_reused(self):
+        first = self.store.get_or_create("compress", "abc", self.produce, level="low")
+        second = self.store.get_or_create("compress", "abc", self.produce, level="low")
+        self.store.get_or_create("compress", "abc", self.produce, level="high")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.store.stats()["hits"], 1)
+
+    def test_concurrent_calls_produce_once(self):
+        produce = functools.partial(self.produce, delay=0.2)
+        with ThreadPoolExecutor(4) as executor:
+            results = list(
+                executor.map(
+                    lambda _: self.store.get_or_create("split", "abc", produce),
+                    range(4),
+                )
+            )
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len({result["path"] for result in results}), 1)
+
+    def test_failed_runs_leave_nothing_behind(self):
+        def fail(output_subdir):
+            with open(os.path.join(settings.MEDIA_ROOT, output_subdir, "x"), "w"):
+                pass
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            self.store.get_or_create("merge", "abc", fail)
+        self.assertEqual(list(self.store.iter_artifacts()), [])
+
+        result = self.store.get_or_create("merge", "abc", self.produce)
+        self.assertTrue(os.path.exists(result["path"]))
+
+    def test_remove_skips_locked_artifacts(self):
+        result = self.store.get_or_create("compress", "abc", self.produce)
+        output_dir = os.path.dirname(result["path"])
+        digest = os.path.basename(output_dir)
+
+        with self.store._key_lock(digest):
+            self.assertFalse(self.store.remove(output_dir))
+        self.assertTrue(self.store.remove(output_dir))
+        self.assertFalse(os.path.exists(output_dir))
+        self.assertFalse(os.path.exists(f"{output_dir}.lock"))
+
+        self.store.get_or_create("compress", "abc", self.produce)
+        self.assertEqual(self.calls, 2)
+
+    def test_waiters_survive_removal(self):
+        result = self.store.get_or_create("compress", "abc", self.produce)
+        output_dir = os.path.dirname(result["path"])
+        digest = os.path.basename(output_dir)
+        removed = threading.Event()
+
+        def remove_then_release():
+            with self.store._key_lock(digest):
+                # Waiters block on the old lock file until it is released
+                time.sleep(0.2)
+                shutil.rmtree(output_dir)
+                os.remove(f"{output_dir}.lock")
+                removed.set()
+
+        with ThreadPoolExecutor(3) as executor:
+            remover = executor.submit(remove_then_release)
+            time.sleep(0.05)
+            waiters = [
+                executor.submit(
+                    self.store.get_or_create, "compress", "abc", self.produce
+                )
+                for _ in range(2)
+            ]
+            remover.result()
+            results = [waiter.result() for waiter in waiters]
+
+        self.assertTrue(removed.is_set())
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(results[0], results[1])
+        self.assertTrue(os.path.exists(results[0]["path"]))
+
+    def test_expired_artifacts_are_recreated(self):
+        self.store.get_or_create("compress", "abc", self.produce)
+        later = time.time() + self.store.ttl + 1
+        with mock.patch("pdf_tools.utils.artifacts.time.time", return_value=later):
+            self.store.get_or_create("compress", "abc", self.produce)
+        self.assertEqual(self.calls, 2)
+
+    def test_eviction_keeps_recent_artifacts(self):
+        with mock.patch.object(self.store, "max_bytes", 25):
+            for fingerprint in ("a", "b", "c"):
+                self.store.get_or_create("compress", fingerprint, self.produce)
+                time.sleep(0.01)
+
+        self.assertEqual(len(list(self.store.iter_artifacts())), 2)
+        self.assertEqual(self.store._size, 20)
+
+
+class RenderTests(IsolatedStorageMixin, SimpleTestCase):
+    def render(self, data, **options):
+        get_pdf_file = mock.Mock(side_effect=lambda: spooled(data))
+        return render.render_pages("etag-1", get_pdf_file, **options), get_pdf_file
+
+    @override_settings(PDF_RENDER_MAX_DPI=300, PDF_RENDER_MAX_DIMENSION=4096)
+    def test_page_scale(self):
+        self.assertEqual(render.page_scale(600, 800, dpi=144), 2)
+        self.assertEqual(render.page_scale(600, 800, width=300, height=300), 0.375)
+        self.assertEqual(render.page_scale(600, 800, dpi=1200), 300 / 72)
+        self.assertEqual(render.page_scale(6000, 8000, dpi=72), 4096 / 8000)
+
+    def test_second_request_is_served_from_the_cache(self):
+        data = make_pdf(3)
+        first, get_pdf_file = self.render(data, pages="1-2", width=100)
+        self.assertEqual(first["rendered"], 2)
+        get_pdf_file.assert_called_once()
+
+        second, get_pdf_file = self.render(data, pages="2-3", width=100)
+        self.assertEqual(second["rendered"], 1)
+        self.assertEqual([page["cached"] for page in second["pages"]], [True, False])
+
+        third, get_pdf_file = self.render(data, pages="1-3", width=100)
+        self.assertEqual(third["rendered"], 0)
+        get_pdf_file.assert_not_called()
+
+        for page in third["pages"]:
+            path = os.path.join(self.media_root, page["url"].split("/", 1)[1])
+            image = pymupdf.Pixmap(path)
+            self.assertEqual(
+                (image.width, image.height), (page["width"], page["height"])
+            )
+
+    def test_pages_outside_the_document(self):
+        with self.assertRaises(ValueError):
+            self.render(make_pdf(2), pages="3")
+        with self.assertRaises(ValueError):
+            self.render(make_pdf(2), image_format="gif")
+
+    @override_settings(
+        PDF_PARALLEL_START_METHOD="spawn",
+        PDF_PARALLEL_WORKERS=2,
+        PDF_RENDER_PARALLEL_MIN_PAGES=2,
+    )
+    def test_parallel_rendering(self):
+        shutdown_process_pool()
+        self.addCleanup(shutdown_process_pool)
+
+        result, _ = self.render(make_pdf(5), dpi=18, image_format="webp")
+
+        self.assertEqual(result["rendered"], 5)
+        render_cache = render.get_render_cache()
+        self.assertEqual(render_cache._size, render_cache.stats()["bytes"])
+        for page in result["pages"]:
+            self.assertTrue(page["url"].endswith(".webp"))
+
+    @override_settings(AWS_S3_ENDPOINT_URL=None)
+    def test_image_output_redirects(self):
+        with mock.patch(
+            "pdf_tools.views.fingerprint_s3_file",
+            return_value=("etag-1", spooled(make_pdf(2))),
+        ):
+            response = self.client.get(
+                "/api/v1/pdfs/render/",
+                {"fileKey": "docs/a.pdf", "pages": "2", "output": "image"},
+            )
+            bad = self.client.get(
+                "/api/v1/pdfs/render/",
+                {"fileKey": "docs/a.pdf", "pages": "1-2", "output": "image"},
+            )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].endswith(".png"))
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class JanitorTests(IsolatedStorageMixin, TestCase):
+    def add_render(self, key, size, age=0):
+        render_cache = render.get_render_cache()
+        path = render_cache.path(key)
+        write_file(path, b"x" * size)
+        render_cache.added(size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def add_artifact(self, name, size):
+        def produce(output_subdir):
+            path = os.path.join(settings.MEDIA_ROOT, output_subdir, "out.pdf")
+            with open(path, "wb") as f:
+                f.write(b"x" * size)
+            return {"path": path}
+
+        return artifacts.get_artifact_store().get_or_create("test", name, produce)
+
+    def test_expired_renders_go_through_the_cache(self):
+        render_cache = render.get_render_cache()
+        old = self.add_render("a.png", 100, age=render_cache.ttl + 60)
+        new = self.add_render("b.png", 50)
+
+        stats = sweep()
+
+        self.assertEqual(stats["expired_renders"], 1)
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+        self.assertEqual(render_cache._size, 50)
+
+    @override_settings(PDF_MEDIA_MAX_BYTES=150)
+    def test_quota_keeps_store_sizes(self):
+        self.add_render("a.png", 100)
+        result = self.add_artifact("doc", 100)
+        store = artifacts.get_artifact_store()
+        self.assertEqual(store._size, 100)
+
+        stats = sweep()
+
+        self.assertEqual(stats["quota_removed"], 1)
+        self.assertLessEqual(stats["total_bytes"], 150)
+        remaining = render.get_render_cache()._size + store._size
+        self.assertEqual(remaining, stats["total_bytes"])
+        self.assertEqual(os.path.exists(result["path"]), store._size == 100)
+
+    def test_eviction_on_write_does_not_deadlock(self):
+        store = artifacts.get_artifact_store()
+        with mock.patch.object(store, "max_bytes", 150):
+            self.add_artifact("first", 100)
+            self.add_artifact("second", 100)
+        self.assertEqual(store._size, 100)
+        self.assertEqual(len(list(store.iter_artifacts())), 1)
+
+
+@override_settings(PDF_PARALLEL_START_METHOD="spawn", PDF_PARALLEL_WORKERS=2)
+class BatchTests(IsolatedStorageMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        shutdown_process_pool()
+        self.addCleanup(shutdown_process_pool)
+
+    def run_batch(self, operation, documents):
+        def fingerprint_s3_file(file_key):
+            data = documents[file_key]
+            return hashlib.sha256(data).hexdigest(), spooled(data)
+
+        with mock.patch(
+            "pdf_tools.utils.batch.fingerprint_s3_file",
+            side_effect=fingerprint_s3_file,
+        ):
+            return list(iter_batch_results(operation, list(documents)))
+
+    def test_spawned_workers_process_documents(self):
+        # Spawned children import the worker module without django.setup()
+        documents = {f"docs/{pages}.pdf": make_pdf(pages) for pages in (1, 2, 3)}
+
+        *items, summary = self.run_batch("page-count", documents)
+
+        self.assertEqual(summary["succeeded"], 3, items)
+        self.assertEqual(
+            {item["fileKey"]: item["data"]["total_pages"] for item in items},
+            {"docs/1.pdf": 1, "docs/2.pdf": 2, "docs/3.pdf": 3},
+        )
+        self.assertFalse(any(item["cached"] for item in items))
+
+    def test_results_are_cached(self):
+        documents = {"docs/a.pdf": make_pdf(2)}
+        self.run_batch("extract-text", documents)
+
+        *items, summary = self.run_batch("extract-text", documents)
+
+        self.assertTrue(items[0]["cached"])
+        self.assertEqual(items[0]["data"]["total_pages"], 2)
+
+    def test_failures_are_reported_per_document(self):
+        documents = {"docs/good.pdf": make_pdf(1), "docs/bad.pdf": b"%PDF-1.7 bad"}
+
+        *items, summary = self.run_batch("page-count", documents)
+
+        status_by_key = {item["fileKey"]: item["status"] for item in items}
+        self.assertEqual(
+            status_by_key, {"docs/good.pdf": "success", "docs/bad.pdf": "error"}
+        )
+        self.assertEqual((summary["succeeded"], summary["failed"]), (1, 1))
+
+    def test_unknown_operation(self):
+        with self.assertRaises(ValueError):
+            next(iter_batch_results("rotate", ["docs/a.pdf"]))
+
+    def test_broken_pool_is_replaced(self):
+        pool = get_process_pool()
+        with self.assertRaises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()
+
+        replacement = get_process_pool()
+        self.assertIsNot(replacement, pool)
+        self.assertEqual(replacement.submit(abs, -1).result(), 1)
+
+
+class AsyncViewTests(IsolatedStorageMixin, TestCase):
+    factory = AsyncRequestFactory()
+
+    async def call(self, view_class, request):
+        response = await view_class.as_view()(request)
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    async def test_split(self):
+        request = self.factory.post(
+            "/api/v1/pdfs/split/", {"pdfFile": named_file(make_pdf(3))}
+        )
+
+        response = await self.call(AsyncPDFSplitView, request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data["data"]
+        self.assertEqual(data["total_pages"], 3)
+        for page in data["pages"]:
+            self.assertTrue(os.path.exists(page["path"]))
+
+    async def test_split_zip(self):
+        request = self.factory.post(
+            "/api/v1/pdfs/split/",
+            {"pdfFile": named_file(make_pdf(2)), "every": "1", "output": "zip"},
+        )
+
+        response = await self.call(AsyncPDFSplitView, request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+
+    async def test_split_bad_options(self):
+        for data in ({"every": "0"}, {"ranges": "1-9"}):
+            with self.subTest(data=data):
+                request = self.factory.post(
+                    "/api/v1/pdfs/split/",
+                    {"pdfFile": named_file(make_pdf(2)), **data},
+                )
+                response = await self.call(AsyncPDFSplitView, request)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_extract_images_are_kept(self):
+        with mock.patch(
+            "pdf_tools.async_views.fingerprint_s3_file",
+            return_value=("etag-1", spooled(make_image_pdf(1))),
+        ):
+            request = self.factory.post(
+                "/api/v1/pdfs/extract-images/", {"fileKey": "docs/a.pdf"}
+            )
+            response = await self.call(AsyncPDFExtractImagesView, request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        url = response.data["data"]["images"][0]["url"]
+        path = url.removeprefix(settings.MEDIA_URL.lstrip("/"))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, path)))
+
+    async def test_search_indexes_file_key(self):
+        with mock.patch(
+            "pdf_tools.async_views.fingerprint_s3_file",
+            return_value=("etag-1", spooled(make_text_pdf("quarterly revenue report"))),
+        ):
+            request = self.factory.get(
+                "/api/v1/pdfs/search/", {"q": "revenue", "fileKey": "docs/r.pdf"}
+            )
+            response = await self.call(AsyncPDFSearchView, request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        hits = response.data["data"]["results"]
+        self.assertEqual([hit["page"] for hit in hits], [1])
+        self.assertIn("<mark>revenue</mark>", hits[0]["snippet"])
+
+    async def test_search_without_query(self):
+        request = self.factory.get("/api/v1/pdfs/search/", {"q": " "})
+        response = await self.call(AsyncPDFSearchView, request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LazyImportTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(lazy._modules, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_import_is_deferred_to_first_attribute_access(self):
+        self.assertNotIn("colorsys", sys.modules)
+        self.addCleanup(sys.modules.pop, "colorsys", None)
+
+        colorsys = lazy.lazy_import("colorsys")
+        self.assertIs(lazy.lazy_import("colorsys"), colorsys)
+        self.assertNotIn("colorsys", sys.modules)
+        self.assertIn("not loaded", repr(colorsys))
+
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIs(colorsys._module, sys.modules["colorsys"])
+        self.assertIn("(loaded)", repr(colorsys))
+
+    def test_load_lazy_modules(self):
+        modules = [lazy.lazy_import(name) for name in ("json", "base64")]
+
+        self.assertEqual(lazy.load_lazy_modules(), ["base64", "json"])
+        self.assertTrue(all(module._module is not None for module in modules))
+
+
+class StartupTests(SimpleTestCase):
+    def test_views_do_not_import_backends(self):
+        backends = {"pymupdf", "numpy", "boto3", "botocore"}
+
+        cold = {entry["module"] for entry in startup.measure_import_times()}
+        warm = {entry["module"] for entry in startup.measure_import_times(warm=True)}
+
+        self.assertIn(settings.ROOT_URLCONF, cold)
+        self.assertFalse(backends & cold)
+        self.assertLessEqual(backends, warm)
+
+    def test_warmup_releases_shared_resources(self):
+        s3_client = s3_utils.get_s3_client()
+        pool = get_process_pool()
+        aio.get_executor("io")
+
+        with mock.patch.object(startup.connections, "close_all") as close_all:
+            startup.warmup()
+
+        close_all.assert_called_once_with()
+        self.assertEqual(aio._executors, {})
+        self.assertIsNot(get_process_pool(), pool)
+        self.assertIsNot(s3_utils.get_s3_client(), s3_client)
+        self.addCleanup(s3_utils.reset_s3_client)
+
+    def test_summarize_import_times_keeps_fastest_run(self):
+        runs = [
+            [
+                {"module": "a", "depth": 0, "self_ms": 2.0, "cumulative_ms": 5.0},
+                {"module": "a.b", "depth": 1, "self_ms": 3.0, "cumulative_ms": 3.0},
+            ],
+            [
+                {"module": "a", "depth": 0, "self_ms": 1.0, "cumulative_ms": 4.0},
+                {"module": "a.b", "depth": 1, "self_ms": 3.0, "cumulative_ms": 3.0},
+            ],
+        ]
+
+        modules, packages, total = startup.summarize_import_times(runs)
+
+        self.assertEqual([entry["module"] for entry in modules], ["a", "a.b"])
+        self.assertEqual(modules[0]["cumulative_ms"], 4.0)
+        self.assertEqual(packages, [{"package": "a", "self_ms": 4.0}])
+        self.assertEqual(total, 4.0)
+
+
+class BenchmarkTests(SimpleTestCase):
+    scale = 0.02
+
+    def build_corpus(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        return benchmark.build_corpus(directory, scale=self.scale)
+
+    def test_corpus_is_deterministic(self):
+        corpus = self.build_corpus()
+
+        self.assertEqual(
+            benchmark.corpus_digest(corpus),
+            benchmark.corpus_digest(self.build_corpus()),
+        )
+        self.assertEqual(len(corpus["many_small_files"]), 1)
+        self.assertEqual(benchmark.page_count(corpus["many_pages"]), 40)
+
+    def test_run_benchmarks(self):
+        corpus = self.build_corpus()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+        results = list(
+            benchmark.run_benchmarks(
+                corpus,
+                media_root,
+                cases=[("extract_text", "text_heavy"), ("merge", "many_small_files")],
+                repeat=1,
+            )
+        )
+
+        self.assertEqual(
+            [result["case"] for result in results],
+            ["extract_text/text_heavy", "merge/many_small_files"],
+        )
+        self.assertEqual(results[0]["pages"], 4)
+        self.assertGreater(results[0]["seconds"], 0)
+
+    def test_find_regressions(self):
+        baseline = {
+            "results": {
+                "split/text_heavy": {"seconds": 1.0, "peak_rss_mb": 10.0},
+                "merge/text_heavy": {"seconds": 1.0, "peak_rss_mb": 0.2},
+            }
+        }
+        results = [
+            {"case": "split/text_heavy", "seconds": 1.5, "peak_rss_mb": 16.0},
+            {"case": "merge/text_heavy", "seconds": 1.05, "peak_rss_mb": 0.8},
+            {"case": "compress/text_heavy", "seconds": 9.0, "peak_rss_mb": 90.0},
+        ]
+
+        regressions = benchmark.find_regressions(results, baseline, 0.2, 0.5)
+
+        self.assertEqual(
+            regressions,
+            [
+                "split/text_heavy: 1.500s vs 1.000s baseline",
+                "split/text_heavy: 16.0 MB vs 10.0 MB baseline",
+            ],
+        )
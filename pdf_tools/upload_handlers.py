@@ -0,0 +1,90 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+# The header may follow a few bytes of garbage, which readers tolerate
+PDF_HEADER_WINDOW = 1024
+
+
+class UploadRejected(APIException):
+    """Stops parsing an upload; answered as {"error": message}"""
+
+    status_code = status.HTTP_400_BAD_REQUEST
+
+    def __init__(self, message, status_code=None):
+        super().__init__({"error": message})
+        if status_code is not None:
+            self.status_code = status_code
+
+
+class PDFUpload(TemporaryUploadedFile):
+    """
+    Upload already written to a temporary file; `temporary_file_path()`
+    can be opened directly and `sha256` is the digest of its contents.
+    """
+
+    sha256 = None
+
+
+class PDFUploadHandler(FileUploadHandler):
+    """
+    Stream uploaded PDFs straight to temporary files.
+    Requests larger than PDF_UPLOAD_MAX_REQUEST_SIZE are refused from their
+    Content-Length before anything is read. Each file is checked for the
+    %PDF header on its first chunk, refused as soon as it grows past
+    MAX_PDF_SIZE, and hashed (SHA-256) while it is written, so views get a
+    path to open and a fingerprint without reading the upload again.
+    """
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        limit = settings.PDF_UPLOAD_MAX_REQUEST_SIZE
+        if limit and content_length > limit:
+            raise UploadRejected(
+                "Request size exceeds the limit",
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = PDFUpload(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra,
+        )
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and b"%PDF-" not in raw_data[:PDF_HEADER_WINDOW]:
+            self.reject("Please upload PDF files")
+
+        limit = settings.MAX_PDF_SIZE
+        if limit and start + len(raw_data) > limit:
+            self.reject(
+                "File size exceeds the limit",
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, "file"):
+            self.file.close()
+
+    def reject(self, message, status_code=None):
+        # Django only cleans up after StopUpload, remove the partial file here
+        self.file.close()
+        raise UploadRejected(message, status_code)
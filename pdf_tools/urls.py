@@ -1,12 +1,33 @@
+from django.conf import settings
 from django.urls import path
 from pdf_tools.views import (
     PDFExtractTextView,
     PDFExtractImagesView,
+    PDFExtractLayoutView,
     PDFMergeView,
     PDFSplitView,
     PDFCompressView,
+    PDFCacheStatsView,
+    PDFJobStatusView,
+    PDFSearchView,
+    PDFRenderView,
+    PDFBatchView,
 )
 
+if settings.PDF_ASYNC_VIEWS:
+    # Coroutine views for ASGI servers; S3 and CPU work run in executors
+    from pdf_tools.async_views import (
+        AsyncPDFBatchView as PDFBatchView,
+        AsyncPDFCompressView as PDFCompressView,
+        AsyncPDFExtractImagesView as PDFExtractImagesView,
+        AsyncPDFExtractLayoutView as PDFExtractLayoutView,
+        AsyncPDFExtractTextView as PDFExtractTextView,
+        AsyncPDFMergeView as PDFMergeView,
+        AsyncPDFRenderView as PDFRenderView,
+        AsyncPDFSearchView as PDFSearchView,
+        AsyncPDFSplitView as PDFSplitView,
+    )
+
 urlpatterns = [
     path(
         "pdfs/extract-text/",
@@ -18,6 +39,11 @@ urlpatterns = [
         PDFExtractImagesView.as_view(),
         name="pdf-extract-images",
     ),
+    path(
+        "pdfs/extract-layout/",
+        PDFExtractLayoutView.as_view(),
+        name="pdf-extract-layout",
+    ),
     path(
         "pdfs/merge/",
         PDFMergeView.as_view(),
@@ -33,4 +59,29 @@ urlpatterns = [
         PDFCompressView.as_view(),
         name="pdf-compress",
     ),
+    path(
+        "pdfs/cache/stats/",
+        PDFCacheStatsView.as_view(),
+        name="pdf-cache-stats",
+    ),
+    path(
+        "pdfs/search/",
+        PDFSearchView.as_view(),
+        name="pdf-search",
+    ),
+    path(
+        "pdfs/render/",
+        PDFRenderView.as_view(),
+        name="pdf-render",
+    ),
+    path(
+        "pdfs/batch/",
+        PDFBatchView.as_view(),
+        name="pdf-batch",
+    ),
+    path(
+        "pdfs/jobs/<uuid:job_id>/",
+        PDFJobStatusView.as_view(),
+        name="pdf-job-status",
+    ),
 ]
@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+# Returned by `next` once a blocking iterator is exhausted
+_DONE = object()
+
+
+def get_worker_counts():
+    """Threads of the "io" (S3, disk) and "cpu" (PyMuPDF, Ghostscript) executors"""
+    return {
+        "io": settings.PDF_ASYNC_IO_WORKERS or settings.S3_MAX_POOL_CONNECTIONS,
+        "cpu": settings.PDF_ASYNC_CPU_WORKERS or os.cpu_count() or 1,
+    }
+
+
+def get_executor(kind):
+    """
+    Return the shared executor for `kind`, creating it on first use.
+    Blocking calls made by async views run here instead of on the event
+    loop; the fixed pool sizes bound how many run at once.
+    """
+    executor = _executors.get(kind)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(kind)
+            if executor is None:
+                executor = _executors[kind] = ThreadPoolExecutor(
+                    max_workers=get_worker_counts()[kind],
+                    thread_name_prefix=f"pdf-async-{kind}",
+                )
+    return executor
+
+
+def shutdown_executors():
+    """Stop the executors, e.g. before forking or at process exit"""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        _executors.clear()
+
+
+async def run_in_executor(kind, func, *args, **kwargs):
+    """
+    Await `func(*args, **kwargs)` running on the `kind` executor.
+    Context variables (such as the request metrics trace) are carried over.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(kind), functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+async def run_io(func, *args, **kwargs):
+    """Run blocking I/O (S3 requests, file access) off the event loop"""
+    return await run_in_executor("io", func, *args, **kwargs)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run CPU-bound work; at most PDF_ASYNC_CPU_WORKERS calls run at once"""
+    return await run_in_executor("cpu", func, *args, **kwargs)
+
+
+async def iterate_in_executor(kind, iterator):
+    """
+    Consume a blocking iterator from async code, producing each item on
+    the `kind` executor. The iterator is closed if the consumer stops early.
+    """
+    iterator = iter(iterator)
+    try:
+        while True:
+            item = await run_in_executor(kind, next, iterator, _DONE)
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await run_in_executor(kind, close)
@@ -0,0 +1,316 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from pdf_tools.utils.cache import hash_file, make_cache_key
+from pdf_tools.utils.metrics import span
+
+
+MANIFEST_NAME = "artifact.json"
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for generated files (compressed, merged and
+    split PDFs, extracted images), keyed by (input fingerprint, operation, parameters).
+    Each artifact lives in `<subdir>/<digest[:2]>/<digest>/` under
+    MEDIA_ROOT next to an `artifact.json` manifest holding the operation
+    result. Artifacts expire `ttl` seconds after creation and are evicted
+    least recently used first once the store grows past `max_bytes`.
+    """
+
+    def __init__(self, subdir, max_bytes, ttl=None):
+        self.subdir = subdir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = os.path.join(settings.MEDIA_ROOT, subdir)
+        self._size = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_or_create(self, operation, fingerprint, produce, **params):
+        """
+        Return the stored result for this input and options, or call
+        `produce(output_subdir)` to create it. `produce` must write its files
+        under `output_subdir` (relative to MEDIA_ROOT) and return a
+        JSON-serializable result.
+        Concurrent calls for the same key wait for the first one instead of
+        computing the same output again.
+        """
+        digest = hashlib.sha256(
+            make_cache_key(operation, fingerprint, **params).encode("utf-8")
+        ).hexdigest()
+        output_subdir = os.path.join(self.subdir, digest[:2], digest)
+        output_dir = os.path.join(settings.MEDIA_ROOT, output_subdir)
+
+        with self._key_lock(digest):
+            with span("artifacts.lookup"):
+                result = self._read(output_dir)
+            if result is not None:
+                with self._lock:
+                    self._hits += 1
+                return result
+
+            with self._lock:
+                self._misses += 1
+
+            # Drop leftovers of an earlier failed or evicted run
+            shutil.rmtree(output_dir, ignore_errors=True)
+            os.makedirs(output_dir)
+            try:
+                result = produce(output_subdir)
+                size = self._write(output_dir, operation, result, self.ttl)
+            except Exception:
+                shutil.rmtree(output_dir, ignore_errors=True)
+                raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size
+
+            if self._size > self.max_bytes:
+                self._evict()
+        return result
+
+    def clear(self):
+        with self._lock:
+            for artifact in self.iter_artifacts():
+                self._remove(artifact["path"])
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        artifacts = list(self.iter_artifacts())
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(artifacts),
+            "bytes": sum(artifact["bytes"] for artifact in artifacts),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+        }
+
+    @contextmanager
+    def _key_lock(self, digest):
+        lock_dir = os.path.join(self.directory, digest[:2])
+        lock_path = os.path.join(lock_dir, f"{digest}.lock")
+        while True:
+            os.makedirs(lock_dir, exist_ok=True)
+            lock_file = open(lock_path, "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if _is_current(lock_file, lock_path):
+                break
+            # `remove` unlinked the file while we waited on it: a newcomer
+            # may already hold a fresh lock file, so lock that one instead
+            lock_file.close()
+
+        with lock_file:
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read(output_dir):
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        expires_at = manifest.get("expires_at")
+        if expires_at and expires_at < time.time():
+            return None
+
+        # Bump the access time so eviction follows LRU order
+        mtime = os.stat(manifest_path).st_mtime
+        os.utime(manifest_path, (time.time(), mtime))
+        return manifest["result"]
+
+    @staticmethod
+    def _write(output_dir, operation, result, ttl):
+        size = sum(
+            os.path.getsize(os.path.join(root, filename))
+            for root, _, files in os.walk(output_dir)
+            for filename in files
+        )
+        created_at = time.time()
+        manifest = {
+            "operation": operation,
+            "created_at": created_at,
+            "expires_at": created_at + ttl if ttl else None,
+            "bytes": size,
+            "result": result,
+        }
+
+        # The manifest marks the artifact as complete, so write it last
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        temp_path = f"{manifest_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, manifest_path)
+        return size
+
+    def iter_artifacts(self):
+        """
+        Yield {"path", "bytes", "accessed_at", "expires_at"} for each
+        complete artifact
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.is_dir():
+                    continue
+                manifest_path = os.path.join(entry.path, MANIFEST_NAME)
+                try:
+                    stat = os.stat(manifest_path)
+                    with open(manifest_path) as f:
+                        manifest = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    continue
+                yield {
+                    "path": entry.path,
+                    "bytes": manifest.get("bytes", 0),
+                    "accessed_at": stat.st_atime,
+                    "expires_at": manifest.get("expires_at"),
+                }
+
+    def _scan_size(self):
+        return sum(artifact["bytes"] for artifact in self.iter_artifacts())
+
+    def evict(self, now=None):
+        """
+        Remove expired artifacts, then least recently used ones until the
+        store fits in `max_bytes`. Returns (artifacts removed, bytes freed).
+        """
+        with self._lock:
+            return self._evict(now)
+
+    def _evict(self, now=None):
+        # Callers hold self._lock
+        now = now or time.time()
+        artifacts = sorted(self.iter_artifacts(), key=lambda a: a["accessed_at"])
+        size = sum(artifact["bytes"] for artifact in artifacts)
+        removed = freed = 0
+
+        for artifact in artifacts:
+            expired = artifact["expires_at"] and artifact["expires_at"] < now
+            if not expired and size <= self.max_bytes:
+                continue
+            if self._remove(artifact["path"]):
+                size -= artifact["bytes"]
+                removed += 1
+                freed += artifact["bytes"]
+
+        self._size = size
+        return removed, freed
+
+    def remove(self, output_dir):
+        """
+        Delete an artifact unless it is being created or read right now.
+        Returns whether it was deleted.
+        """
+        try:
+            with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+                size = json.load(f).get("bytes", 0)
+        except (FileNotFoundError, ValueError):
+            size = 0
+
+        if not self._remove(output_dir):
+            return False
+        with self._lock:
+            if self._size is not None:
+                self._size = max(self._size - size, 0)
+        return True
+
+    @staticmethod
+    def _remove(output_dir):
+        lock_path = f"{output_dir}.lock"
+        try:
+            lock_file = open(lock_path, "r+")
+        except FileNotFoundError:
+            shutil.rmtree(output_dir, ignore_errors=True)
+            return True
+
+        with lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            if not _is_current(lock_file, lock_path):
+                # Removed and possibly recreated by someone else meanwhile
+                return False
+            shutil.rmtree(output_dir, ignore_errors=True)
+            # Waiters blocked on this file notice the unlink in `_key_lock`
+            os.remove(lock_path)
+            return True
+
+
+def _is_current(lock_file, lock_path):
+    """Whether the locked file is still the one at `lock_path`"""
+    try:
+        return os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def fingerprint_files(pdf_files):
+    """
+    SHA-256 of each input, for uploads, file objects or paths, in order.
+    File objects are rewound afterwards; uploads hashed while they were
+    received (PDFUpload) are not read again.
+    """
+    fingerprints = []
+    for pdf_file in pdf_files:
+        if getattr(pdf_file, "sha256", None):
+            fingerprints.append(pdf_file.sha256)
+        elif isinstance(pdf_file, (str, os.PathLike)):
+            with open(pdf_file, "rb") as f:
+                fingerprints.append(hash_file(f))
+        else:
+            fingerprints.append(hash_file(pdf_file))
+    return fingerprints
+
+
+def combine_fingerprints(fingerprints):
+    """Single fingerprint for an ordered list of inputs"""
+    if len(fingerprints) == 1:
+        return fingerprints[0]
+    return hashlib.sha256("|".join(fingerprints).encode("utf-8")).hexdigest()
+
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Return the process-wide artifact store configured in settings"""
+    global _artifact_store
+
+    if _artifact_store is None:
+        with _artifact_store_lock:
+            if _artifact_store is None:
+                _artifact_store = ArtifactStore(
+                    settings.PDF_ARTIFACTS_SUBDIR,
+                    settings.PDF_ARTIFACTS_MAX_BYTES,
+                    settings.PDF_ARTIFACTS_TTL,
+                )
+    return _artifact_store
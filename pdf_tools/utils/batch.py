@@ -0,0 +1,199 @@
+import contextvars
+import itertools
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from pdf_tools.utils.cache import get_result_cache, make_cache_key
+from pdf_tools.utils.files import SharedDocument
+from pdf_tools.utils.lazy import lazy_import
+from pdf_tools.utils.metrics import record
+from pdf_tools.utils.parallel import get_process_pool
+from pdf_tools.utils.s3_utils import fingerprint_s3_file, get_file_from_s3
+from pdf_tools.utils.utils import iter_unique_images, map_pages_to_images
+
+pymupdf = lazy_import("pymupdf")
+
+
+def _count_pages(doc):
+    return {"status": "success", "total_pages": doc.page_count}
+
+
+def _extract_text(doc):
+    """Same result as `extract_text_from_pdf` for the whole document"""
+    content = {
+        f"page_{page_number}": page.get_text()
+        for page_number, page in enumerate(doc, start=1)
+    }
+    return {
+        "status": "success",
+        "pages": len(content),
+        "total_pages": len(content),
+        "next_cursor": None,
+        "content": content,
+    }
+
+
+def _describe_images(doc):
+    """Image metadata as in `extract_images_from_pdf`, nothing is stored"""
+    images = [image for image, _ in iter_unique_images(doc)]
+    return {
+        "status": "success",
+        "total_pages": doc.page_count,
+        "total_images": len(images),
+        "total_occurrences": sum(len(image["pages"]) for image in images),
+        "images": images,
+        "pages": map_pages_to_images(images),
+    }
+
+
+# Operation -> (result cache name, worker function)
+BATCH_OPERATIONS = {
+    "extract-text": ("extract_text", _extract_text),
+    "extract-images": ("image_metadata", _describe_images),
+    "page-count": ("page_count", _count_pages),
+}
+
+
+def _run_operation(operation, path):
+    """Worker: open one shared document by path and process it"""
+    try:
+        doc = pymupdf.open(path, filetype="pdf")
+    except Exception as e:
+        raise Exception(f"Error opening PDF: {str(e)}")
+
+    try:
+        return BATCH_OPERATIONS[operation][1](doc)
+    except Exception as e:
+        raise Exception(f"Error processing PDF: {str(e)}")
+    finally:
+        doc.close()
+
+
+def _close_when_done(future, pdf_file=None):
+    """Release the file of a future that is abandoned while still running"""
+
+    def close(future):
+        if pdf_file is not None:
+            pdf_file.close()
+        elif not future.cancelled() and future.exception() is None:
+            downloaded = future.result()[1]
+            if downloaded is not None:
+                downloaded.close()
+
+    future.add_done_callback(close)
+
+
+def iter_batch_results(operation, file_keys, on_result=None, prefetch=None):
+    """
+    Run `operation` on each S3 document and yield one item per document
+    as soon as it is done, so in completion order rather than input order:
+    {"index", "fileKey", "status": "success", "cached", "data"} or
+    {"index", "fileKey", "status": "error", "error"}, followed by a summary.
+    A failing document is reported in its item and never stops the batch.
+    At most `prefetch` documents (PDF_BATCH_PREFETCH by default) are being
+    downloaded or processed at any time. Downloads run on threads and the
+    documents are processed on the shared process pool. Results go through
+    the result cache keyed by the S3 ETag, so a hit skips the download.
+    `on_result(file_key, fingerprint, result, pdf_file)` is called from the
+    consuming thread for every successful document; `pdf_file` is None for
+    cached results.
+    """
+    if operation not in BATCH_OPERATIONS:
+        raise ValueError(
+            f"operation must be one of: {', '.join(BATCH_OPERATIONS)}"
+        )
+
+    cache_name = BATCH_OPERATIONS[operation][0]
+    prefetch = prefetch or settings.PDF_BATCH_PREFETCH
+    cache = get_result_cache()
+
+    def fetch(file_key):
+        fingerprint, pdf_file = fingerprint_s3_file(file_key)
+        result = cache.get(make_cache_key(cache_name, fingerprint))
+        if result is not None:
+            if pdf_file is not None:
+                pdf_file.close()
+            return fingerprint, None, result
+        if pdf_file is None:
+            pdf_file = get_file_from_s3(file_key)
+        return fingerprint, pdf_file, None
+
+    keys = enumerate(file_keys)
+    # future -> (index, file key, (fingerprint, pdf_file) once downloaded)
+    pending = {}
+    succeeded = failed = 0
+
+    executor = ThreadPoolExecutor(
+        max_workers=prefetch, thread_name_prefix="pdf-batch"
+    )
+
+    def start(count):
+        for index, file_key in itertools.islice(keys, count):
+            future = executor.submit(
+                contextvars.copy_context().run, fetch, file_key
+            )
+            pending[future] = (index, file_key, None)
+
+    try:
+        start(prefetch)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, file_key, downloaded = pending.pop(future)
+                item = {"index": index, "fileKey": file_key}
+                pdf_file = None
+                try:
+                    if downloaded is None:
+                        fingerprint, pdf_file, result = future.result()
+                        if result is None:
+                            # Downloaded: hand the document to the pool
+                            with SharedDocument(pdf_file) as document:
+                                process = document.hold(
+                                    get_process_pool().submit(
+                                        _run_operation, operation, document.path
+                                    )
+                                )
+                            pending[process] = (
+                                index,
+                                file_key,
+                                (fingerprint, pdf_file),
+                            )
+                            pdf_file = None
+                            continue
+                        cached = True
+                    else:
+                        fingerprint, pdf_file = downloaded
+                        result = future.result()
+                        cache.set(make_cache_key(cache_name, fingerprint), result)
+                        record(pages=result.get("total_pages", 0))
+                        cached = False
+
+                    if on_result is not None:
+                        on_result(file_key, fingerprint, result, pdf_file)
+                    item.update(status="success", cached=cached, data=result)
+                    succeeded += 1
+                except Exception as e:
+                    item.update(status="error", error=str(e))
+                    failed += 1
+                finally:
+                    if pdf_file is not None:
+                        pdf_file.close()
+
+                yield item
+                start(1)
+
+        yield {
+            "status": "success",
+            "total": succeeded + failed,
+            "succeeded": succeeded,
+            "failed": failed,
+        }
+    finally:
+        # The consumer went away early: drop queued work and release the
+        # files of downloads and documents that are still in flight
+        for future, (_, _, downloaded) in pending.items():
+            future.cancel()
+            _close_when_done(future, downloaded[1] if downloaded else None)
+        executor.shutdown(wait=False, cancel_futures=True)
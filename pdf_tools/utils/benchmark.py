@@ -0,0 +1,333 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from pdf_tools.utils.cache import hash_file
+from pdf_tools.utils.lazy import lazy_import
+
+pymupdf = lazy_import("pymupdf")
+
+
+LOREM = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua ut enim ad minim"
+).split()
+
+
+def _document_bytes(doc):
+    """
+    Serialize and close a generated document without the timestamps and
+    random file ID PyMuPDF adds, so every run produces the same bytes
+    """
+    doc.set_metadata({})
+    data = doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+    return data
+
+
+def build_text_document(pages, lines_per_page=45):
+    """Generate a deterministic text-heavy PDF and return its bytes"""
+    doc = pymupdf.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = "\n".join(
+            f"Page {page_num + 1} line {line + 1}: lorem ipsum dolor sit amet "
+            "consectetur adipiscing elit sed do eiusmod tempor"
+            for line in range(lines_per_page)
+        )
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=9)
+    return _document_bytes(doc)
+
+
+def build_image_document(pages, images_per_page=3, size=600, seed=1):
+    """
+    Generate a PDF with distinct photo-like RGB images (upscaled noise) on
+    every page, plus a caption so pages also carry some text
+    """
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((36, 36), f"Figure page {page_num + 1}", fontsize=12)
+        for index in range(images_per_page):
+            cells = size // 8
+            noise = pymupdf.Pixmap(
+                pymupdf.csRGB, cells, cells, rng.randbytes(cells * cells * 3), 0
+            )
+            image = pymupdf.Pixmap(noise, size, size).tobytes("jpg", jpg_quality=85)
+            top = 60 + index * 240
+            page.insert_image(pymupdf.Rect(72, top, 312, top + 220), stream=image)
+    return _document_bytes(doc)
+
+
+def build_scanned_document(pages, dpi=100):
+    """
+    Generate a scan-like PDF: each page is a single grayscale image of a
+    rendered text page, without any text layer
+    """
+    source = pymupdf.open(stream=build_text_document(pages), filetype="pdf")
+    doc = pymupdf.open()
+    for source_page in source:
+        pixmap = source_page.get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY)
+        page = doc.new_page(width=source_page.rect.width, height=source_page.rect.height)
+        page.insert_image(page.rect, pixmap=pixmap)
+    source.close()
+    return _document_bytes(doc)
+
+
+def build_short_document(pages, seed=1):
+    """Generate a small PDF with a few lines of text per page"""
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        words = " ".join(rng.choice(LOREM) for _ in range(40))
+        page.insert_textbox(
+            page.rect + (36, 36, -36, -36),
+            f"Document {seed} page {page_num + 1}\n{words}",
+            fontsize=11,
+        )
+    return _document_bytes(doc)
+
+
+def build_corpus(directory, scale=1.0):
+    """
+    Write the benchmark corpus to `directory`. The same scale always gives
+    byte-identical files.
+    Returns {name: [paths]}; every entry holds one file except
+    "many_small_files".
+    """
+    def pages(count):
+        return max(1, int(count * scale))
+
+    documents = {
+        "text_heavy": lambda: build_text_document(pages(200)),
+        "image_heavy": lambda: build_image_document(pages(20)),
+        "scanned": lambda: build_scanned_document(pages(30)),
+        "many_pages": lambda: build_short_document(pages(2000)),
+    }
+
+    os.makedirs(directory, exist_ok=True)
+    corpus = {}
+    for name, build in documents.items():
+        path = os.path.join(directory, f"{name}.pdf")
+        with open(path, "wb") as f:
+            f.write(build())
+        corpus[name] = [path]
+
+    corpus["many_small_files"] = []
+    for index in range(pages(50)):
+        path = os.path.join(directory, f"small_{index:03d}.pdf")
+        with open(path, "wb") as f:
+            f.write(build_short_document(2, seed=index))
+        corpus["many_small_files"].append(path)
+    return corpus
+
+
+def corpus_digest(corpus):
+    """SHA-256 over every corpus file, to tell whether baselines are comparable"""
+    digest = hashlib.sha256()
+    for name in sorted(corpus):
+        for path in corpus[name]:
+            with open(path, "rb") as f:
+                digest.update(hash_file(f).encode("ascii"))
+    return digest.hexdigest()
+
+
+def page_count(paths):
+    total = 0
+    for path in paths:
+        with pymupdf.open(path) as doc:
+            total += doc.page_count
+    return total
+
+
+def _operations():
+    from pdf_tools.utils.layout import extract_layout
+    from pdf_tools.utils.utils import (
+        compress_pdf,
+        extract_images_from_pdf,
+        extract_text_from_pdf,
+        merge_pdfs,
+        split_pdf_to_pages,
+    )
+
+    return {
+        "extract_text": lambda paths: extract_text_from_pdf(paths[0]),
+        "extract_images": lambda paths: extract_images_from_pdf(paths[0]),
+        "extract_layout": lambda paths: extract_layout(paths[0]),
+        "split": lambda paths: split_pdf_to_pages(paths[0], "benchmark/split"),
+        "merge": lambda paths: merge_pdfs(paths, output_subdir="benchmark/merge"),
+        "compress": lambda paths: compress_pdf(
+            paths[0], "mid", "pymupdf", "benchmark/compress"
+        ),
+        "compress_ghostscript": lambda paths: compress_pdf(
+            paths[0], "mid", "ghostscript", "benchmark/compress"
+        ),
+    }
+
+
+# (operation, corpus entry) pairs measured by default
+CASES = [
+    ("extract_text", "text_heavy"),
+    ("extract_text", "scanned"),
+    ("extract_text", "many_pages"),
+    ("extract_layout", "text_heavy"),
+    ("extract_images", "image_heavy"),
+    ("extract_images", "scanned"),
+    ("split", "text_heavy"),
+    ("split", "many_pages"),
+    ("merge", "many_small_files"),
+    ("merge", "text_heavy"),
+    ("compress", "text_heavy"),
+    ("compress", "image_heavy"),
+    ("compress", "scanned"),
+    ("compress_ghostscript", "image_heavy"),
+]
+
+
+def _memory_status(field):
+    """VmRSS / VmHWM (peak RSS) of this process in bytes"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _reset_peak_rss():
+    """
+    Reset VmHWM so the peak only covers what runs next. The peak is
+    otherwise inherited across fork/exec from the parent process.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _run_case(operation, paths, repeat, media_root):
+    """
+    Run one case in a fresh process so peak memory is not polluted by
+    earlier cases. Returns (best seconds, peak RSS growth in bytes).
+    """
+    import django
+
+    django.setup()
+    from django.test import override_settings
+
+    with override_settings(MEDIA_ROOT=media_root):
+        run = _operations()[operation]
+        _reset_peak_rss()
+        rss_before = _memory_status("VmRSS")
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run(paths)
+            timings.append(time.perf_counter() - started)
+            shutil.rmtree(os.path.join(media_root, "benchmark"), ignore_errors=True)
+            shutil.rmtree(os.path.join(media_root, "images"), ignore_errors=True)
+
+    peak_rss = _memory_status("VmHWM")
+    return min(timings), max(peak_rss - rss_before, 0)
+
+
+def run_benchmarks(corpus, media_root, cases=None, repeat=3):
+    """
+    Measure each (operation, corpus entry) case.
+    Yields one result dict per case as soon as it has been measured.
+    """
+    context = multiprocessing.get_context(settings.PDF_PARALLEL_START_METHOD)
+    for operation, name in cases or CASES:
+        paths = corpus[name]
+        case = f"{operation}/{name}"
+        if operation == "compress_ghostscript" and not shutil.which(
+            settings.PDF_GS_BINARY
+        ):
+            yield {"case": case, "skipped": "Ghostscript is not installed"}
+            continue
+
+        pages = page_count(paths)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            seconds, peak_rss = pool.submit(
+                _run_case, operation, paths, repeat, media_root
+            ).result()
+
+        yield {
+            "case": case,
+            "pages": pages,
+            "seconds": round(seconds, 4),
+            "pages_per_second": round(pages / seconds, 1) if seconds else None,
+            "peak_rss_mb": round(peak_rss / 1024 / 1024, 1),
+        }
+
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "pymupdf": pymupdf.VersionBind,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_baseline(path, results, scale, corpus):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "machine": machine_info(),
+                "scale": scale,
+                "corpus": corpus_digest(corpus),
+                "results": {
+                    result["case"]: result
+                    for result in results
+                    if "skipped" not in result
+                },
+            },
+            f,
+            indent=2,
+        )
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def find_regressions(results, baseline, threshold, memory_threshold):
+    """
+    Compare results against a saved baseline.
+    Returns a list of messages for cases slower than (1 + threshold) times
+    the baseline or using more than (1 + memory_threshold) times its memory.
+    """
+    regressions = []
+    for result in results:
+        previous = baseline["results"].get(result["case"])
+        if previous is None or "skipped" in result:
+            continue
+
+        if result["seconds"] > previous["seconds"] * (1 + threshold):
+            regressions.append(
+                f"{result['case']}: {result['seconds']:.3f}s vs "
+                f"{previous['seconds']:.3f}s baseline"
+            )
+        # Ignore noise on cases that barely allocate
+        if result["peak_rss_mb"] > max(previous["peak_rss_mb"], 1) * (
+            1 + memory_threshold
+        ):
+            regressions.append(
+                f"{result['case']}: {result['peak_rss_mb']} MB vs "
+                f"{previous['peak_rss_mb']} MB baseline"
+            )
+    return regressions
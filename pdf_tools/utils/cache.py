@@ -0,0 +1,366 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from pdf_tools.utils.metrics import span
+
+
+class MemoryCache:
+    """In-process LRU cache bounded by entry count, total bytes and TTL"""
+
+    name = "memory"
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            payload, expires_at = entry
+            if expires_at and expires_at < time.time():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            expires_at = time.time() + self.ttl if self.ttl else None
+            self._entries[key] = (payload, expires_at)
+            self._size += len(payload)
+
+            # Evict least recently used entries until we are within bounds
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or self._size > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._size}
+
+    def _remove(self, key):
+        payload, _ = self._entries.pop(key)
+        self._size -= len(payload)
+
+
+class DiskCache:
+    """
+    Local disk cache storing one file per entry.
+    Entries expire by modification time and are evicted least recently
+    accessed first once the directory grows past `max_bytes`.
+    """
+
+    name = "disk"
+    extensions = (".json",)
+
+    def __init__(self, directory, max_bytes, ttl):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._size = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl and stat.st_mtime + self.ttl < time.time():
+                self.remove(path)
+                return None
+
+            with open(path, "rb") as f:
+                payload = f.read()
+
+            # Bump the access time so eviction follows LRU order
+            os.utime(path, (time.time(), stat.st_mtime))
+            return payload
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+
+        write_file(self._path(key), payload)
+        self.added(len(payload))
+
+    def added(self, size):
+        """Account for `size` bytes written to the directory, evicting if needed"""
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size
+
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            for path, _ in self._iter_entries():
+                self._unlink(path)
+            self._size = 0
+
+    def evict(self, now=None):
+        """
+        Remove expired entries, then least recently accessed ones until the
+        directory fits in `max_bytes`. Returns (entries removed, bytes freed).
+        """
+        with self._lock:
+            return self._evict(now)
+
+    def remove(self, path):
+        """Delete one entry file, returning whether it was there"""
+        with self._lock:
+            try:
+                size = os.stat(path).st_size
+            except FileNotFoundError:
+                return False
+            if not self._unlink(path):
+                return False
+            if self._size is not None:
+                self._size = max(self._size - size, 0)
+            return True
+
+    def iter_entries(self):
+        """Yield (path, stat) for each entry file"""
+        return self._iter_entries()
+
+    def stats(self):
+        entries = list(self._iter_entries())
+        return {
+            "entries": len(entries),
+            "bytes": sum(stat.st_size for _, stat in entries),
+        }
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def _iter_entries(self):
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if not filename.endswith(self.extensions):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+    def _scan_size(self):
+        return sum(stat.st_size for _, stat in self._iter_entries())
+
+    def _evict(self, now=None):
+        # Callers hold self._lock
+        now = now or time.time()
+        entries = sorted(self._iter_entries(), key=lambda e: e[1].st_atime)
+        size = sum(stat.st_size for _, stat in entries)
+        removed = freed = 0
+
+        for path, stat in entries:
+            expired = self.ttl and stat.st_mtime + self.ttl < now
+            if not expired and size <= self.max_bytes:
+                continue
+            if self._unlink(path):
+                removed += 1
+                freed += stat.st_size
+            size -= stat.st_size
+
+        self._size = size
+        return removed, freed
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+def write_file(path, payload):
+    """
+    Write `payload` to `path` through a temporary name so readers never see
+    partial files
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(payload)
+    os.replace(temp_path, path)
+
+
+class DjangoCache:
+    """Adapter storing entries in one of the configured Django cache backends"""
+
+    name = "django"
+
+    def __init__(self, alias, ttl):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, payload):
+        self.backend.set(key, payload, timeout=self.ttl or None)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {"alias": self.alias}
+
+
+class ResultCache:
+    """
+    Tiered cache for JSON-serializable results.
+    Tiers are checked in order; a hit in a slower tier is copied into the
+    faster tiers in front of it.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self._lock = threading.Lock()
+        self._hits = {tier.name: 0 for tier in tiers}
+        self._misses = 0
+
+    def get(self, key):
+        with span("cache.get"):
+            return self._get(key)
+
+    def _get(self, key):
+        for index, tier in enumerate(self.tiers):
+            payload = tier.get(key)
+            if payload is None:
+                continue
+
+            for faster_tier in self.tiers[:index]:
+                faster_tier.set(key, payload)
+
+            with self._lock:
+                self._hits[tier.name] += 1
+            return json.loads(payload)
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, key, value):
+        if not self.tiers:
+            return
+
+        payload = json.dumps(value).encode("utf-8")
+        for tier in self.tiers:
+            tier.set(key, payload)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self._hits.values())
+            misses = self._misses
+            tier_hits = dict(self._hits)
+
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "tiers": [
+                {"backend": tier.name, "hits": tier_hits[tier.name], **tier.stats()}
+                for tier in self.tiers
+            ],
+        }
+
+
+def make_cache_key(operation, fingerprint, **params):
+    """
+    Build a cache key from an operation name, a content fingerprint
+    (S3 ETag or SHA-256 of the bytes) and any options that affect the result
+    """
+    parts = [operation, fingerprint]
+    parts.extend(f"{name}={params[name]}" for name in sorted(params))
+    return "pdf_tools:" + ":".join(str(part) for part in parts)
+
+
+def hash_file(pdf_file, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file-like object and rewind it"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: pdf_file.read(chunk_size), b""):
+        digest.update(chunk)
+    pdf_file.seek(0)
+    return digest.hexdigest()
+
+
+def build_result_cache(config):
+    """Create a ResultCache from a `PDF_RESULT_CACHE` style dictionary"""
+    tiers = []
+    for backend in config["BACKENDS"]:
+        if backend == "memory":
+            tiers.append(
+                MemoryCache(
+                    config["MAX_ENTRIES"], config["MAX_BYTES"], config["TTL"]
+                )
+            )
+        elif backend == "disk":
+            tiers.append(
+                DiskCache(config["DIR"], config["DISK_MAX_BYTES"], config["TTL"])
+            )
+        elif backend == "django":
+            tiers.append(DjangoCache(config["DJANGO_CACHE_ALIAS"], config["TTL"]))
+        else:
+            raise ValueError(f"Unknown result cache backend: {backend}")
+    return ResultCache(tiers)
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Return the process-wide result cache configured in settings"""
+    global _result_cache
+
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = build_result_cache(settings.PDF_RESULT_CACHE)
+    return _result_cache
@@ -0,0 +1,216 @@
+import fcntl
+import os
+import shutil
+import subprocess
+import time
+
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from pdf_tools.utils.lazy import lazy_import
+from pdf_tools.utils.metrics import observe_stage, record, span
+
+pymupdf = lazy_import("pymupdf")
+
+
+@contextmanager
+def ghostscript_slot():
+    """
+    Hold one of PDF_GS_MAX_CONCURRENCY slots for the duration of a
+    Ghostscript run. Slots are lock files, so the cap is shared by every
+    worker process on the machine, not just the threads of this one.
+    """
+    lock_dir = settings.PDF_GS_LOCK_DIR
+    os.makedirs(lock_dir, exist_ok=True)
+    deadline = time.monotonic() + settings.PDF_GS_QUEUE_TIMEOUT
+
+    while True:
+        for slot in range(settings.PDF_GS_MAX_CONCURRENCY):
+            lock_file = open(os.path.join(lock_dir, f"gs-slot-{slot}.lock"), "w")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            return
+
+        if time.monotonic() > deadline:
+            raise Exception("Timed out waiting for a free Ghostscript worker")
+        time.sleep(0.1)
+
+
+class GhostscriptEngine:
+    """
+    Compress with Ghostscript's pdfwrite device in a separate `gs` process.
+    libgs is not reentrant, so every job gets its own process; runs are
+    capped machine-wide and killed after PDF_GS_TIMEOUT seconds.
+    """
+
+    name = "ghostscript"
+
+    # Ghostscript compression settings for each level
+    PDF_SETTINGS = {
+        "low": "/screen",
+        "mid": "/ebook",
+        "high": "/prepress",
+    }
+
+    @staticmethod
+    def available():
+        return shutil.which(settings.PDF_GS_BINARY) is not None
+
+    def compress(self, input_path, output_path, compression_level):
+        args = [
+            settings.PDF_GS_BINARY,
+            "-sDEVICE=pdfwrite",
+            f"-dPDFSETTINGS={self.PDF_SETTINGS[compression_level]}",
+            "-dNOPAUSE",
+            "-dQUIET",
+            "-dBATCH",
+            "-dSAFER",
+            f"-sOutputFile={output_path}",
+            input_path,
+        ]
+
+        with ghostscript_slot():
+            try:
+                subprocess.run(
+                    args,
+                    check=True,
+                    capture_output=True,
+                    timeout=settings.PDF_GS_TIMEOUT,
+                )
+            except subprocess.TimeoutExpired:
+                raise Exception(
+                    f"Ghostscript timed out after {settings.PDF_GS_TIMEOUT} seconds"
+                )
+            except subprocess.CalledProcessError as e:
+                message = e.stderr.decode("utf-8", "replace").strip()
+                raise Exception(f"Ghostscript failed: {message}")
+            except FileNotFoundError:
+                raise Exception("Ghostscript is not installed")
+
+
+class PyMuPDFEngine:
+    """
+    Fast in-process compression: downsample and recompress images, then
+    save with garbage collection, deflated streams and object streams
+    """
+
+    name = "pymupdf"
+
+    # (dpi threshold, dpi target, JPEG quality) for each level
+    IMAGE_SETTINGS = {
+        "low": (96, 72, 50),
+        "mid": (180, 150, 70),
+        "high": (360, 300, 85),
+    }
+
+    @staticmethod
+    def available():
+        return True
+
+    def compress(self, input_path, output_path, compression_level):
+        dpi_threshold, dpi_target, quality = self.IMAGE_SETTINGS[compression_level]
+
+        doc = pymupdf.open(input_path)
+        try:
+            doc.rewrite_images(
+                dpi_threshold=dpi_threshold,
+                dpi_target=dpi_target,
+                quality=quality,
+            )
+            doc.save(
+                output_path,
+                garbage=4,
+                clean=True,
+                deflate=True,
+                deflate_images=True,
+                deflate_fonts=True,
+                use_objstms=1,
+            )
+        finally:
+            doc.close()
+
+
+ENGINES = {
+    GhostscriptEngine.name: GhostscriptEngine,
+    PyMuPDFEngine.name: PyMuPDFEngine,
+}
+
+# Every engine maps the same levels onto its own settings
+COMPRESSION_LEVELS = tuple(GhostscriptEngine.PDF_SETTINGS)
+
+
+def image_share(input_path):
+    """Fraction of the file taken by image streams"""
+    file_size = os.path.getsize(input_path) or 1
+    image_bytes = 0
+
+    doc = pymupdf.open(input_path)
+    try:
+        seen = set()
+        for page in doc:
+            for img in page.get_images(full=True):
+                xref = img[0]
+                if xref in seen:
+                    continue
+                seen.add(xref)
+                length = doc.xref_get_key(xref, "Length")
+                if length[0] == "int":
+                    image_bytes += int(length[1])
+    finally:
+        doc.close()
+
+    return image_bytes / file_size
+
+
+def choose_engine(input_path):
+    """
+    Pick an engine from the document profile: image-heavy documents (scans,
+    photo brochures) gain most from Ghostscript's full re-rendering, the
+    rest is compressed faster in-process by PyMuPDF
+    """
+    if GhostscriptEngine.available() and (
+        image_share(input_path) >= settings.PDF_COMPRESS_IMAGE_SHARE
+    ):
+        return GhostscriptEngine.name
+    return PyMuPDFEngine.name
+
+
+def run_compression(input_path, output_path, compression_level, engine="auto"):
+    """
+    Compress `input_path` into `output_path` with the named engine ("auto",
+    "ghostscript" or "pymupdf").
+    Returns sizes and timing so engines can be compared.
+    """
+    if engine in (None, "", "auto"):
+        with span("compress.choose_engine"):
+            engine = choose_engine(input_path)
+    if engine not in ENGINES:
+        raise Exception(f"Unknown compression engine: {engine}")
+    if compression_level not in COMPRESSION_LEVELS:
+        raise Exception(f"Unknown compression level: {compression_level}")
+
+    started = time.perf_counter()
+    ENGINES[engine]().compress(input_path, output_path, compression_level)
+    seconds = time.perf_counter() - started
+    observe_stage(f"compress.{engine}", seconds)
+
+    input_size = os.path.getsize(input_path)
+    output_size = os.path.getsize(output_path)
+    record(bytes_out=output_size)
+    return {
+        "engine": engine,
+        "input_size": input_size,
+        "output_size": output_size,
+        "ratio": round(output_size / input_size, 4) if input_size else None,
+        "seconds": round(seconds, 3),
+    }
@@ -0,0 +1,246 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from pdf_tools.utils.lazy import lazy_import
+from pdf_tools.utils.metrics import span
+
+pymupdf = lazy_import("pymupdf")
+
+
+class SpooledPDF:
+    """
+    Write-once buffer for downloaded PDFs.
+    Data is kept in memory until it grows past `max_size` bytes, then moved
+    to a named temporary file so PyMuPDF can open it by path. The temporary
+    file is removed when the buffer is closed.
+    """
+
+    def __init__(self, max_size=None, directory=None):
+        if max_size is None:
+            max_size = settings.PDF_SPOOL_MAX_MEMORY
+        self.max_size = max_size
+        self.directory = directory or settings.PDF_SPOOL_DIR
+        self._file = io.BytesIO()
+        self._temp_file = None
+
+    @property
+    def path(self):
+        """Path of the spilled file, or None while the data is in memory"""
+        return self._temp_file.name if self._temp_file else None
+
+    @property
+    def in_memory(self):
+        return self._temp_file is None
+
+    def write(self, data):
+        if self.in_memory and self._file.tell() + len(data) > self.max_size:
+            self.rollover()
+        return self._file.write(data)
+
+    def rollover(self):
+        """Move the in-memory data to a temporary file on disk"""
+        if not self.in_memory:
+            return
+
+        self._temp_file = tempfile.NamedTemporaryFile(
+            suffix=".pdf", dir=self.directory
+        )
+        position = self._file.tell()
+        self._temp_file.write(self._file.getbuffer())
+        self._temp_file.seek(position)
+        self._file = self._temp_file
+
+    def getbuffer(self):
+        """Zero-copy view of the data while it is still held in memory"""
+        return self._file.getbuffer()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        try:
+            self._file.close()
+        except BufferError:
+            # A document opened on getbuffer() is still alive; the memory
+            # is released together with it
+            pass
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def shard_path(subdir, filename, key=None):
+    """
+    Place `filename` in one of 256 subdirectories of `subdir`, picked from
+    the first two hex digits of `key` (random by default), so no single
+    directory ends up holding millions of entries
+    """
+    key = key or uuid.uuid4().hex
+    return f"{subdir}/{key[:2]}/{filename}"
+
+
+def get_pdf_path(pdf_file):
+    """Return a filesystem path for `pdf_file` if its data is already on disk"""
+    if isinstance(pdf_file, (str, os.PathLike)):
+        return os.fspath(pdf_file)
+    if getattr(pdf_file, "path", None):
+        return pdf_file.path
+    if hasattr(pdf_file, "temporary_file_path"):
+        # Django's TemporaryUploadedFile for large uploads
+        return pdf_file.temporary_file_path()
+    return None
+
+
+def get_pdf_buffer(pdf_file):
+    """
+    Return the contents of an in-memory file as a memoryview without copying,
+    or None if the object does not expose its buffer
+    """
+    for candidate in (pdf_file, getattr(pdf_file, "file", None)):
+        if hasattr(candidate, "getbuffer"):
+            return candidate.getbuffer()
+    return None
+
+
+def open_pdf(pdf_file):
+    """
+    Open a PDF with PyMuPDF avoiding extra copies of its bytes:
+    spilled downloads and large uploads are opened by path, in-memory
+    buffers are shared with PyMuPDF, anything else is read once.
+    """
+    with span("pdf.open"):
+        path = get_pdf_path(pdf_file)
+        if path:
+            return pymupdf.open(path, filetype="pdf")
+
+        buffer = get_pdf_buffer(pdf_file)
+        if buffer is not None:
+            return pymupdf.open(stream=buffer, filetype="pdf")
+
+        return pymupdf.open(stream=pdf_file.read(), filetype="pdf")
+
+
+def get_shared_dir(size):
+    """
+    Directory for documents shared with worker processes: PDF_SHARED_DIR
+    (a tmpfs such as /dev/shm by default) when it has room for `size`
+    bytes, PDF_SPOOL_DIR otherwise
+    """
+    directory = settings.PDF_SHARED_DIR
+    if directory:
+        try:
+            stats = os.statvfs(directory)
+            if stats.f_bavail * stats.f_frsize > size:
+                return directory
+        except OSError:
+            pass
+    return settings.PDF_SPOOL_DIR
+
+
+class SharedDocument:
+    """
+    Reference-counted handle that lets worker processes open a PDF by path
+    instead of receiving a pickled copy of its bytes.
+    Data already on disk (spilled downloads, uploads) is used in place;
+    anything else is written once to a temporary file in `get_shared_dir`,
+    which every worker then reads through the same page cache. That file is
+    removed when the last reference is released. The creator holds the
+    first reference; `hold(future)` keeps the document for a pool task.
+    """
+
+    def __init__(self, pdf_file):
+        self._lock = threading.Lock()
+        self._references = 1
+        self.path = get_pdf_path(pdf_file)
+        self.owned = self.path is None
+        if self.owned:
+            self.path = self._write(pdf_file)
+
+    @staticmethod
+    def _write(pdf_file):
+        buffer = get_pdf_buffer(pdf_file)
+        if buffer is not None:
+            size = buffer.nbytes
+        else:
+            pdf_file.seek(0, os.SEEK_END)
+            size = pdf_file.tell()
+            pdf_file.seek(0)
+
+        with span("pdf.share"):
+            temp_file = tempfile.NamedTemporaryFile(
+                suffix=".pdf", dir=get_shared_dir(size), delete=False
+            )
+            try:
+                with temp_file:
+                    if buffer is not None:
+                        temp_file.write(buffer)
+                    else:
+                        shutil.copyfileobj(pdf_file, temp_file)
+                        pdf_file.seek(0)
+            except Exception:
+                os.unlink(temp_file.name)
+                raise
+        return temp_file.name
+
+    def acquire(self):
+        with self._lock:
+            if self._references == 0:
+                raise ValueError("Document has already been released")
+            self._references += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._references -= 1
+            remove = self._references == 0 and self.owned
+        if remove:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def hold(self, future):
+        """Keep the document until `future` is done; returns the future"""
+        self.acquire()
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+@contextmanager
+def pdf_on_disk(pdf_file):
+    """
+    Yield a filesystem path for `pdf_file`, writing it to a temporary file
+    only when the data is not already on disk
+    """
+    with SharedDocument(pdf_file) as document:
+        yield document.path
@@ -0,0 +1,201 @@
+import logging
+import os
+import threading
+import time
+
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from pdf_tools.models import PDFJob
+from pdf_tools.utils.artifacts import get_artifact_store
+from pdf_tools.utils.render import get_render_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+def iter_expired_files(subdir, ttl, now=None):
+    """Yield (path, stat) for files under MEDIA_ROOT/subdir older than `ttl`"""
+    directory = os.path.join(settings.MEDIA_ROOT, subdir)
+    now = now or time.time()
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime + ttl < now:
+                yield path, stat
+
+
+def iter_managed_files():
+    """Yield (path, stat) for every file in the PDF_JANITOR_DIRS directories"""
+    for subdir in settings.PDF_JANITOR_DIRS:
+        directory = os.path.join(settings.MEDIA_ROOT, subdir)
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+
+def remove_file(path):
+    """Delete a file and any shard directories it leaves empty"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+
+    directory = os.path.dirname(path)
+    media_root = os.path.abspath(settings.MEDIA_ROOT)
+    while os.path.abspath(directory) != media_root:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+    return True
+
+
+def get_active_job_dirs():
+    """
+    Input directories (`jobs/<id[:2]>/<id>`) of queued and running jobs,
+    which must be kept whatever their age
+    """
+    job_ids = PDFJob.objects.filter(
+        state__in=[PDFJob.STATE_QUEUED, PDFJob.STATE_RUNNING]
+    ).values_list("id", flat=True)
+    return {
+        os.path.join(settings.MEDIA_ROOT, "jobs", job_id.hex[:2], str(job_id))
+        for job_id in job_ids
+    }
+
+
+def delete_finished_jobs(now=None):
+    """
+    Delete jobs that finished more than PDF_JOBS_RETENTION seconds ago,
+    with any inputs they left behind. Returns the number of jobs deleted.
+    """
+    if not settings.PDF_JOBS_RETENTION:
+        return 0
+
+    now = datetime.fromtimestamp(now or time.time(), tz=timezone.utc)
+    jobs = PDFJob.objects.filter(
+        state__in=[PDFJob.STATE_SUCCEEDED, PDFJob.STATE_FAILED],
+        finished_at__lt=now - timedelta(seconds=settings.PDF_JOBS_RETENTION),
+    )
+    deleted = 0
+    for job in jobs.iterator():
+        for path in job.input_paths:
+            remove_file(os.path.join(settings.MEDIA_ROOT, path))
+        job.delete()
+        deleted += 1
+    return deleted
+
+
+def sweep(now=None):
+    """
+    Run one cleanup pass over media storage:
+        1. delete files in PDF_JANITOR_DIRS older than their TTL, except
+           the inputs of queued and running jobs
+        2. delete jobs that finished more than PDF_JOBS_RETENTION ago
+        3. delete expired artifacts and rendered pages and enforce the
+           artifact store and render cache bounds
+        4. while media uses more than PDF_MEDIA_MAX_BYTES, delete the oldest
+           files and least recently used artifacts and rendered pages first
+    Artifacts and rendered pages are removed through their store so its
+    size accounting stays right.
+    Returns counters describing what was removed.
+    """
+    now = now or time.time()
+    stats = {
+        "expired_files": 0,
+        "expired_jobs": 0,
+        "expired_artifacts": 0,
+        "expired_renders": 0,
+        "quota_removed": 0,
+    }
+    freed = 0
+    active_job_dirs = get_active_job_dirs()
+
+    for subdir, ttl in settings.PDF_JANITOR_DIRS.items():
+        for path, stat in iter_expired_files(subdir, ttl, now):
+            if os.path.dirname(path) in active_job_dirs:
+                continue
+            if remove_file(path):
+                stats["expired_files"] += 1
+                freed += stat.st_size
+
+    stats["expired_jobs"] = delete_finished_jobs(now)
+
+    store = get_artifact_store()
+    removed, artifact_bytes = store.evict(now)
+    stats["expired_artifacts"] = removed
+    freed += artifact_bytes
+
+    render_cache = get_render_cache()
+    removed, render_bytes = render_cache.evict(now)
+    stats["expired_renders"] = removed
+    freed += render_bytes
+
+    # Oldest first across loose files, artifacts and rendered pages
+    candidates = [
+        (stat.st_mtime, stat.st_size, path, remove_file)
+        for path, stat in iter_managed_files()
+        if os.path.dirname(path) not in active_job_dirs
+    ]
+    candidates.extend(
+        (artifact["accessed_at"], artifact["bytes"], artifact["path"], store.remove)
+        for artifact in store.iter_artifacts()
+    )
+    candidates.extend(
+        (stat.st_atime, stat.st_size, path, render_cache.remove)
+        for path, stat in render_cache.iter_entries()
+    )
+    total = sum(size for _, size, _, _ in candidates)
+
+    for _, size, path, remove in sorted(candidates, key=lambda c: c[:3]):
+        if total <= settings.PDF_MEDIA_MAX_BYTES:
+            break
+        if remove(path):
+            total -= size
+            freed += size
+            stats["quota_removed"] += 1
+
+    stats["freed_bytes"] = freed
+    stats["total_bytes"] = total
+    return stats
+
+
+def run_janitor(stop_event, interval=None):
+    """Sweep media storage every `interval` seconds until `stop_event` is set"""
+    interval = interval or settings.PDF_JANITOR_INTERVAL
+    while not stop_event.is_set():
+        try:
+            stats = sweep()
+            logger.info("Media janitor: %s", stats)
+        except Exception as e:
+            logger.warning("Media janitor failed: %s", str(e))
+        stop_event.wait(interval)
+
+
+def start_janitor(stop_event=None):
+    """
+    Start the janitor in a daemon thread of the current process.
+    Returns the thread, or None when PDF_JANITOR_INTERVAL is 0.
+    """
+    if not settings.PDF_JANITOR_INTERVAL:
+        return None
+
+    thread = threading.Thread(
+        target=run_janitor,
+        args=(stop_event or threading.Event(),),
+        name="pdf-media-janitor",
+        daemon=True,
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,315 @@
+import itertools
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from pdf_tools.models import PDFJob
+from pdf_tools.utils.artifacts import (
+    combine_fingerprints,
+    fingerprint_files,
+    get_artifact_store,
+)
+from pdf_tools.utils.files import shard_path
+from pdf_tools.utils.lazy import lazy_import
+from pdf_tools.utils.s3_utils import get_file_etag, iter_files_from_s3
+from pdf_tools.utils.utils import compress_pdf, merge_pdfs, split_pdf_to_pages
+
+pymupdf = lazy_import("pymupdf")
+
+
+logger = logging.getLogger(__name__)
+
+
+def submit_job(operation, pdf_files, params=None):
+    """
+    Store the uploaded inputs under `jobs/<id[:2]>/<id>/` and queue a job
+    for them.
+    Returns the queued PDFJob.
+    """
+    job = PDFJob(
+        operation=operation,
+        params=params or {},
+        max_attempts=settings.PDF_JOBS_MAX_ATTEMPTS,
+    )
+    job.input_paths = [
+        default_storage.save(
+            shard_path(
+                "jobs",
+                f"{job.id}/{index}_{os.path.basename(pdf_file.name)}",
+                job.id.hex,
+            ),
+            pdf_file,
+        )
+        for index, pdf_file in enumerate(pdf_files)
+    ]
+    # Only make the job visible to workers once its inputs are on disk
+    job.save()
+    return job
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically move the oldest queued job to running.
+    The conditional UPDATE makes sure two workers never claim the same job.
+    """
+    candidates = PDFJob.objects.filter(state=PDFJob.STATE_QUEUED).values_list(
+        "id", flat=True
+    )
+    for job_id in candidates[:10]:
+        now = timezone.now()
+        claimed = PDFJob.objects.filter(
+            id=job_id, state=PDFJob.STATE_QUEUED
+        ).update(
+            state=PDFJob.STATE_RUNNING,
+            worker=worker_id,
+            attempts=F("attempts") + 1,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return PDFJob.objects.get(id=job_id)
+    return None
+
+
+def finish_job(job_id, state, result=None, error=""):
+    """Record the final state of a job and remove its inputs"""
+    PDFJob.objects.filter(id=job_id).update(
+        state=state, result=result, error=error, finished_at=timezone.now()
+    )
+    cleanup_job_inputs(PDFJob.objects.get(id=job_id))
+
+
+def retry_or_fail(job, error):
+    """Put a crashed job back in the queue unless it ran out of attempts"""
+    if job.attempts < job.max_attempts:
+        logger.warning("Retrying job %s after failure: %s", job.id, error)
+        PDFJob.objects.filter(id=job.id).update(
+            state=PDFJob.STATE_QUEUED, error=error, progress=0, worker=""
+        )
+    else:
+        finish_job(job.id, PDFJob.STATE_FAILED, error=error)
+
+
+def requeue_stale_jobs():
+    """
+    Recover jobs whose worker disappeared (e.g. the whole worker process was
+    killed) by checking for a missing heartbeat
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.PDF_JOBS_STALE_AFTER)
+    stale_jobs = PDFJob.objects.filter(
+        state=PDFJob.STATE_RUNNING, heartbeat_at__lt=stale_before
+    )
+    for job in stale_jobs:
+        retry_or_fail(job, "Worker stopped sending heartbeats")
+
+
+def cleanup_job_inputs(job):
+    for path in job.input_paths:
+        try:
+            if default_storage.exists(path):
+                default_storage.delete(path)
+        except Exception as e:
+            logger.warning("Error cleaning up job input %s: %s", path, str(e))
+
+
+class JobProgress:
+    """
+    Progress callback that writes to the job row at most every `interval`.
+    Updates skipped in between are kept; `flush` writes the latest one.
+    """
+
+    def __init__(self, job_id, interval=0.5):
+        self.job_id = job_id
+        self.interval = interval
+        self._last_update = 0
+        self._pending = None
+
+    def __call__(self, done, total=None):
+        self._pending = (done, total)
+        if time.monotonic() - self._last_update >= self.interval or done == total:
+            self.flush()
+
+    def flush(self):
+        if self._pending is None:
+            return
+        done, total = self._pending
+        self._pending = None
+        self._last_update = time.monotonic()
+        PDFJob.objects.filter(id=self.job_id).update(progress=done, total=total)
+
+
+def _run_compress(job, progress):
+    input_path = default_storage.path(job.input_paths[0])
+    with pymupdf.open(input_path) as doc:
+        page_count = doc.page_count
+
+    compression_level = job.params.get("compression_level", "low")
+    engine = job.params.get("engine", "auto")
+
+    progress(0, page_count)
+    result = get_artifact_store().get_or_create(
+        "compress",
+        combine_fingerprints(fingerprint_files([input_path])),
+        lambda output_subdir: compress_pdf(
+            input_path, compression_level, engine, output_subdir
+        ),
+        compression_level=compression_level,
+        engine=engine,
+    )
+    progress(page_count, page_count)
+    return result
+
+
+def _run_merge(job, progress):
+    input_paths = [default_storage.path(path) for path in job.input_paths]
+    file_keys = job.params.get("file_keys", [])
+    page_ranges = job.params.get("page_ranges")
+
+    def merge(output_subdir):
+        inputs = itertools.chain(input_paths, iter_files_from_s3(file_keys))
+        return merge_pdfs(
+            inputs,
+            progress=progress,
+            page_ranges=page_ranges,
+            output_subdir=output_subdir,
+        )
+
+    fingerprints = fingerprint_files(input_paths) + [
+        get_file_etag(file_key) for file_key in file_keys
+    ]
+    return get_artifact_store().get_or_create(
+        "merge",
+        combine_fingerprints(fingerprints),
+        merge,
+        page_ranges=json.dumps(page_ranges),
+    )
+
+
+def _run_split(job, progress):
+    input_path = default_storage.path(job.input_paths[0])
+    return get_artifact_store().get_or_create(
+        "split",
+        combine_fingerprints(fingerprint_files([input_path])),
+        lambda output_subdir: split_pdf_to_pages(
+            input_path, output_subdir, progress=progress, **job.params
+        ),
+        **job.params,
+    )
+
+
+OPERATIONS = {
+    PDFJob.OPERATION_COMPRESS: _run_compress,
+    PDFJob.OPERATION_MERGE: _run_merge,
+    PDFJob.OPERATION_SPLIT: _run_split,
+}
+
+
+def execute_job(job_id):
+    """
+    Run a claimed job in the current process and record its outcome.
+    Called from the `run_pdf_job` command inside an isolated subprocess.
+    """
+    job = PDFJob.objects.get(id=job_id)
+    progress = JobProgress(job.id)
+    try:
+        result = OPERATIONS[job.operation](job, progress)
+    except Exception as e:
+        progress.flush()
+        finish_job(job.id, PDFJob.STATE_FAILED, error=str(e))
+    else:
+        progress.flush()
+        finish_job(job.id, PDFJob.STATE_SUCCEEDED, result=result)
+
+
+def supervise_job(job):
+    """
+    Execute a job in a child process, heartbeating while it runs.
+    The child is killed once it exceeds PDF_JOBS_TIMEOUT; a child that dies
+    without recording an outcome (segfault, OOM kill) is retried.
+    """
+    command = [
+        sys.executable,
+        os.path.join(settings.BASE_DIR, "manage.py"),
+        "run_pdf_job",
+        str(job.id),
+    ]
+    process = subprocess.Popen(command)
+    deadline = time.monotonic() + settings.PDF_JOBS_TIMEOUT
+
+    while True:
+        try:
+            process.wait(timeout=settings.PDF_JOBS_HEARTBEAT_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            if time.monotonic() > deadline:
+                process.kill()
+                process.wait()
+                finish_job(
+                    job.id,
+                    PDFJob.STATE_FAILED,
+                    error=f"Job timed out after {settings.PDF_JOBS_TIMEOUT} seconds",
+                )
+                return
+            PDFJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now())
+
+    job.refresh_from_db()
+    if job.state == PDFJob.STATE_RUNNING:
+        retry_or_fail(job, f"Worker exited with code {process.returncode}")
+
+
+def run_worker(worker_id, stop_event):
+    """Claim and supervise jobs one at a time until `stop_event` is set"""
+    try:
+        while not stop_event.is_set():
+            requeue_stale_jobs()
+            job = claim_next_job(worker_id)
+            if job is None:
+                stop_event.wait(settings.PDF_JOBS_POLL_INTERVAL)
+                continue
+
+            logger.info("Worker %s running %s", worker_id, job)
+            supervise_job(job)
+    finally:
+        connection.close()
+
+
+def run_worker_pool(concurrency, stop_event=None):
+    """
+    Run `concurrency` workers in threads of the current process.
+    Each worker runs at most one job subprocess at a time, which bounds the
+    number of concurrent jobs.
+    """
+    stop_event = stop_event or threading.Event()
+    hostname = socket.gethostname()
+    threads = [
+        threading.Thread(
+            target=run_worker,
+            args=(f"{hostname}:{os.getpid()}:{index}", stop_event),
+            daemon=True,
+        )
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,44 @@
+import sys
+
+
+_modules = {}
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+    The import goes through the import system, so threads that touch it
+    at the same time wait for one import instead of racing it.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            __import__(self._name)
+            self._module = sys.modules[self._name]
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """
+    Return a `LazyModule` for `name`, for heavy backends (PyMuPDF, numpy)
+    that should not be imported before a request needs them
+    """
+    module = _modules.get(name)
+    if module is None:
+        module = _modules.setdefault(name, LazyModule(name))
+    return module
+
+
+def load_lazy_modules():
+    """Import every module handed out by `lazy_import`; returns their names"""
+    for name in list(_modules):
+        getattr(_modules[name], "__name__")
+    return sorted(_modules)
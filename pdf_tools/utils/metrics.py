@@ -0,0 +1,225 @@
+import bisect
+import contextvars
+import resource
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus sense, one series per label set"""
+
+    def __init__(self, name, help_text, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = format_labels(key + (("le", str(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label set"""
+
+    metric_type = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._series = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for key, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def set(self, value, **labels):
+        self._series[tuple(sorted(labels.items()))] = value
+
+
+def format_labels(items):
+    if not items:
+        return ""
+    return "{" + ",".join(
+        f'{name}="{escape_label(value)}"' for name, value in items
+    ) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_lock = threading.Lock()
+
+REQUEST_DURATION = Histogram(
+    "pdf_tools_request_duration_seconds", "Request latency by endpoint"
+)
+REQUESTS = Counter("pdf_tools_requests_total", "Requests by endpoint and status")
+STAGE_DURATION = Histogram(
+    "pdf_tools_stage_duration_seconds", "Duration of instrumented stages"
+)
+BYTES_IN = Counter("pdf_tools_bytes_in_total", "Bytes read (uploads, S3 downloads)")
+BYTES_OUT = Counter("pdf_tools_bytes_out_total", "Bytes written (outputs, responses)")
+PAGES = Counter("pdf_tools_pages_processed_total", "PDF pages processed")
+MAX_RSS = Gauge(
+    "pdf_tools_process_max_resident_memory_bytes",
+    "High-water mark of the process resident memory",
+)
+
+METRICS = [
+    REQUEST_DURATION,
+    REQUESTS,
+    STAGE_DURATION,
+    BYTES_IN,
+    BYTES_OUT,
+    PAGES,
+    MAX_RSS,
+]
+
+
+class RequestTrace:
+    """Stage timings and counters collected while handling one request"""
+
+    def __init__(self, endpoint="", method=""):
+        self.endpoint = endpoint
+        self.method = method
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {"bytes_in": 0, "bytes_out": 0, "pages": 0}
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def to_dict(self):
+        return {
+            "stages_ms": {
+                name: round(seconds * 1000, 2)
+                for name, seconds in self.stages.items()
+            },
+            **self.counters,
+        }
+
+
+_current_trace = contextvars.ContextVar("pdf_tools_trace", default=None)
+
+
+def activate_trace(trace):
+    """Collect spans into `trace` from now on; returns a token for `end_trace`"""
+    return _current_trace.set(trace)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+@contextmanager
+def span(name):
+    """
+    Time a stage. The duration goes to the stage histogram and, inside a
+    request, to that request's trace.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def observe_stage(name, seconds):
+    """Record a stage duration measured by the caller"""
+    with _lock:
+        STAGE_DURATION.observe(seconds, stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_stage(name, seconds)
+
+
+def record(bytes_in=0, bytes_out=0, pages=0):
+    """Count bytes and pages handled by the current request"""
+    trace = _current_trace.get()
+    endpoint = trace.endpoint if trace is not None else ""
+    with _lock:
+        if bytes_in:
+            BYTES_IN.inc(bytes_in, endpoint=endpoint)
+        if bytes_out:
+            BYTES_OUT.inc(bytes_out, endpoint=endpoint)
+        if pages:
+            PAGES.inc(pages, endpoint=endpoint)
+    if trace is not None:
+        trace.counters["bytes_in"] += bytes_in
+        trace.counters["bytes_out"] += bytes_out
+        trace.counters["pages"] += pages
+
+
+def max_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def observe_request(trace, status_code):
+    seconds = time.perf_counter() - trace.started
+    with _lock:
+        REQUEST_DURATION.observe(
+            seconds, endpoint=trace.endpoint, method=trace.method
+        )
+        REQUESTS.inc(
+            endpoint=trace.endpoint, method=trace.method, status=str(status_code)
+        )
+    return seconds
+
+
+def render_metrics():
+    """
+    All metrics in the Prometheus text exposition format.
+    Metrics are kept per process; with several server workers each one
+    reports its own series.
+    """
+    with _lock:
+        MAX_RSS.set(max_rss_bytes())
+        lines = []
+        for metric in METRICS:
+            lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,159 @@
+import collections
+import re
+import time
+
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from pdf_tools.utils.cache import get_result_cache, hash_file, make_cache_key
+from pdf_tools.utils.files import SharedDocument
+from pdf_tools.utils.lazy import lazy_import
+from pdf_tools.utils.metrics import observe_stage
+from pdf_tools.utils.parallel import get_process_pool, get_worker_count
+
+pymupdf = lazy_import("pymupdf")
+
+
+# Tesseract language codes joined with "+", e.g. "eng" or "eng+deu"
+LANGUAGE_PATTERN = re.compile(r"^[a-z_]+(\+[a-z_]+)*$")
+
+
+def validate_language(language):
+    """Return `language` (PDF_OCR_LANGUAGE if empty), raising ValueError if invalid"""
+    language = language or settings.PDF_OCR_LANGUAGE
+    if not LANGUAGE_PATTERN.match(language):
+        raise ValueError("ocrLanguage must look like 'eng' or 'eng+deu'")
+    return language
+
+
+def needs_ocr(page, text):
+    """
+    Cheap check for a page without a usable text layer: almost no
+    extracted text while images cover most of the page, as on scans.
+    Blank pages are left alone.
+    """
+    if len(text.strip()) >= settings.PDF_OCR_MIN_CHARS:
+        return False
+
+    page_area = abs(page.rect)
+    if not page_area:
+        return False
+    image_area = sum(
+        abs(pymupdf.Rect(info["bbox"]) & page.rect)
+        for info in page.get_image_info()
+    )
+    return image_area / page_area >= settings.PDF_OCR_MIN_IMAGE_COVERAGE
+
+
+def ocr_page(page, language):
+    """OCR one page with PyMuPDF's Tesseract integration"""
+    textpage = page.get_textpage_ocr(
+        language=language,
+        dpi=settings.PDF_OCR_DPI,
+        full=True,
+        tessdata=settings.PDF_OCR_TESSDATA,
+    )
+    return page.get_text(textpage=textpage)
+
+
+def _ocr_page_at(path, page_number, language):
+    """Worker: open the shared document by path and OCR one page"""
+    doc = pymupdf.open(path)
+    try:
+        return ocr_page(doc[page_number - 1], language)
+    finally:
+        doc.close()
+
+
+def iter_ocr_text(pdf_file, doc, pages, language, fingerprint=None):
+    """
+    Pass (page_number, text) pairs through, replacing the text of pages
+    that `needs_ocr` with their OCR text. Yields (page_number, text, ocr).
+    Pages are checked as they arrive. With a process pool, pages that need
+    OCR are queued on it one page per task while up to PDF_OCR_WINDOW
+    pages are read ahead of the one being yielded; without one they are
+    OCRed in turn. OCR output is cached per (document fingerprint, page,
+    language) in the result cache.
+    """
+    fingerprint = (
+        fingerprint or getattr(pdf_file, "sha256", None) or hash_file(pdf_file)
+    )
+    cache = get_result_cache()
+
+    def cache_key(page_number):
+        return make_cache_key(
+            "ocr",
+            fingerprint,
+            page=page_number,
+            language=language,
+            dpi=settings.PDF_OCR_DPI,
+        )
+
+    workers = get_worker_count()
+    window = settings.PDF_OCR_WINDOW or 4 * workers
+    document = None
+    # (page_number, text, OCR text or pending Future or None), in page order
+    pending = collections.deque()
+    ocr_pages = 0
+    elapsed = 0.0
+
+    def run_ocr(page_number, ocr):
+        nonlocal elapsed
+        started = time.perf_counter()
+        try:
+            if ocr is None:
+                text = ocr_page(doc[page_number - 1], language)
+            else:
+                text = ocr.result()
+        except Exception as e:
+            raise Exception(f"Error running OCR on page {page_number}: {str(e)}")
+        elapsed += time.perf_counter() - started
+        cache.set(cache_key(page_number), text)
+        return text
+
+    def finish():
+        page_number, text, ocr = pending.popleft()
+        if isinstance(ocr, Future):
+            return page_number, run_ocr(page_number, ocr), True
+        if ocr is not None:
+            return page_number, ocr, True
+        return page_number, text, False
+
+    try:
+        for page_number, text in pages:
+            ocr = None
+            if needs_ocr(doc[page_number - 1], text):
+                ocr = cache.get(cache_key(page_number))
+                if ocr is None:
+                    ocr_pages += 1
+                    if workers > 1:
+                        if document is None:
+                            document = SharedDocument(pdf_file)
+                        ocr = document.hold(
+                            get_process_pool().submit(
+                                _ocr_page_at, document.path, page_number, language
+                            )
+                        )
+                    else:
+                        ocr = run_ocr(page_number, None)
+            pending.append((page_number, text, ocr))
+
+            # Send what is ready; wait for the oldest page once the window is full
+            while pending:
+                head = pending[0][2]
+                if isinstance(head, Future) and not head.done():
+                    if len(pending) < window:
+                        break
+                yield finish()
+
+        while pending:
+            yield finish()
+    finally:
+        for _, _, ocr in pending:
+            if isinstance(ocr, Future):
+                ocr.cancel()
+        if document is not None:
+            document.release()
+        if ocr_pages:
+            observe_stage("extract_text.ocr", elapsed)
@@ -0,0 +1,121 @@
+import math
+import multiprocessing
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from pdf_tools.utils.lazy import lazy_import
+
+pymupdf = lazy_import("pymupdf")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_count():
+    """Number of worker processes configured for parallel extraction"""
+    return settings.PDF_PARALLEL_WORKERS or os.cpu_count() or 1
+
+
+def should_parallelize(page_count, workers=None):
+    """Parallel extraction only pays off above a page-count threshold"""
+    workers = workers or get_worker_count()
+    return workers > 1 and page_count >= settings.PDF_PARALLEL_MIN_PAGES
+
+
+def _is_usable(pool):
+    # A worker that dies abruptly breaks the whole executor for good
+    return pool is not None and not pool._broken
+
+
+def get_process_pool():
+    """
+    Return the shared process pool, creating it on first use and again
+    after a worker crash left it broken.
+    Workers are long-lived so the start-up cost is paid once per process.
+    Worker functions must live in modules that import no Django models:
+    spawned workers unpickle them without `django.setup()`.
+    """
+    global _pool
+
+    if not _is_usable(_pool):
+        with _pool_lock:
+            if not _is_usable(_pool):
+                if _pool is not None:
+                    _pool.shutdown(wait=False, cancel_futures=True)
+                context = multiprocessing.get_context(
+                    settings.PDF_PARALLEL_START_METHOD
+                )
+                _pool = ProcessPoolExecutor(
+                    max_workers=get_worker_count(), mp_context=context
+                )
+    return _pool
+
+
+def shutdown_process_pool():
+    """Stop the shared pool, e.g. before forking or at process exit"""
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def partition_pages(first_page, last_page, workers, chunks_per_worker=4):
+    """
+    Split a 1-based inclusive page range into contiguous (first, last)
+    chunks. Several chunks per worker keep the pool busy when some pages
+    are much slower to extract than others.
+    """
+    page_count = last_page - first_page + 1
+    if page_count <= 0:
+        return []
+
+    chunk_size = max(1, math.ceil(page_count / (workers * chunks_per_worker)))
+    return [
+        (start, min(start + chunk_size - 1, last_page))
+        for start in range(first_page, last_page + 1, chunk_size)
+    ]
+
+
+def _extract_text_chunk(path, first_page, last_page):
+    """Worker: open the shared document by path and extract a page chunk"""
+    doc = pymupdf.open(path)
+    try:
+        return [
+            doc[page_num].get_text()
+            for page_num in range(first_page - 1, last_page)
+        ]
+    finally:
+        doc.close()
+
+
+def iter_text_parallel(document, first_page, last_page, workers=None, pool=None):
+    """
+    Extract text for a page range across the process pool.
+    Every worker opens the SharedDocument by path instead of receiving a
+    pickled copy of its bytes; the document is kept until the last chunk
+    is done, even if the consumer goes away early.
+    Yields (page_number, text) in page order.
+    """
+    workers = workers or get_worker_count()
+    pool = pool or get_process_pool()
+
+    chunks = partition_pages(first_page, last_page, workers)
+    futures = [
+        document.hold(pool.submit(_extract_text_chunk, document.path, first, last))
+        for first, last in chunks
+    ]
+    try:
+        for (first, _), future in zip(chunks, futures):
+            for offset, text in enumerate(future.result()):
+                yield first + offset, text
+    finally:
+        # Stop queued chunks if the consumer goes away early
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from pdf_tools.utils.cache import DiskCache, make_cache_key, write_file
+from pdf_tools.utils.files import SharedDocument, open_pdf
+from pdf_tools.utils.lazy import lazy_import
+from pdf_tools.utils.metrics import record, span
+from pdf_tools.utils.parallel import (
+    get_process_pool,
+    get_worker_count,
+    partition_pages,
+)
+from pdf_tools.utils.split import parse_page_ranges
+
+pymupdf = lazy_import("pymupdf")
+
+
+# Output formats and their content types
+IMAGE_FORMATS = {"png": "image/png", "webp": "image/webp"}
+
+
+class RenderCache(DiskCache):
+    """
+    Disk cache of rendered page images under MEDIA_ROOT/<subdir>, so they
+    can be served as media files. Entries are keyed by (document
+    fingerprint, page, size, format) and evicted least recently used first
+    past `max_bytes`; the page sizes of each document are cached next to
+    them so a warm request never opens the PDF.
+    """
+
+    name = "render"
+    extensions = (".png", ".webp", ".json")
+
+    def __init__(self, subdir, max_bytes, ttl):
+        super().__init__(os.path.join(settings.MEDIA_ROOT, subdir), max_bytes, ttl)
+        self.subdir = subdir
+        self._hits = 0
+        self._misses = 0
+
+    def path(self, key):
+        return self._path(key)
+
+    def _path(self, key):
+        # Keys end with the file extension, which the media server needs
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        extension = key.rsplit(".", 1)[-1]
+        return os.path.join(self.directory, digest[:2], f"{digest}.{extension}")
+
+    def lookup(self, key):
+        """Path of a cached image, or None if it is missing or expired"""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+
+        if stat is not None and self.ttl and stat.st_mtime + self.ttl < time.time():
+            self.remove(path)
+            stat = None
+
+        with self._lock:
+            if stat is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+
+        # Bump the access time so eviction follows LRU order
+        os.utime(path, (time.time(), stat.st_mtime))
+        return path
+
+    def url(self, path):
+        relative_path = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, "/")
+        return f"{settings.MEDIA_URL}{relative_path}".lstrip("/")
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            **super().stats(),
+            "max_bytes": self.max_bytes,
+        }
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """Return the process-wide render cache configured in settings"""
+    global _render_cache
+
+    if _render_cache is None:
+        with _render_cache_lock:
+            if _render_cache is None:
+                _render_cache = RenderCache(
+                    settings.PDF_RENDER_SUBDIR,
+                    settings.PDF_RENDER_CACHE_MAX_BYTES,
+                    settings.PDF_RENDER_CACHE_TTL,
+                )
+    return _render_cache
+
+
+def size_key(dpi=None, width=None, height=None):
+    """Cache key part identifying the requested output size"""
+    if width or height:
+        return f"{width or 0}x{height or 0}"
+    return f"{dpi or settings.PDF_RENDER_DEFAULT_DPI}dpi"
+
+
+def page_scale(page_width, page_height, dpi=None, width=None, height=None):
+    """
+    Zoom factor for a page: fit it within width x height pixels when a box
+    is given, otherwise render at `dpi`. Capped by PDF_RENDER_MAX_DPI and
+    PDF_RENDER_MAX_DIMENSION.
+    """
+    if width or height:
+        scale = min(
+            width / page_width if width else float("inf"),
+            height / page_height if height else float("inf"),
+        )
+    else:
+        scale = (dpi or settings.PDF_RENDER_DEFAULT_DPI) / 72
+
+    return min(
+        scale,
+        settings.PDF_RENDER_MAX_DPI / 72,
+        settings.PDF_RENDER_MAX_DIMENSION / max(page_width, page_height),
+    )
+
+
+def pixel_size(page_width, page_height, scale):
+    """Size in pixels of the pixmap PyMuPDF renders at `scale`"""
+    rect = pymupdf.Rect(0, 0, page_width, page_height) * pymupdf.Matrix(scale, scale)
+    return rect.irect.width, rect.irect.height
+
+
+def encode_pixmap(pixmap, image_format, quality):
+    if image_format == "webp":
+        # PyMuPDF has no WebP writer; Pillow encodes it
+        return pixmap.pil_tobytes(format="WEBP", quality=quality)
+    return pixmap.tobytes(image_format)
+
+
+def render_jobs(doc, jobs, image_format, quality):
+    """
+    Render (page_number, scale, output_path) jobs of an open document,
+    writing each image to its path. Returns [(page_number, bytes written)].
+    """
+    written = []
+    for page_number, scale, output_path in jobs:
+        pixmap = doc[page_number - 1].get_pixmap(
+            matrix=pymupdf.Matrix(scale, scale), alpha=False
+        )
+        data = encode_pixmap(pixmap, image_format, quality)
+        write_file(output_path, data)
+        written.append((page_number, len(data)))
+    return written
+
+
+def _render_chunk(path, jobs, image_format, quality):
+    """Worker: open the shared document by path and render a chunk of jobs"""
+    doc = pymupdf.open(path)
+    try:
+        return render_jobs(doc, jobs, image_format, quality)
+    finally:
+        doc.close()
+
+
+def render_jobs_parallel(
+    document, jobs, image_format, quality, workers=None, pool=None
+):
+    """
+    Spread render jobs over the process pool. Workers open the
+    SharedDocument by path and write the images themselves, so only page
+    numbers and sizes come back.
+    """
+    workers = workers or get_worker_count()
+    pool = pool or get_process_pool()
+
+    futures = [
+        document.hold(
+            pool.submit(
+                _render_chunk,
+                document.path,
+                jobs[first - 1:last],
+                image_format,
+                quality,
+            )
+        )
+        for first, last in partition_pages(1, len(jobs), workers, chunks_per_worker=2)
+    ]
+    try:
+        written = []
+        for future in futures:
+            written.extend(future.result())
+        return written
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def render_pages(
+    fingerprint,
+    get_pdf_file,
+    pages=None,
+    dpi=None,
+    width=None,
+    height=None,
+    image_format="png",
+):
+    """
+    Render pages of a document to PNG or WebP images through the render
+    cache. `get_pdf_file` is only called when something has to be rendered.
+    `pages` is a range expression such as "1-3,7,10-" (all pages by default).
+    Raises ValueError for page ranges outside the document.
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"imageFormat must be one of {', '.join(IMAGE_FORMATS)}")
+
+    cache = get_render_cache()
+    document_key = f"{make_cache_key('render_document', fingerprint)}.json"
+    size = size_key(dpi, width, height)
+    pdf_file = doc = None
+
+    try:
+        payload = cache.get(document_key)
+        if payload is not None:
+            page_sizes = json.loads(payload)["page_sizes"]
+        else:
+            pdf_file = get_pdf_file()
+            doc = open_pdf(pdf_file)
+            page_sizes = [[page.rect.width, page.rect.height] for page in doc]
+            cache.set(
+                document_key,
+                json.dumps({"page_sizes": page_sizes}).encode("utf-8"),
+            )
+
+        total_pages = len(page_sizes)
+        if pages:
+            ranges = parse_page_ranges(pages, total_pages)
+        else:
+            ranges = [(1, total_pages)] if total_pages else []
+        page_numbers = list(
+            dict.fromkeys(
+                page_number
+                for first, last in ranges
+                for page_number in range(first, last + 1)
+            )
+        )
+
+        results = []
+        jobs = []
+        for page_number in page_numbers:
+            page_width, page_height = page_sizes[page_number - 1]
+            scale = page_scale(page_width, page_height, dpi, width, height)
+            key = make_cache_key(
+                "render", fingerprint, page=page_number, size=size
+            ) + f".{image_format}"
+
+            cached_path = cache.lookup(key)
+            path = cached_path or cache.path(key)
+            if cached_path is None:
+                jobs.append((page_number, scale, path))
+
+            image_width, image_height = pixel_size(page_width, page_height, scale)
+            results.append(
+                {
+                    "page": page_number,
+                    "url": cache.url(path),
+                    "width": image_width,
+                    "height": image_height,
+                    "cached": cached_path is not None,
+                }
+            )
+
+        if jobs:
+            if doc is None:
+                pdf_file = get_pdf_file()
+                doc = open_pdf(pdf_file)
+
+            quality = settings.PDF_RENDER_WEBP_QUALITY
+            with span("render.pages"):
+                if (
+                    get_worker_count() > 1
+                    and len(jobs) >= settings.PDF_RENDER_PARALLEL_MIN_PAGES
+                ):
+                    with SharedDocument(pdf_file) as document:
+                        written = render_jobs_parallel(
+                            document, jobs, image_format, quality
+                        )
+                else:
+                    written = render_jobs(doc, jobs, image_format, quality)
+
+            size_written = sum(size for _, size in written)
+            cache.added(size_written)
+            record(bytes_out=size_written, pages=len(written))
+
+        return {
+            "status": "success",
+            "total_pages": total_pages,
+            "format": image_format,
+            "rendered": len(jobs),
+            "pages": results,
+        }
+    except ValueError:
+        raise
+    except Exception as e:
+        raise Exception(f"Error rendering PDF pages: {str(e)}")
+    finally:
+        if doc is not None:
+            doc.close()
@@ -1,35 +1,220 @@
-import boto3
-import io
+import itertools
+import threading
+
 from django.conf import settings
-from botocore.exceptions import NoCredentialsError, ClientError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf_tools.utils.cache import hash_file
+from pdf_tools.utils.files import SpooledPDF
+from pdf_tools.utils.lazy import lazy_import
+from pdf_tools.utils.metrics import record, span
+
+# boto3 and botocore take longer to import than the rest of the app,
+# they are loaded by the first S3 call
+boto3 = lazy_import("boto3")
+botocore_config = lazy_import("botocore.config")
+botocore_exceptions = lazy_import("botocore.exceptions")
 
 
 S3_BUCKET = settings.AWS_STORAGE_BUCKET_NAME
 AWS_REGION = settings.AWS_S3_REGION_NAME
 AWS_ACCESS_KEY_ID = settings.AWS_ACCESS_KEY_ID
 AWS_SECRET_ACCESS_KEY = settings.AWS_SECRET_ACCESS_KEY
+S3_DOWNLOAD_CHUNK_SIZE = settings.S3_DOWNLOAD_CHUNK_SIZE
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Return the shared S3 client, creating it on first use.
+    boto3 clients are thread-safe once created, so one client (and its
+    connection pool) is shared by every request thread.
+    """
+    global _s3_client
+
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                session = boto3.session.Session(
+                    aws_access_key_id=AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                    region_name=AWS_REGION,
+                )
+                _s3_client = session.client(
+                    "s3",
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    config=botocore_config.Config(
+                        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                        connect_timeout=settings.S3_CONNECT_TIMEOUT,
+                        read_timeout=settings.S3_READ_TIMEOUT,
+                        retries={
+                            "max_attempts": settings.S3_MAX_ATTEMPTS,
+                            "mode": settings.S3_RETRY_MODE,
+                        },
+                    ),
+                )
+    return _s3_client
+
 
-# Intiate S3 Client
-s3_client = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-)
+def reset_s3_client():
+    """Drop the shared client so the next call creates a fresh one"""
+    global _s3_client
+
+    with _s3_client_lock:
+        _s3_client = None
+
+
+def _copy_range(file_key, etag, spooled, write_lock, first_byte, last_byte):
+    """Download one byte range and write it at its offset in `spooled`"""
+    # IfMatch fails the part if the object was replaced mid-download
+    response = get_s3_client().get_object(
+        Bucket=S3_BUCKET,
+        Key=file_key,
+        Range=f"bytes={first_byte}-{last_byte}",
+        IfMatch=etag,
+    )
+    offset = first_byte
+    for chunk in response["Body"].iter_chunks(S3_DOWNLOAD_CHUNK_SIZE):
+        with write_lock:
+            spooled.seek(offset)
+            spooled.write(chunk)
+        offset += len(chunk)
 
 
 def get_file_from_s3(file_key):
     """
-    Fetch a file from S3 and return its bytes
+    Fetch a file from S3 without holding more than one copy of it.
+    The first part is requested with a ranged GET; objects larger than
+    S3_MULTIPART_THRESHOLD fetch their remaining parts in parallel.
+    The body is written into a SpooledPDF, which stays in memory below
+    PDF_SPOOL_MAX_MEMORY bytes and spills to a temporary file above.
     :param file_key: The S3 file key (path in bucket)
-    :return: File bytes or None if an error occurs
+    :return: SpooledPDF positioned at the start of the file
     """
 
+    with span("s3.download"):
+        return _download_file(file_key)
+
+
+def _download_file(file_key):
+    spooled = SpooledPDF()
+    part_size = settings.S3_MULTIPART_CHUNKSIZE
     try:
-        response = s3_client.get_object(Bucket=S3_BUCKET, Key=file_key)
-        file_stream = response["Body"].read()
-        return io.BytesIO(file_stream)
-    except NoCredentialsError:
+        response = get_s3_client().get_object(
+            Bucket=S3_BUCKET, Key=file_key, Range=f"bytes=0-{part_size - 1}"
+        )
+        total_size = int(response["ContentRange"].rsplit("/", 1)[-1])
+        if total_size > spooled.max_size:
+            spooled.rollover()
+
+        for chunk in response["Body"].iter_chunks(S3_DOWNLOAD_CHUNK_SIZE):
+            spooled.write(chunk)
+
+        if total_size > part_size:
+            ranges = [
+                (first_byte, min(first_byte + part_size, total_size) - 1)
+                for first_byte in range(part_size, total_size, part_size)
+            ]
+            if total_size <= settings.S3_MULTIPART_THRESHOLD:
+                workers = 1
+            else:
+                workers = settings.S3_TRANSFER_CONCURRENCY
+
+            write_lock = threading.Lock()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(
+                        _copy_range,
+                        file_key,
+                        response["ETag"],
+                        spooled,
+                        write_lock,
+                        first,
+                        last,
+                    )
+                    for first, last in ranges
+                ]
+                for future in futures:
+                    future.result()
+
+        spooled.seek(0)
+        record(bytes_in=total_size)
+        return spooled
+    except botocore_exceptions.NoCredentialsError:
+        spooled.close()
         raise Exception("AWS credentials not configured properly")
-    except ClientError as e:
+    except botocore_exceptions.ClientError as e:
+        spooled.close()
         raise Exception(f"Failed to fetch file from S3: {str(e)}")
+    except Exception:
+        spooled.close()
+        raise
+
+
+def iter_files_from_s3(file_keys, prefetch=None):
+    """
+    Download several files concurrently and yield them in order.
+    At most `prefetch` downloads (S3_PREFETCH by default) run ahead of the
+    consumer, and each file is closed as soon as the consumer moves on to
+    the next one, so only a few inputs are held at any time.
+    :param file_keys: The S3 file keys (paths in bucket)
+    :return: Iterator of SpooledPDF objects
+    """
+
+    prefetch = prefetch or settings.S3_PREFETCH
+    keys = iter(file_keys)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        try:
+            for file_key in itertools.islice(keys, prefetch):
+                pending.append(executor.submit(get_file_from_s3, file_key))
+
+            while pending:
+                pdf_file = pending.popleft().result()
+                next_key = next(keys, None)
+                if next_key is not None:
+                    pending.append(executor.submit(get_file_from_s3, next_key))
+
+                try:
+                    yield pdf_file
+                finally:
+                    pdf_file.close()
+        finally:
+            # Release downloads that were prefetched but never consumed
+            for future in pending:
+                if not future.cancel() and future.exception() is None:
+                    future.result().close()
+
+
+def get_file_etag(file_key):
+    """
+    Fetch the ETag of a file in S3 without downloading its body
+    :param file_key: The S3 file key (path in bucket)
+    :return: ETag string without surrounding quotes
+    """
+
+    try:
+        with span("s3.head"):
+            response = get_s3_client().head_object(Bucket=S3_BUCKET, Key=file_key)
+        return response["ETag"].strip('"')
+    except botocore_exceptions.NoCredentialsError:
+        raise Exception("AWS credentials not configured properly")
+    except botocore_exceptions.ClientError as e:
+        raise Exception(f"Failed to fetch file metadata from S3: {str(e)}")
+
+
+def fingerprint_s3_file(file_key):
+    """
+    Fingerprint used to key cached results and the text index: the S3
+    ETag, which needs no download, or the SHA-256 of the bytes when
+    PDF_RESULT_CACHE["KEY"] is "sha256".
+    Returns (fingerprint, downloaded file or None).
+    """
+    if settings.PDF_RESULT_CACHE["KEY"] == "sha256":
+        pdf_file = get_file_from_s3(file_key)
+        return hash_file(pdf_file), pdf_file
+    return get_file_etag(file_key), None
@@ -0,0 +1,238 @@
+import html
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from pdf_tools.models import PDFMetadata, PDFPageText
+from pdf_tools.utils.metrics import span
+
+
+# Text search configuration of the PostgreSQL GIN index (migration 0004)
+SEARCH_CONFIG = "english"
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+
+# The database wraps matches in these control characters, which survive
+# HTML escaping of the page text and are then replaced by the <mark> tags
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+
+def get_indexed_document(fingerprint):
+    """The indexed PDFMetadata for a fingerprint, or None"""
+    return PDFMetadata.objects.filter(
+        fingerprint=fingerprint, indexed_at__isnull=False
+    ).first()
+
+
+def index_document(fingerprint, result, file_name="", file_key="", file_size=0):
+    """
+    Store the per-page text of an `extract_text_from_pdf` result under the
+    document fingerprint, replacing any earlier index of the same document.
+    Returns the PDFMetadata row.
+    """
+    content = result["content"]
+    with span("search.index"), transaction.atomic():
+        document, _ = PDFMetadata.objects.update_or_create(
+            fingerprint=fingerprint,
+            defaults={
+                "file_name": file_name or file_key.rsplit("/", 1)[-1],
+                "file_key": file_key,
+                "file_size": file_size,
+                "num_pages": result.get("total_pages", len(content)),
+                "text_extracted": True,
+                "indexed_at": timezone.now(),
+            },
+        )
+        document.pages.all().delete()
+        PDFPageText.objects.bulk_create(
+            [
+                PDFPageText(
+                    document=document,
+                    page_number=int(name.rsplit("_", 1)[-1]),
+                    text=text,
+                )
+                for name, text in content.items()
+            ],
+            batch_size=500,
+        )
+    return document
+
+
+def search_vector():
+    """
+    The tsvector searched on PostgreSQL. It compiles to
+    `to_tsvector('english'::regconfig, COALESCE("text", ''))`, the
+    expression migration 0004 indexes; keep the two in step.
+    """
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector("text", config=SEARCH_CONFIG)
+
+
+def mark_snippet(snippet):
+    """HTML-escape a snippet and turn the match delimiters into <mark> tags"""
+    return (
+        html.escape(snippet)
+        .replace(_MATCH_START, SNIPPET_START)
+        .replace(_MATCH_END, SNIPPET_END)
+    )
+
+
+def fts5_query(query):
+    """
+    Turn free text into an FTS5 query matching every word, quoting each
+    one so user input can't use (or break) the FTS5 query syntax
+    """
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"' for word in words)
+
+
+def _search_sqlite(query, document_id, limit):
+    match = fts5_query(query)
+    if not match:
+        return []
+
+    sql = """
+        SELECT d.id, d.fingerprint, d.file_name, d.file_key, p.page_number,
+               snippet(pdf_tools_pdfpagetext_fts, 0, %s, %s, '…', 16),
+               bm25(pdf_tools_pdfpagetext_fts) AS score
+        FROM pdf_tools_pdfpagetext_fts
+        JOIN pdf_tools_pdfpagetext p ON p.id = pdf_tools_pdfpagetext_fts.rowid
+        JOIN pdf_tools_pdfmetadata d ON d.id = p.document_id
+        WHERE pdf_tools_pdfpagetext_fts MATCH %s
+    """
+    params = [_MATCH_START, _MATCH_END, match]
+    if document_id is not None:
+        sql += " AND d.id = %s"
+        params.append(document_id)
+    sql += " ORDER BY score LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    # bm25() is lower for better matches
+    return [
+        _hit(
+            document,
+            fingerprint,
+            file_name,
+            file_key,
+            page,
+            mark_snippet(snippet),
+            -score,
+        )
+        for document, fingerprint, file_name, file_key, page, snippet, score in rows
+    ]
+
+
+def _search_postgresql(query, document_id, limit):
+    from django.contrib.postgres.search import (
+        SearchHeadline,
+        SearchQuery,
+        SearchRank,
+    )
+
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+    vector = search_vector()
+
+    pages = (
+        PDFPageText.objects.annotate(search=vector)
+        .filter(search=search_query)
+        .annotate(
+            rank=SearchRank(vector, search_query),
+            snippet=SearchHeadline(
+                "text",
+                search_query,
+                config=SEARCH_CONFIG,
+                start_sel=_MATCH_START,
+                stop_sel=_MATCH_END,
+                max_words=32,
+                min_words=12,
+            ),
+        )
+        .select_related("document")
+        .order_by("-rank")
+    )
+    if document_id is not None:
+        pages = pages.filter(document_id=document_id)
+
+    return [
+        _hit(
+            page.document_id,
+            page.document.fingerprint,
+            page.document.file_name,
+            page.document.file_key,
+            page.page_number,
+            mark_snippet(page.snippet),
+            page.rank,
+        )
+        for page in pages[:limit]
+    ]
+
+
+def _search_fallback(query, document_id, limit):
+    """Substring match for databases without a full-text index"""
+    pages = PDFPageText.objects.filter(text__icontains=query).select_related(
+        "document"
+    )
+    if document_id is not None:
+        pages = pages.filter(document_id=document_id)
+
+    hits = []
+    for page in pages[:limit]:
+        position = page.text.lower().find(query.lower())
+        start = max(position - 80, 0)
+        end = position + len(query)
+        snippet = (
+            html.escape(page.text[start:position])
+            + SNIPPET_START
+            + html.escape(page.text[position:end])
+            + SNIPPET_END
+            + html.escape(page.text[end:end + 80])
+        )
+        hits.append(
+            _hit(
+                page.document_id,
+                page.document.fingerprint,
+                page.document.file_name,
+                page.document.file_key,
+                page.page_number,
+                snippet,
+                None,
+            )
+        )
+    return hits
+
+
+def _hit(document, fingerprint, file_name, file_key, page, snippet, score):
+    return {
+        "document": document,
+        "fingerprint": fingerprint,
+        "file_name": file_name,
+        "file_key": file_key,
+        "page": page,
+        "snippet": snippet,
+        "score": round(score, 6) if score is not None else None,
+    }
+
+
+SEARCH_BACKENDS = {
+    "sqlite": _search_sqlite,
+    "postgresql": _search_postgresql,
+}
+
+
+def search_pages(query, document_id=None, limit=20):
+    """
+    Full-text search over indexed pages, best matches first.
+    Returns hits with the document, page number and an HTML-escaped
+    snippet with the matching words wrapped in <mark>...</mark>.
+    """
+    backend = SEARCH_BACKENDS.get(connection.vendor, _search_fallback)
+    with span("search.query"):
+        return backend(query, document_id, limit)
@@ -0,0 +1,150 @@
+import re
+
+from pdf_tools.utils.lazy import lazy_import
+from pdf_tools.utils.metrics import record
+
+pymupdf = lazy_import("pymupdf")
+
+
+# Save options for split parts: drop unused objects, deflate streams and pack
+# small objects into object streams so shared resources stay compact
+SAVE_OPTIONS = {"garbage": 3, "deflate": True, "use_objstms": 1}
+
+
+def parse_page_ranges(expression, page_count):
+    """
+    Parse a range expression such as "1-3,7,10-" into a list of 1-based
+    inclusive (first, last) tuples. "10-" runs to the last page.
+    Raises ValueError for malformed or out-of-range parts.
+    """
+    ranges = []
+    for part in expression.replace(" ", "").split(","):
+        if not part:
+            continue
+
+        match = re.fullmatch(r"(\d+)(?:-(\d*))?", part)
+        if not match:
+            raise ValueError(f"Invalid page range: {part!r}")
+
+        first = int(match.group(1))
+        if match.group(2) is None:
+            last = first
+        elif match.group(2) == "":
+            last = page_count
+        else:
+            last = int(match.group(2))
+
+        if first < 1 or last > page_count or first > last:
+            raise ValueError(
+                f"Page range {part!r} is outside the document (1-{page_count})"
+            )
+        ranges.append((first, last))
+
+    if not ranges:
+        raise ValueError("Empty page range expression")
+    return ranges
+
+
+def chunk_page_ranges(page_count, every, start_page=1, end_page=None):
+    """
+    Split pages into consecutive chunks of `every` pages.
+    Raises ValueError when the start page is not in the document or the
+    end page comes before it.
+    """
+    if every < 1:
+        raise ValueError("every must be 1 or greater")
+    if start_page < 1:
+        raise ValueError("startPage must be 1 or greater")
+    if start_page > page_count:
+        raise ValueError(
+            f"startPage {start_page} is outside the document (1-{page_count})"
+        )
+    if end_page is not None and end_page < start_page:
+        raise ValueError("endPage must not be before startPage")
+
+    end_page = page_count if end_page is None else min(end_page, page_count)
+    return [
+        (first, min(first + every - 1, end_page))
+        for first in range(start_page, end_page + 1, every)
+    ]
+
+
+def bookmark_page_ranges(doc):
+    """
+    One range per top-level bookmark, running up to the next top-level
+    bookmark. Pages before the first bookmark become their own part.
+    Returns (first, last, title) tuples.
+    """
+    starts = []
+    for level, title, page in doc.get_toc(simple=True):
+        if level == 1 and page >= 1 and (not starts or page > starts[-1][0]):
+            starts.append((page, title))
+
+    if not starts:
+        raise ValueError("The document has no top-level bookmarks")
+
+    if starts[0][0] > 1:
+        starts.insert(0, (1, "Front matter"))
+
+    ranges = []
+    for index, (first, title) in enumerate(starts):
+        if index + 1 < len(starts):
+            last = starts[index + 1][0] - 1
+        else:
+            last = doc.page_count
+        ranges.append((first, last, title))
+    return ranges
+
+
+def resolve_split_ranges(
+    doc, ranges=None, every=None, bookmarks=False, start_page=1, end_page=None
+):
+    """
+    Turn split options into (first, last, title) parts. Without `ranges`,
+    `every` or `bookmarks` every page from start_page to end_page becomes
+    its own part.
+    """
+    if bookmarks:
+        return bookmark_page_ranges(doc)
+    if ranges:
+        return [
+            (first, last, None)
+            for first, last in parse_page_ranges(ranges, doc.page_count)
+        ]
+
+    parts = chunk_page_ranges(doc.page_count, every or 1, start_page, end_page)
+    return [(first, last, None) for first, last in parts]
+
+
+def part_filename(first, last, title=None):
+    """Readable file name for a split part"""
+    if title:
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", title).strip("_")[:60]
+        return f"{slug or 'section'}_{first}-{last}"
+    if first == last:
+        return f"page_{first}"
+    return f"pages_{first}-{last}"
+
+
+def iter_split_parts(doc, parts):
+    """
+    Copy each (first, last, title) part of an open document into its own
+    PDF, going over the source once.
+    Yields (part info, pdf bytes).
+    """
+    for index, (first, last, title) in enumerate(parts, start=1):
+        part = pymupdf.open()
+        try:
+            part.insert_pdf(doc, from_page=first - 1, to_page=last - 1)
+            pdf_bytes = part.tobytes(**SAVE_OPTIONS)
+        finally:
+            part.close()
+        record(pages=last - first + 1)
+
+        yield {
+            "part": index,
+            "first_page": first,
+            "last_page": last,
+            "title": title,
+            "name": part_filename(first, last, title),
+        }, pdf_bytes
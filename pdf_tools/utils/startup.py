@@ -0,0 +1,129 @@
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.db import connections
+
+from pdf_tools.utils.aio import shutdown_executors
+from pdf_tools.utils.lazy import load_lazy_modules
+from pdf_tools.utils.parallel import shutdown_process_pool
+from pdf_tools.utils.s3_utils import reset_s3_client
+
+# Run by `measure_import_times` in a fresh interpreter: set up Django, then
+# import the modules named on the command line (and the backends with -w).
+# -X importtime only sees imports made through __import__, not importlib.
+_IMPORT_SCRIPT = """
+import sys, django
+django.setup()
+names = sys.argv[1:]
+warm = names[:1] == ["-w"]
+for name in names[warm:]:
+    __import__(name)
+if warm:
+    from pdf_tools.utils.startup import import_backends
+    import_backends()
+"""
+
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_backends():
+    """
+    Import the URLconf (and with it every view) and the backends that are
+    otherwise loaded by the first request that needs them
+    """
+    __import__(settings.ROOT_URLCONF)
+    load_lazy_modules()
+
+
+def prepare_fork():
+    """
+    Release what must not be shared with forked children: the S3 client
+    (its connection pool), executor threads, the process pool and
+    database connections. All of them are recreated on first use.
+    """
+    reset_s3_client()
+    shutdown_executors()
+    shutdown_process_pool()
+    connections.close_all()
+
+
+def warmup():
+    """
+    Opt-in startup hook for pre-forking servers: import everything a
+    request needs once in the parent, so workers are forked warm instead
+    of paying the imports on every (re)start. See gunicorn.conf.py.
+    """
+    import_backends()
+    prepare_fork()
+
+
+def after_fork():
+    """In a forked child: drop any S3 client inherited from the parent"""
+    reset_s3_client()
+
+
+def measure_import_times(modules=None, warm=False):
+    """
+    Import `modules` (ROOT_URLCONF by default) after `django.setup()` in a
+    fresh interpreter under `python -X importtime`. With `warm`, the lazily
+    imported backends are imported too, as `warmup` does.
+    Returns one {"module", "depth", "self_ms", "cumulative_ms"} per module
+    imported, in import completion order; modules imported by Django itself
+    during setup are included.
+    """
+    args = ["-w"] if warm else []
+    args += modules or [settings.ROOT_URLCONF]
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _IMPORT_SCRIPT, *args],
+        capture_output=True,
+        text=True,
+        cwd=settings.BASE_DIR,
+    )
+    if process.returncode:
+        raise Exception(f"Error importing modules: {process.stderr.strip()[-2000:]}")
+
+    entries = []
+    for line in process.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append(
+                {
+                    "module": name,
+                    "depth": (len(indent) - 1) // 2,
+                    "self_ms": int(self_us) / 1000,
+                    "cumulative_ms": int(cumulative_us) / 1000,
+                }
+            )
+    return entries
+
+
+def summarize_import_times(runs):
+    """
+    Combine the entries of several `measure_import_times` runs, keeping
+    the fastest time of each module, and total the self time per top-level
+    package. Returns (modules sorted by cumulative time, packages sorted by
+    self time, total self time in ms).
+    """
+    modules = {}
+    for entries in runs:
+        for entry in entries:
+            best = modules.get(entry["module"])
+            if best is None or entry["cumulative_ms"] < best["cumulative_ms"]:
+                modules[entry["module"]] = entry
+
+    packages = {}
+    for entry in modules.values():
+        package = entry["module"].split(".")[0]
+        packages[package] = round(packages.get(package, 0.0) + entry["self_ms"], 3)
+
+    return (
+        sorted(modules.values(), key=lambda entry: -entry["cumulative_ms"]),
+        sorted(
+            ({"package": name, "self_ms": ms} for name, ms in packages.items()),
+            key=lambda entry: -entry["self_ms"],
+        ),
+        sum(entry["self_ms"] for entry in modules.values()),
+    )
@@ -1,8 +1,9 @@
-import fitz
-import pymupdf
+import hashlib
+import json
+import logging
 import os
+import time
 import uuid
-import ghostscript
 
 from datetime import datetime
 
@@ -10,6 +11,23 @@ from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.conf import settings
 
+from pdf_tools.utils.compress import run_compression
+from pdf_tools.utils.files import SharedDocument, open_pdf, shard_path
+from pdf_tools.utils.lazy import lazy_import
+from pdf_tools.utils.metrics import observe_stage, record, span
+from pdf_tools.utils.ocr import iter_ocr_text
+from pdf_tools.utils.parallel import iter_text_parallel, should_parallelize
+from pdf_tools.utils.split import (
+    iter_split_parts,
+    parse_page_ranges,
+    resolve_split_ranges,
+)
+
+pymupdf = lazy_import("pymupdf")
+
+
+logger = logging.getLogger(__name__)
+
 
 def gen_temp_file_path(prefix, extension):
     """
@@ -17,7 +35,7 @@ def gen_temp_file_path(prefix, extension):
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     unique_id = str(uuid.uuid4())[:8]
-    return f"temp/{prefix}_{timestamp}_{unique_id}.{extension}"
+    return shard_path("temp", f"{prefix}_{timestamp}_{unique_id}.{extension}")
 
 
 def cleanup_temp_file(filepath):
@@ -26,107 +44,388 @@ def cleanup_temp_file(filepath):
         if default_storage.exists(filepath):
             default_storage.delete(filepath)
     except Exception as e:
-        print(f"Error cleaning up temporary_file {filepath}: {str(e)}")
+        logger.warning("Error cleaning up temporary_file %s: %s", filepath, str(e))
 
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from a PDF file"""
+def resolve_page_range(total_pages, start_page=1, end_page=None, limit=None):
+    """
+    Clamp a 1-based inclusive page range to the document and apply an
+    optional page limit.
+    Returns (first_page, last_page, next_cursor) where next_cursor is the
+    page to resume from, or None once the requested range is exhausted.
+    """
+    if start_page < 1:
+        raise ValueError("startPage must be 1 or greater")
+    if end_page is not None and end_page < start_page:
+        raise ValueError("endPage must not be before startPage")
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be 1 or greater")
+
+    range_end = total_pages if end_page is None else min(end_page, total_pages)
+    last_page = range_end
+    if limit is not None:
+        last_page = min(range_end, start_page + limit - 1)
+
+    next_cursor = last_page + 1 if last_page < range_end else None
+    return start_page, last_page, next_cursor
+
+
+def _iter_page_text(pdf_file, doc, first_page, last_page):
+    """Yield (page_number, text) for a page range, in page order"""
+    # Large ranges are spread over the process pool
+    if should_parallelize(last_page - first_page + 1):
+        with SharedDocument(pdf_file) as document:
+            yield from iter_text_parallel(document, first_page, last_page)
+    else:
+        for page_num in range(first_page - 1, last_page):
+            yield page_num + 1, doc[page_num].get_text()
+
+
+def iter_text_from_pdf(
+    pdf_file,
+    start_page=1,
+    end_page=None,
+    limit=None,
+    ocr_language=None,
+    fingerprint=None,
+):
+    """
+    Extract text one page at a time.
+    Yields {"page": n, "text": ...} for each page in the range followed by
+    a summary {"status", "pages", "total_pages", "next_cursor"}.
+    With `ocr_language`, pages without a text layer are OCRed (see
+    `iter_ocr_text`) and marked with "ocr": true; `fingerprint` keys the
+    cached OCR output and defaults to the SHA-256 of the file.
+    """
+    try:
+        doc = open_pdf(pdf_file)
+    except Exception as e:
+        raise Exception(f"Error extracting text from PDF: {str(e)}")
+
     try:
-        doc = pymupdf.open(stream=pdf_file.read(), filetype="pdf")
-        text_content = {}
+        first_page, last_page, next_cursor = resolve_page_range(
+            len(doc), start_page, end_page, limit
+        )
 
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text_content[f"page_{page_num + 1}"] = page.get_text()
+        pages = _iter_page_text(pdf_file, doc, first_page, last_page)
+        if ocr_language:
+            pages = iter_ocr_text(pdf_file, doc, pages, ocr_language, fingerprint)
+        else:
+            pages = ((page_number, text, False) for page_number, text in pages)
 
-        doc.close()
-        return {
+        # Only time extraction, not what the consumer does between pages
+        elapsed = 0.0
+        started = time.perf_counter()
+
+        for page_number, text, ocr in pages:
+            elapsed += time.perf_counter() - started
+            item = {"page": page_number, "text": text}
+            if ocr:
+                item["ocr"] = True
+            yield item
+            started = time.perf_counter()
+
+        observe_stage("extract_text.pages", elapsed)
+        record(pages=max(last_page - first_page + 1, 0))
+
+        yield {
             "status": "success",
-            "pages": len(text_content),
-            "content": text_content,
+            "pages": max(last_page - first_page + 1, 0),
+            "total_pages": len(doc),
+            "next_cursor": next_cursor,
         }
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
+    finally:
+        doc.close()
 
 
-def extract_images_from_pdf(pdf_file):
-    """Extract images from a PDF file"""
-    try:
-        doc = pymupdf.open(stream=pdf_file.read(), filetype="pdf")
-        images = []
-
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            image_list = page.get_images()
-
-            for img_index, img in enumerate(image_list):
-                xref = img[0]
-                base_image = doc.extract_image(xref)
+def iter_text_from_result(result, start_page=1, end_page=None, limit=None):
+    """
+    Same output as `iter_text_from_pdf`, read from a previously extracted
+    `extract_text_from_pdf` result instead of the document
+    """
+    content = result["content"]
+    total_pages = result.get("total_pages", len(content))
+    first_page, last_page, next_cursor = resolve_page_range(
+        total_pages, start_page, end_page, limit
+    )
+
+    ocr_pages = set(result.get("ocr_pages", ()))
+    for page_number in range(first_page, last_page + 1):
+        item = {"page": page_number, "text": content[f"page_{page_number}"]}
+        if page_number in ocr_pages:
+            item["ocr"] = True
+        yield item
+
+    yield {
+        "status": "success",
+        "pages": max(last_page - first_page + 1, 0),
+        "total_pages": total_pages,
+        "next_cursor": next_cursor,
+    }
 
-                if base_image:
-                    filename = (
-                        f"images/page{page_num + 1}_img{img_index + 1}_"
-                        f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_"
-                        f"{str(uuid.uuid4())[:8]}.{base_image['ext']}"
-                    )
 
-                    saved_path = default_storage.save(
-                        filename, ContentFile(base_image["image"]))
+def collect_text_pages(pages):
+    """Build the `extract_text_from_pdf` result from `iter_text_*` output"""
+    text_content = {}
+    ocr_pages = []
+    for item in pages:
+        if "page" in item:
+            text_content[f"page_{item['page']}"] = item["text"]
+            if item.get("ocr"):
+                ocr_pages.append(item["page"])
+        else:
+            summary = item
+
+    result = {
+        "status": summary["status"],
+        "pages": len(text_content),
+        "total_pages": summary["total_pages"],
+        "next_cursor": summary["next_cursor"],
+        "content": text_content,
+    }
+    if ocr_pages:
+        result["ocr_pages"] = ocr_pages
+    return result
+
+
+def extract_text_from_pdf(
+    pdf_file,
+    start_page=1,
+    end_page=None,
+    limit=None,
+    ocr_language=None,
+    fingerprint=None,
+):
+    """Extract text from a PDF file"""
+    return collect_text_pages(
+        iter_text_from_pdf(
+            pdf_file, start_page, end_page, limit, ocr_language, fingerprint
+        )
+    )
 
-                    image_url = f"{settings.MEDIA_URL}{saved_path}".lstrip("/")
 
-                    image_data = {
-                        "page": page_num + 1,
-                        "index": img_index + 1,
-                        "width": base_image["width"],
-                        "height": base_image["height"],
-                        "format": base_image["ext"],
-                        "url": image_url,
-                    }
-                    images.append(image_data)
+def iter_unique_images(doc, min_width=0, min_height=0, formats=None):
+    """
+    Walk the document once and yield (image, image_bytes) for each distinct
+    image the first time it is seen.
+    Images are deduplicated by xref and by SHA-256 of their bytes across
+    xrefs, so each one is decoded once no matter how many pages use it.
+    `image["pages"]` keeps growing as later pages reference the image and
+    is complete once the generator is exhausted.
+    Images smaller than min_width x min_height, or whose format is not in
+    `formats`, are skipped.
+    """
+    images_by_xref = {}  # None marks an xref that was filtered out
+    images_by_hash = {}
+
+    for page_num, page in enumerate(doc, start=1):
+        for img_index, img in enumerate(page.get_images(full=True), start=1):
+            xref, width, height = img[0], img[2], img[3]
+
+            if xref in images_by_xref:
+                image = images_by_xref[xref]
+                if image is not None and image["pages"][-1] != page_num:
+                    image["pages"].append(page_num)
+                continue
+
+            # Size filters use the image dictionary, no decoding needed
+            if width < min_width or height < min_height:
+                images_by_xref[xref] = None
+                continue
+
+            base_image = doc.extract_image(xref)
+            if not base_image or (formats and base_image["ext"] not in formats):
+                images_by_xref[xref] = None
+                continue
+
+            digest = hashlib.sha256(base_image["image"]).hexdigest()
+            image = images_by_hash.get(digest)
+            is_new = image is None
+            if is_new:
+                image = {
+                    "id": len(images_by_hash) + 1,
+                    "page": page_num,
+                    "index": img_index,
+                    "width": base_image["width"],
+                    "height": base_image["height"],
+                    "format": base_image["ext"],
+                    "sha256": digest,
+                    "xrefs": [],
+                    "pages": [page_num],
+                }
+                images_by_hash[digest] = image
+            elif image["pages"][-1] != page_num:
+                image["pages"].append(page_num)
+
+            image["xrefs"].append(xref)
+            images_by_xref[xref] = image
+
+            if is_new:
+                yield image, base_image["image"]
+
+
+def map_pages_to_images(images):
+    """Build {"<page>": [image ids]} from the `pages` list of each image"""
+    pages = {}
+    for image in images:
+        for page_number in image["pages"]:
+            pages.setdefault(page_number, []).append(image["id"])
+    return {str(page_number): pages[page_number] for page_number in sorted(pages)}
+
+
+def extract_images_from_pdf(
+    pdf_file, min_width=0, min_height=0, formats=None, output_subdir=None
+):
+    """
+    Extract each distinct image of a PDF file once
+    Images are saved under `output_subdir` (relative to MEDIA_ROOT), or
+    under a shard of "images" without one.
+    Returns the unique images, each with the pages it appears on, and a
+    page -> image ids mapping
+    """
+    try:
+        doc = open_pdf(pdf_file)
+        images = []
+        record(pages=doc.page_count)
+
+        for image, image_bytes in iter_unique_images(
+            doc, min_width, min_height, formats
+        ):
+            if output_subdir:
+                filename = os.path.join(
+                    output_subdir,
+                    f"page{image['page']}_img{image['index']}.{image['format']}",
+                )
+            else:
+                filename = shard_path(
+                    "images",
+                    f"page{image['page']}_img{image['index']}_"
+                    f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_"
+                    f"{str(uuid.uuid4())[:8]}.{image['format']}",
+                )
+
+            with span("storage.save"):
+                saved_path = default_storage.save(filename, ContentFile(image_bytes))
+            record(bytes_out=len(image_bytes))
+            image["url"] = f"{settings.MEDIA_URL}{saved_path}".lstrip("/")
+            images.append(image)
 
         doc.close()
         return {
             "status": "success",
             "total_images": len(images),
+            "total_occurrences": sum(len(image["pages"]) for image in images),
             "images": images,
+            "pages": map_pages_to_images(images),
         }
     except Exception as e:
         raise Exception(f"Error extracting images: {str(e)}")
 
 
-def merge_pdfs(pdf_files):
-    """Merge multiple PDF files into a single PDF file"""
+def open_input_pdf(pdf_file):
+    """
+    Open a PDF sent by the client, raising ValueError if it cannot be read.
+    Streaming views open their input with this before the response starts.
+    """
     try:
-        if not pdf_files:
-            raise ValueError("No PDF files provided for merging.")
+        return open_pdf(pdf_file)
+    except Exception as e:
+        raise ValueError(f"Error opening PDF: {str(e)}")
 
-        # Save the first uploaded PDF to a temporary file
-        first_pdf = pdf_files[0]
-        first_pdf_path = default_storage.save(
-            gen_temp_file_path(first_pdf.name, "pdf"), first_pdf
-        )
-        merged_pdf = pymupdf.open(default_storage.path(first_pdf_path))
 
-        # Process remaining PDFs
-        for pdf_file in pdf_files[1:]:
-            temp_pdf_path = default_storage.save(
-                gen_temp_file_path(pdf_file.name, "pdf"), pdf_file
+def iter_image_files(doc, min_width=0, min_height=0, formats=None):
+    """
+    Yield (archive name, bytes) for each distinct image of an open
+    document (see `open_input_pdf`), followed by a `manifest.json`
+    describing the images and their pages. The document is closed at the
+    end. Nothing is written to storage; used to stream images as a ZIP
+    archive.
+    """
+    try:
+        images = []
+        for image, image_bytes in iter_unique_images(
+            doc, min_width, min_height, formats
+        ):
+            image["filename"] = (
+                f"page{image['page']}_img{image['index']}.{image['format']}"
             )
-            new_pdf = pymupdf.open(default_storage.path(temp_pdf_path))
-            merged_pdf.insert_pdf(new_pdf)
+            images.append(image)
+            yield image["filename"], image_bytes
+
+        manifest = {
+            "status": "success",
+            "total_images": len(images),
+            "total_occurrences": sum(len(image["pages"]) for image in images),
+            "images": images,
+            "pages": map_pages_to_images(images),
+        }
+        yield "manifest.json", json.dumps(manifest, indent=2).encode("utf-8")
+    finally:
+        doc.close()
+
+
+def merge_pdfs(pdf_files, progress=None, page_ranges=None, output_subdir=""):
+    """
+    Merge multiple PDF files into a single PDF file
+    `pdf_files` may mix uploads, file objects and paths, or be an iterator
+    such as `iter_files_from_s3` that is consumed one input at a time.
+    Inputs are opened in place (no temporary copies) and each one is closed
+    as soon as its pages have been inserted.
+    `page_ranges` optionally gives a range expression ("1-3,7") per input.
+    The merged file is saved under `output_subdir` of MEDIA_ROOT.
+    `progress`, if given, is called with the number of pages merged so far
+    (the total is None until every input has been merged)
+    """
+    try:
+        page_ranges = list(page_ranges or [])
+        merged_pdf = pymupdf.open()
+        merged_inputs = 0
+
+        for index, pdf_file in enumerate(pdf_files):
+            source = open_pdf(pdf_file)
+            try:
+                expression = page_ranges[index] if index < len(page_ranges) else None
+                if expression:
+                    ranges = parse_page_ranges(expression, source.page_count)
+                else:
+                    ranges = [(1, source.page_count)]
+
+                with span("merge.insert"):
+                    for first, last in ranges:
+                        merged_pdf.insert_pdf(
+                            source, from_page=first - 1, to_page=last - 1
+                        )
+            finally:
+                source.close()
+                source = None
+
+            merged_inputs += 1
+            if progress:
+                progress(merged_pdf.page_count, None)
+
+        if not merged_inputs:
+            raise ValueError("No PDF files provided for merging.")
+        if progress:
+            progress(merged_pdf.page_count, merged_pdf.page_count)
 
         # ✅ Save the merged PDF in `MEDIA_ROOT`
         output_filename = (
-            f"merged_pdf_{datetime.now().strftime('%y%m%d_%h%m%s')}.pdf"
+            f"merged_pdf_{datetime.now().strftime('%Y%m%d_%H%M%S')}_"
+            f"{str(uuid.uuid4())[:8]}.pdf"
         )
+        output_filename = os.path.join(output_subdir, output_filename)
         output_file_path = os.path.join(settings.MEDIA_ROOT, output_filename)
+        os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
 
-        print(f"DEBUG: Saving merged PDF to {
-              output_file_path}")  # Log file path
+        logger.debug("Saving merged PDF to %s", output_file_path)
 
-        merged_pdf.save(output_file_path)
+        record(pages=merged_pdf.page_count)
+        with span("merge.save"):
+            merged_pdf.save(output_file_path, garbage=3, deflate=True)
         merged_pdf.close()
+        record(bytes_out=os.path.getsize(output_file_path))
 
         # ✅ Return the correct media URL
         media_url = f"{settings.MEDIA_URL}{output_filename}"
@@ -136,42 +435,63 @@ def merge_pdfs(pdf_files):
         raise Exception(f"Error merging PDFs: {str(e)}")
 
 
-def split_pdf_to_pages(pdf_file, output_subdir='output_pages', start_page=1, end_page=None):
-    """Split a PDF file into multiple pages"""
+def split_pdf_to_pages(
+    pdf_file,
+    output_subdir="output_pages",
+    start_page=1,
+    end_page=None,
+    progress=None,
+    ranges=None,
+    every=None,
+    bookmarks=False,
+):
+    """
+    Split a PDF file into multiple files
+    By default every page from start_page to end_page is saved on its own.
+    `ranges` ("1-3,7,10-"), `every` (N pages per part) or `bookmarks`
+    (one part per top-level bookmark) select multi-page parts instead.
+    `progress`, if given, is called with (pages done, pages total)
+    Bad options and unreadable documents raise ValueError (see `open_split`).
+    """
+    doc, parts = open_split(pdf_file, start_page, end_page, ranges, every, bookmarks)
     try:
         # This is the actual directory where files will be saved
         output_dir = os.path.join(settings.MEDIA_ROOT, output_subdir)
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-        doc = pymupdf.open(stream=pdf_file.read(), filetype="pdf")
-        if end_page is None:
-            end_page = doc.page_count
-
         pages = []
-        for page_num in range(start_page - 1, end_page):
-            single_page = pymupdf.open()
-            single_page.insert_pdf(doc, from_page=page_num, to_page=page_num)
+        pages_done = 0
+        pages_total = sum(last - first + 1 for first, last, _ in parts)
+        split_started = time.perf_counter()
+        for part, pdf_bytes in iter_split_parts(doc, parts):
             unique_id = str(uuid.uuid4())[:8]
 
-            filename = f"page_{page_num + 1}_{unique_id}.pdf"
+            filename = f"{part['name']}_{unique_id}.pdf"
             output_path = os.path.join(output_dir, filename)
-            print(f"DEBUG: Saving page {page_num + 1} to {output_path}")
-            single_page.save(output_path)
-            single_page.close()
+            logger.debug("Saving %s to %s", part["name"], output_path)
+            with open(output_path, "wb") as output_file:
+                output_file.write(pdf_bytes)
+            record(bytes_out=len(pdf_bytes))
 
             # Relative path for URL
             relative_path = os.path.join(output_subdir, filename)
 
             page_info = {
-                "page_number": page_num + 1,
+                "page_number": part["first_page"],
+                "first_page": part["first_page"],
+                "last_page": part["last_page"],
+                "title": part["title"],
                 "filename": filename,
                 "path": output_path,
                 "url": f"{settings.MEDIA_URL}{relative_path}",
             }
             pages.append(page_info)
+            pages_done += part["last_page"] - part["first_page"] + 1
+            if progress:
+                progress(pages_done, pages_total)
 
-        doc.close()
+        observe_stage("split.parts", time.perf_counter() - split_started)
         return {
             "status": "success",
             "total_pages": len(pages),
@@ -179,64 +499,77 @@ def split_pdf_to_pages(pdf_file, output_subdir='output_pages', start_page=1, end
         }
     except Exception as e:
         raise Exception(f"Error splitting PDF: {str(e)}")
+    finally:
+        doc.close()
+
+
+def open_split(
+    pdf_file, start_page=1, end_page=None, ranges=None, every=None, bookmarks=False
+):
+    """
+    Open `pdf_file` and resolve the parts selected by the split options
+    (see `split_pdf_to_pages`) before any part is produced.
+    Returns (doc, parts); an unreadable document or bad options (range
+    syntax, pages outside the document, no bookmarks) raise ValueError.
+    """
+    doc = open_input_pdf(pdf_file)
+    try:
+        parts = resolve_split_ranges(
+            doc, ranges, every, bookmarks, start_page, end_page
+        )
+    except Exception:
+        doc.close()
+        raise
+    return doc, parts
+
+
+def iter_split_files(doc, parts):
+    """
+    Yield (archive name, bytes) for each part returned by `open_split`,
+    without writing anything to disk. The document is closed at the end.
+    """
+    try:
+        for part, pdf_bytes in iter_split_parts(doc, parts):
+            yield f"{part['name']}.pdf", pdf_bytes
+    finally:
+        doc.close()
 
 
-def compress_pdf(input_path, compression_level):
+def compress_pdf(
+    input_path, compression_level, engine="auto", output_subdir="compressed_pdfs"
+):
     """
-    Compress a PDF file using Ghostscript.
+    Compress a PDF file with Ghostscript or PyMuPDF.
     
     Args:
         input_path (str): Path to the input PDF file.
         compression_level (str): Compression level ('low', 'mid', 'high').
+        engine (str): 'ghostscript', 'pymupdf' or 'auto' to pick one from
+            the document profile.
+        output_subdir (str): Directory under MEDIA_ROOT for the output.
     
     Returns:
-        str: URL of the compressed PDF file.
+        dict: URL and size of the compressed PDF file, plus the engine used,
+        input/output sizes and timing.
     """
-    # Define Ghostscript compression settings for each level
-    compression_settings = {
-        'low': '/screen',
-        'mid': '/ebook',
-        'high': '/prepress'
-    }
-
-    # Get the Ghostscript setting for the specified compression level
-    gs_compression = compression_settings.get(compression_level, '/screen')
-
     # Define the directory and output path for the compressed PDF
-    compressed_dir = os.path.join(settings.MEDIA_ROOT, 'compressed_pdfs')
+    compressed_dir = os.path.join(settings.MEDIA_ROOT, output_subdir)
     if not os.path.exists(compressed_dir):
         os.makedirs(compressed_dir)
 
     output_filename = f"compressed_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4()}.pdf"
     output_path = os.path.join(compressed_dir, output_filename)
 
-    # Ghostscript command arguments
-    args = [
-        "ps2pdf",  # Ghostscript command
-        "-sDEVICE=pdfwrite",
-        f"-dPDFSETTINGS={gs_compression}",
-        "-dNOPAUSE",
-        "-dQUIET",
-        "-dBATCH",
-        f"-sOutputFile={output_path}",
-        input_path
-    ]
-
-    # Run the Ghostscript command
     try:
-        # Convert the arguments to the format expected by Ghostscript
-        args = [str(arg).encode('utf-8') for arg in args]
-        ghostscript.Ghostscript(*args)
-        print(f"PDF compressed successfully: {output_path}")
-
-        print(f"Output Filename: {output_filename}")
-        print(f"Output Path: {output_path}")
-        print(f"File size: {os.path.getsize(output_path)} bytes")
-
-        # Return the URL of the compressed PDF and size of the compressed PDF
-        return {
-            "url": f"{settings.MEDIA_URL}compressed_pdfs/{output_filename}".lstrip("/"),
-            "size": os.path.getsize(output_path)
-        }
-    except ghostscript.GhostscriptError as e:
+        stats = run_compression(input_path, output_path, compression_level, engine)
+    except Exception as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
         raise Exception(f"Error compressing PDF: {str(e)}")
+
+    # Return the URL of the compressed PDF and size of the compressed PDF
+    return {
+        "url": f"{settings.MEDIA_URL}{output_subdir}/{output_filename}".lstrip("/"),
+        "size": stats["output_size"],
+        **stats,
+    }
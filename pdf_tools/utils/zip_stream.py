@@ -0,0 +1,47 @@
+import io
+import zipfile
+
+
+class _ZipSink(io.RawIOBase):
+    """
+    Unseekable write target for ZipFile that keeps only the bytes written
+    since the last `pop()`.
+    ZipFile falls back to data descriptors on unseekable streams, so entries
+    never need to be rewritten once they have been sent.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_STORED):
+    """
+    Build a ZIP archive on the fly from (name, bytes) pairs.
+    Yields archive bytes as soon as each entry has been added, so memory use
+    is bounded by the largest single entry. PDFs and images are already
+    compressed, hence ZIP_STORED by default.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=compression) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+            yield sink.pop()
+    # Central directory written when the archive is closed
+    yield sink.pop()
@@ -1,26 +1,235 @@
+import functools
+import itertools
+import json
+import logging
 import os
+import sys
 
 from django.conf import settings
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.urls import reverse
 
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 
-from pdf_tools.utils.s3_utils import get_file_from_s3
+from pdf_tools.models import PDFJob
+from pdf_tools.renderers import (
+    MessagePackRenderer,
+    NDJSONRenderer,
+    ORJSONRenderer,
+    PrometheusRenderer,
+    dumps,
+)
+from pdf_tools.upload_handlers import PDFUploadHandler
+from pdf_tools.utils.artifacts import (
+    combine_fingerprints,
+    fingerprint_files,
+    get_artifact_store,
+)
+from pdf_tools.utils.batch import BATCH_OPERATIONS, iter_batch_results
+from pdf_tools.utils.cache import get_result_cache, make_cache_key
+from pdf_tools.utils.compress import COMPRESSION_LEVELS, ENGINES
+from pdf_tools.utils.files import pdf_on_disk
+from pdf_tools.utils.jobs import submit_job
+from pdf_tools.utils.layout import (
+    LAYOUT_UNITS,
+    extract_layout,
+    layout_to_binary,
+    layout_to_json,
+)
+from pdf_tools.utils.metrics import render_metrics
+from pdf_tools.utils.ocr import validate_language
+from pdf_tools.utils.render import get_render_cache, render_pages
+from pdf_tools.utils.search import (
+    get_indexed_document,
+    index_document,
+    search_pages,
+)
+from pdf_tools.utils.s3_utils import (
+    fingerprint_s3_file,
+    get_file_from_s3,
+    get_file_etag,
+    iter_files_from_s3,
+)
+from pdf_tools.utils.split import parse_page_ranges
+from pdf_tools.utils.zip_stream import stream_zip
 from pdf_tools.utils.utils import (
+    collect_text_pages,
     extract_text_from_pdf,
+    iter_text_from_pdf,
+    iter_text_from_result,
+    iter_image_files,
+    iter_split_files,
+    open_input_pdf,
+    open_split,
+    resolve_page_range,
     extract_images_from_pdf,
     split_pdf_to_pages,
     merge_pdfs,
     compress_pdf,
 )
-import uuid
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_int_param(data, name, default=None):
+    """Read an optional integer request parameter, raising ValueError if invalid"""
+    value = data.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+
+
+def get_bool_param(data, name, default=False):
+    """Read an optional boolean request parameter ("true", "1", true...)"""
+    value = data.get(name)
+    if value in (None, ""):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def get_list_param(data, name, separator=","):
+    """
+    Read an optional list parameter given as a JSON list, repeated form
+    fields or a separator-delimited string. With `separator=None` values
+    are not split and empty entries keep their position.
+    """
+    if hasattr(data, "getlist"):
+        values = data.getlist(name)
+    else:
+        values = data.get(name)
+    if values in (None, "", []):
+        return None
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+
+    if separator is None:
+        return ["" if value is None else str(value).strip() for value in values]
+
+    items = []
+    for value in values:
+        items.extend(item.strip() for item in str(value).split(separator))
+    return [item for item in items if item] or None
+
+
+def ndjson_lines(items):
+    """Serialize items as newline-delimited JSON, reporting failures inline"""
+    try:
+        for item in items:
+            yield dumps(item) + b"\n"
+    except Exception as e:
+        yield dumps({"error": str(e)}) + b"\n"
+
+
+def zip_response(entries, filename):
+    """Stream (name, bytes) entries to the client as a ZIP archive"""
+    response = StreamingHttpResponse(
+        stream_zip(entries), content_type="application/zip"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def index_text_result(fingerprint, result, file_key, pdf_file=None):
+    """Add a full-document text result to the search index, never failing the request"""
+    try:
+        file_size = 0
+        if pdf_file is not None:
+            file_size = pdf_file.seek(0, os.SEEK_END)
+        index_document(fingerprint, result, file_key=file_key, file_size=file_size)
+    except Exception as e:
+        logger.warning("Error indexing %s: %s", file_key, str(e))
+
+
+def iter_and_store_text(pages, store):
+    """Pass streamed pages through, then call `store` with the full result"""
+    items = []
+    for item in pages:
+        items.append(item)
+        yield item
+    store(collect_text_pages(items))
+
+
+def queue_job(request, operation, pdf_files, params=None):
+    """Queue an asynchronous job and answer 202 with its status URL"""
+    try:
+        job = submit_job(operation, pdf_files, params)
+    except Exception as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    data = job.to_dict()
+    data["status_url"] = request.build_absolute_uri(
+        reverse("pdf-job-status", args=[job.id])
+    )
+    return Response({"data": data}, status=status.HTTP_202_ACCEPTED)
+
+
+class PDFUploadMixin:
+    """
+    Parse multipart uploads with PDFUploadHandler (PDF check, size limits,
+    SHA-256) in views that accept PDF files; other views keep Django's
+    default upload handlers
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [PDFUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
 
 
 class PDFExtractTextView(APIView):
-    """ Extract text from a PDF file """
+    """
+    Extract text from a PDF file
+    Optional parameters:
+        startPage / endPage: 1-based inclusive page range
+        limit: maximum number of pages returned, `next_cursor` in the
+            response is the page to pass as `cursor` to fetch the rest
+        cursor: page to resume from, takes precedence over startPage
+        stream: respond with one JSON line per page (NDJSON) as pages are
+            extracted, also selected by `Accept: application/x-ndjson`
+        ocr: OCR pages that have no text layer (scans), marked with
+            "ocr": true; the other pages are extracted as usual
+        ocrLanguage: Tesseract language(s) such as "eng+deu", defaults
+            to PDF_OCR_LANGUAGE
+    """
+
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer, NDJSONRenderer]
+
+    def get_options(self, request):
+        """Validated request options, raising ValueError for bad input"""
+        start_page = get_int_param(request.data, "startPage", 1)
+        start_page = get_int_param(request.data, "cursor", start_page)
+        end_page = get_int_param(request.data, "endPage")
+        limit = get_int_param(request.data, "limit")
+        # Validate the range before touching S3
+        resolve_page_range(0, start_page, end_page, limit)
+        return start_page, end_page, limit
+
+    def get_ocr_language(self, request):
+        """OCR language, or None without OCR; raises ValueError for bad input"""
+        if not get_bool_param(request.data, "ocr"):
+            return None
+        return validate_language(request.data.get("ocrLanguage"))
+
+    @staticmethod
+    def cache_params(ocr_language):
+        """Result cache key parameters; OCR results are kept apart"""
+        return {"ocr": ocr_language} if ocr_language else {}
+
+    def wants_stream(self, request):
+        return get_bool_param(request.data, "stream") or (
+            request.accepted_renderer.format == NDJSONRenderer.format
+        )
 
     def post(self, request, *args, **kwargs):
         file_key = request.data.get("fileKey")
@@ -33,10 +242,60 @@ class PDFExtractTextView(APIView):
             )
 
         try:
-            pdf_file = get_file_from_s3(file_key)
+            start_page, end_page, limit = self.get_options(request)
+            ocr_language = self.get_ocr_language(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        stream = self.wants_stream(request)
+        full_document = start_page == 1 and end_page is None and limit is None
+
+        try:
+            cache = get_result_cache()
 
-            result = extract_text_from_pdf(pdf_file)
+            # Key the cache by the S3 ETag so a hit skips the download too
+            fingerprint, pdf_file = fingerprint_s3_file(file_key)
 
+            cache_key = make_cache_key(
+                "extract_text", fingerprint, **self.cache_params(ocr_language)
+            )
+            result = cache.get(cache_key)
+
+            def store(full_result):
+                cache.set(cache_key, full_result)
+                index_text_result(fingerprint, full_result, file_key, pdf_file)
+
+            if result is not None:
+                pages = iter_text_from_result(result, start_page, end_page, limit)
+                if get_indexed_document(fingerprint) is None:
+                    index_text_result(fingerprint, result, file_key)
+            else:
+                if pdf_file is None:
+                    pdf_file = get_file_from_s3(file_key)
+                pages = iter_text_from_pdf(
+                    pdf_file,
+                    start_page,
+                    end_page,
+                    limit,
+                    ocr_language,
+                    fingerprint,
+                )
+
+            if stream:
+                if result is None and full_document:
+                    pages = iter_and_store_text(pages, store)
+                return StreamingHttpResponse(
+                    ndjson_lines(pages),
+                    content_type="application/x-ndjson",
+                )
+
+            if result is None or not full_document:
+                result = collect_text_pages(pages)
+                if full_document:
+                    store(result)
 
             return Response({"data": result}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -46,8 +305,291 @@ class PDFExtractTextView(APIView):
             )
 
 
+class PDFExtractLayoutView(APIView):
+    """
+    Extract the positions of words or blocks of a PDF file
+    Parameters:
+        fileKey: S3 document
+        unit: "words" (default) or "blocks"
+        startPage / endPage / limit / cursor: as for text extraction
+    Every page of `content` is columnar: x0/y0/x1/y1 bounding boxes,
+    block/line/word numbers (block/type for blocks) and all texts in one
+    `text` buffer, entry i being text[offsets[i]:offsets[i + 1]].
+    With `Accept: application/msgpack` the response is MessagePack and the
+    columns are raw little-endian arrays whose types are listed in `dtypes`
+    (float32 boxes, uint32 ids and byte offsets into the UTF-8 text);
+    in JSON they are lists and offsets count characters.
+    """
+
+    renderer_classes = [
+        ORJSONRenderer,
+        BrowsableAPIRenderer,
+        MessagePackRenderer,
+    ]
+
+    get_options = PDFExtractTextView.get_options
+
+    def get_unit(self, request):
+        unit = request.data.get("unit") or "words"
+        if unit not in LAYOUT_UNITS:
+            raise ValueError(f"unit must be one of: {', '.join(LAYOUT_UNITS)}")
+        return unit
+
+    def serialize(self, request, result):
+        if request.accepted_renderer.format == MessagePackRenderer.format:
+            return layout_to_binary(result)
+        return layout_to_json(result)
+
+    def post(self, request, *args, **kwargs):
+        file_key = request.data.get("fileKey")
+
+        if not file_key:
+            return Response(
+                {"error": "No file key provided"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            unit = self.get_unit(request)
+            start_page, end_page, limit = self.get_options(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            pdf_file = get_file_from_s3(file_key)
+            result = extract_layout(pdf_file, unit, start_page, end_page, limit)
+            return Response(
+                {"data": self.serialize(request, result)},
+                status=status.HTTP_200_OK,
+            )
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class PDFCacheStatsView(APIView):
+    """ Report hit/miss counters and size of the result cache and artifact store """
+
+    def get(self, request, *args, **kwargs):
+        data = get_result_cache().stats()
+        data["artifacts"] = get_artifact_store().stats()
+        data["renders"] = get_render_cache().stats()
+        return Response({"data": data}, status=status.HTTP_200_OK)
+
+
+class PDFSearchView(APIView):
+    """
+    Full-text search over the text of previously extracted documents
+    Parameters:
+        q: words to search for
+        fileKey: only search this S3 document, extracting and indexing
+            its text first if it has not been indexed yet
+        limit: maximum number of hits (default 20, at most 100)
+    Each hit has the document, page number and an HTML-escaped snippet
+    with matches wrapped in <mark></mark>
+    """
+
+    def get(self, request, *args, **kwargs):
+        return self.search(request, request.query_params)
+
+    def post(self, request, *args, **kwargs):
+        return self.search(request, request.data)
+
+    @staticmethod
+    def get_options(data):
+        """(query, fileKey, limit), raising ValueError for bad input"""
+        query = (data.get("q") or "").strip()
+        if not query:
+            raise ValueError("No search query provided")
+        limit = min(get_int_param(data, "limit", 20), 100)
+        return query, data.get("fileKey"), limit
+
+    @staticmethod
+    def store_document(fingerprint, result, file_key, pdf_file):
+        """Cache and index the text of a document extracted for a search"""
+        get_result_cache().set(make_cache_key("extract_text", fingerprint), result)
+        return index_document(
+            fingerprint,
+            result,
+            file_key=file_key,
+            file_size=pdf_file.seek(0, os.SEEK_END),
+        )
+
+    def search(self, request, data):
+        try:
+            query, file_key, limit = self.get_options(data)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            document = None
+            if file_key:
+                fingerprint, pdf_file = fingerprint_s3_file(file_key)
+                document = get_indexed_document(fingerprint)
+                if document is None:
+                    if pdf_file is None:
+                        pdf_file = get_file_from_s3(file_key)
+                    result = extract_text_from_pdf(pdf_file)
+                    document = self.store_document(
+                        fingerprint, result, file_key, pdf_file
+                    )
+
+            hits = search_pages(
+                query, document.id if document else None, limit
+            )
+            return Response(
+                {"data": {"query": query, "total": len(hits), "results": hits}},
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class PDFRenderView(APIView):
+    """
+    Render PDF pages to PNG or WebP images, e.g. for page previews
+    Parameters:
+        fileKey: S3 key of the PDF
+        pages: range expression such as "1-3,7,10-" (all pages by default)
+        dpi: resolution (default PDF_RENDER_DEFAULT_DPI)
+        width / height: fit each page within this box, in pixels,
+            instead of rendering at a fixed dpi
+        imageFormat: "png" (default) or "webp"
+        output: "image" redirects to the image of a single page, so the
+            endpoint can be used directly as an <img> source
+    Images are cached, so only pages not rendered before at the same size
+    are rendered; the response lists the URL and pixel size of each page.
+    """
+
+    def get(self, request, *args, **kwargs):
+        return self.render(request, request.query_params)
+
+    def post(self, request, *args, **kwargs):
+        return self.render(request, request.data)
+
+    def get_options(self, data):
+        """`render_pages` options, raising ValueError for bad input"""
+        options = {
+            "pages": data.get("pages") or None,
+            "dpi": get_int_param(data, "dpi"),
+            "width": get_int_param(data, "width"),
+            "height": get_int_param(data, "height"),
+            "image_format": (data.get("imageFormat") or "png").lower(),
+        }
+        pages = options["pages"]
+        # Check the expression syntax before touching S3
+        if pages:
+            parse_page_ranges(pages, sys.maxsize)
+        for name in ("dpi", "width", "height"):
+            if options[name] is not None and options[name] < 1:
+                raise ValueError(f"{name} must be 1 or greater")
+        if data.get("output") == "image" and (
+            not pages or "," in pages or "-" in pages
+        ):
+            raise ValueError("output=image needs a single page in pages")
+        return options
+
+    def render_response(self, data, result):
+        if data.get("output") == "image":
+            return HttpResponseRedirect("/" + result["pages"][0]["url"])
+        return Response({"data": result}, status=status.HTTP_200_OK)
+
+    def render(self, request, data):
+        file_key = data.get("fileKey")
+
+        if not file_key:
+            return Response(
+                {"error": "No file key provided"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            options = self.get_options(data)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            fingerprint, pdf_file = fingerprint_s3_file(file_key)
+            result = render_pages(
+                fingerprint,
+                lambda: pdf_file or get_file_from_s3(file_key),
+                **options,
+            )
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        return self.render_response(data, result)
+
+
 class PDFExtractImagesView(APIView):
-    """ Extract images from a PDF file """
+    """
+    Extract images from a PDF file
+    Each distinct image is extracted once, with the pages it appears on.
+    Optional parameters:
+        minWidth / minHeight: skip images smaller than this, in pixels
+        formats: only keep these formats, e.g. "png,jpeg"
+        output: "zip" streams the images and a manifest.json as a ZIP
+            archive instead of saving them to media storage
+    Saved images are kept in the artifact store, so the same document and
+    options return the same URLs until the artifact expires.
+    """
+
+    def get_options(self, request):
+        """(min_width, min_height, formats), raising ValueError for bad input"""
+        min_width = get_int_param(request.data, "minWidth", 0)
+        min_height = get_int_param(request.data, "minHeight", 0)
+        formats = get_list_param(request.data, "formats")
+        if formats:
+            formats = [image_format.lower() for image_format in formats]
+        return min_width, min_height, formats
+
+    @staticmethod
+    def extract_images(
+        get_pdf_file, min_width, min_height, formats, output_subdir
+    ):
+        return extract_images_from_pdf(
+            get_pdf_file(), min_width, min_height, formats, output_subdir
+        )
+
+    def get_artifact(self, fingerprint, get_pdf_file, min_width, min_height, formats):
+        """Saved images for this document and options, extracted on a miss"""
+        return get_artifact_store().get_or_create(
+            "extract_images",
+            fingerprint,
+            functools.partial(
+                self.extract_images, get_pdf_file, min_width, min_height, formats
+            ),
+            min_width=min_width,
+            min_height=min_height,
+            formats=",".join(sorted(formats or [])),
+        )
 
     def post(self, request, *args, **kwargs):
         file_key = request.data.get("fileKey")
@@ -60,8 +602,43 @@ class PDFExtractImagesView(APIView):
             )
 
         try:
-            pdf_file = get_file_from_s3(file_key)
-            result = extract_images_from_pdf(pdf_file)
+            min_width, min_height, formats = self.get_options(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if request.data.get("output") == "zip":
+            try:
+                pdf_file = get_file_from_s3(file_key)
+            except Exception as e:
+                return Response(
+                    {"error": str(e)},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+            # Open before streaming: failures past this point cut the ZIP short
+            try:
+                doc = open_input_pdf(pdf_file)
+            except ValueError as e:
+                return Response(
+                    {"error": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return zip_response(
+                iter_image_files(doc, min_width, min_height, formats),
+                "images.zip",
+            )
+
+        try:
+            fingerprint, pdf_file = fingerprint_s3_file(file_key)
+            result = self.get_artifact(
+                fingerprint,
+                lambda: pdf_file or get_file_from_s3(file_key),
+                min_width,
+                min_height,
+                formats,
+            )
 
             if not result["images"]:
                 return Response(
@@ -69,15 +646,6 @@ class PDFExtractImagesView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # ✅ Cleanup extracted images after sending the response
-            for img in result["images"]:
-                image_path = img["url"].replace(
-                    settings.MEDIA_URL, "")  # Remove /media/ prefix
-                full_path = os.path.join(settings.MEDIA_ROOT, image_path)
-
-                if default_storage.exists(full_path):
-                    default_storage.delete(full_path)
-
             return Response({"data": result}, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -87,7 +655,7 @@ class PDFExtractImagesView(APIView):
             )
 
 
-class PDFMergeView(APIView):
+class PDFMergeView(PDFUploadMixin, APIView):
     """
     Merge multiple PDF files into a single PDF file
     Input Format:
@@ -95,45 +663,73 @@ class PDFMergeView(APIView):
         "pdfs": [
             {"file": "file1.pdf"},
             {"file": "file2.pdf"},
-        ]
+        ],
+        "fileKeys": ["uploads/file3.pdf"],
+        "ranges": ["1-3", "", "2,5-"]
     }
+    Uploaded files are merged first, followed by the S3 `fileKeys`.
+    `ranges` optionally selects pages of each input, in the same order;
+    an empty entry keeps every page.
     """
 
-    def post(self, request, *args, **kwargs):
+    def get_inputs(self, request):
+        """(uploads, S3 keys, page ranges), raising ValueError for bad input"""
         pdf_files = request.FILES.getlist("pdfs")
-        """ POST method to merge PDF files """
+        file_keys = get_list_param(request.data, "fileKeys", separator=None) or []
+        page_ranges = get_list_param(request.data, "ranges", separator=None)
 
         # Check if the files are present in the request
-        if not pdf_files:
-            return Response(
-                {"error": "No files uploaded!"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        if not pdf_files and not file_keys:
+            raise ValueError("No files uploaded!")
 
         # Check if the files are PDFs or not
         for pdf_file in pdf_files:
             if not pdf_file.name.endswith(".pdf"):
-                return Response(
-                    {"error": "Please upload PDF files"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+                raise ValueError("Please upload PDF files")
+
+        # Check the range syntax before any file is fetched
+        for expression in page_ranges or []:
+            if expression:
+                parse_page_ranges(expression, sys.maxsize)
+        return pdf_files, file_keys, page_ranges
+
+    @staticmethod
+    def merge(pdf_files, file_keys, page_ranges, output_subdir):
+        # S3 inputs are downloaded concurrently while earlier ones merge
+        inputs = itertools.chain(pdf_files, iter_files_from_s3(file_keys))
+        return merge_pdfs(
+            inputs, page_ranges=page_ranges, output_subdir=output_subdir
+        )
 
-        # Check if the file size is within the limit
-        # for pdf_file in pdf_files:
-        #     if pdf_file.size > int(MAX_PDF_SIZE):
-        #         return Response(
-        #             {"error": "File size exceeds the limit"},
-        #             status=status.HTTP_400_BAD_REQUEST,
-        #         )
-        # for pdf_file in pdf_files:
-        #     if pdf_file.size > int(MAX_PDF_SIZE):
-        #         return Response(
-        #             {"error": "File size exceeds the limit"},
-        #             status=status.HTTP_400_BAD_REQUEST,
-        #         )
-
-        try:
-            result = merge_pdfs(pdf_files)
+    def post(self, request, *args, **kwargs):
+        """ POST method to merge PDF files """
+        try:
+            pdf_files, file_keys, page_ranges = self.get_inputs(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if get_bool_param(request.data, "async"):
+            return queue_job(
+                request,
+                PDFJob.OPERATION_MERGE,
+                pdf_files,
+                {"file_keys": file_keys, "page_ranges": page_ranges},
+            )
+
+        try:
+            # S3 inputs are fingerprinted by ETag so a hit downloads nothing
+            fingerprints = fingerprint_files(pdf_files) + [
+                get_file_etag(file_key) for file_key in file_keys
+            ]
+            result = get_artifact_store().get_or_create(
+                "merge",
+                combine_fingerprints(fingerprints),
+                functools.partial(self.merge, pdf_files, file_keys, page_ranges),
+                page_ranges=json.dumps(page_ranges),
+            )
             return Response({"data": result}, status=status.HTTP_200_OK)
         except Exception as e:
             return Response(
@@ -142,24 +738,85 @@ class PDFMergeView(APIView):
             )
 
 
-class PDFSplitView(APIView):
-    """Split a PDF file into multiple pages"""
+class PDFSplitView(PDFUploadMixin, APIView):
+    """
+    Split a PDF file into multiple files
+    Parts are selected by one of:
+        startPage / endPage: one file per page in the range (default)
+        ranges: range expression such as "1-3,7,10-", one file per range
+        every: fixed-size chunks of N pages
+        bookmarks: one file per top-level bookmark
+    With `output=zip` the parts are streamed back as a ZIP archive instead
+    of being saved to media storage
+    """
+
+    @staticmethod
+    def get_options(request):
+        """Split options, raising ValueError for bad input"""
+        options = {
+            "start_page": get_int_param(request.data, "startPage", 1),
+            "end_page": get_int_param(request.data, "endPage"),
+            "ranges": request.data.get("ranges") or None,
+            "every": get_int_param(request.data, "every"),
+            "bookmarks": get_bool_param(request.data, "bookmarks"),
+        }
+        # Check the expression syntax before any work is started
+        if options["ranges"]:
+            parse_page_ranges(options["ranges"], sys.maxsize)
+        if options["every"] is not None and options["every"] < 1:
+            raise ValueError("every must be 1 or greater")
+        return options
+
+    @staticmethod
+    def split(pdf_file, options, output_subdir):
+        return split_pdf_to_pages(pdf_file, output_subdir, **options)
 
     def post(self, request, *args, **kwargs):
         pdf_file = request.FILES.get("pdfFile")
-        start_page = request.data.get("startPage")
-        end_page = request.data.get("endPage")
 
         if not pdf_file:
             return Response(
                 {"error": "No PDF file provided"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-            
+
+        try:
+            options = self.get_options(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if get_bool_param(request.data, "async"):
+            return queue_job(request, PDFJob.OPERATION_SPLIT, [pdf_file], options)
+
+        if request.data.get("output") == "zip":
+            # Resolve the parts before streaming: failures past this point
+            # cut the ZIP short
+            try:
+                doc, parts = open_split(pdf_file, **options)
+            except ValueError as e:
+                return Response(
+                    {"error": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return zip_response(iter_split_files(doc, parts), "pages.zip")
+
         try:
-            # output_dir = os.path.join(settings.MEDIA_ROOT)
-            result = split_pdf_to_pages(pdf_file, "output_pages", int(start_page), int(end_page))
+            result = get_artifact_store().get_or_create(
+                "split",
+                combine_fingerprints(fingerprint_files([pdf_file])),
+                functools.partial(self.split, pdf_file, options),
+                **options,
+            )
             return Response({"data": result}, status=status.HTTP_200_OK)
+        except ValueError as e:
+            # Options the document doesn't satisfy, or an unreadable upload
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         except Exception as e:
             return Response(
                 {"error": str(e)},
@@ -167,12 +824,35 @@ class PDFSplitView(APIView):
             )
 
 
-class PDFCompressView(APIView):
+class PDFCompressView(PDFUploadMixin, APIView):
     """Compress a PDF file"""
 
+    @staticmethod
+    def compress(pdf_file, compression_level, engine, output_subdir):
+        # Uploads are already on disk (PDFUploadHandler), compress in place
+        with pdf_on_disk(pdf_file) as input_path:
+            return compress_pdf(input_path, compression_level, engine, output_subdir)
+
+    @staticmethod
+    def get_engine(request):
+        """Requested engine, raising ValueError for an unknown one"""
+        engine = request.data.get("engine", "auto")
+        if engine not in ("auto", *ENGINES):
+            raise ValueError(f"engine must be one of: auto, {', '.join(ENGINES)}")
+        return engine
+
+    @staticmethod
+    def get_compression_level(request):
+        """Requested level, raising ValueError for an unknown one"""
+        compression_level = request.data.get("compressionLevel", "low")
+        if compression_level not in COMPRESSION_LEVELS:
+            raise ValueError(
+                f"compressionLevel must be one of: {', '.join(COMPRESSION_LEVELS)}"
+            )
+        return compression_level
+
     def post(self, request, *args, **kwargs):
         pdf_file = request.FILES.get("pdfFile")
-        compression_level = request.data.get("compressionLevel", "low")
 
         if not pdf_file:
             return Response(
@@ -181,15 +861,30 @@ class PDFCompressView(APIView):
             )
 
         try:
-            # Save the uploaded PDF to a temporary location
-            temp_filename = f"temp/{uuid.uuid4()}_{pdf_file.name}"
-            temp_pdf_path = default_storage.save(temp_filename, ContentFile(pdf_file.read()))
+            compression_level = self.get_compression_level(request)
+            engine = self.get_engine(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-            # Compress the PDF and get the URL
-            compressed_url = compress_pdf(default_storage.path(temp_pdf_path), compression_level)
+        if get_bool_param(request.data, "async"):
+            return queue_job(
+                request,
+                PDFJob.OPERATION_COMPRESS,
+                [pdf_file],
+                {"compression_level": compression_level, "engine": engine},
+            )
 
-            # Clean up the temporary file
-            default_storage.delete(temp_pdf_path)
+        try:
+            compressed_url = get_artifact_store().get_or_create(
+                "compress",
+                combine_fingerprints(fingerprint_files([pdf_file])),
+                functools.partial(self.compress, pdf_file, compression_level, engine),
+                compression_level=compression_level,
+                engine=engine,
+            )
 
             return Response({"data": compressed_url}, status=status.HTTP_200_OK)
 
@@ -198,3 +893,92 @@ class PDFCompressView(APIView):
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+
+
+class PDFBatchView(APIView):
+    """
+    Run one operation on many S3 documents
+    Input Format:
+    {
+        "operation": "extract-text" | "extract-images" | "page-count",
+        "fileKeys": ["uploads/file1.pdf", "uploads/file2.pdf"]
+    }
+    The response is newline-delimited JSON with one line per document as
+    soon as it is done (in completion order, `index` is its position in
+    `fileKeys`), either with its `data` or its own `error`, followed by a
+    summary line. "extract-images" only describes the images, no files
+    are stored.
+    """
+
+    def get_inputs(self, request):
+        """(operation, S3 keys), raising ValueError for bad input"""
+        operation = request.data.get("operation")
+        file_keys = get_list_param(request.data, "fileKeys", separator=None)
+
+        if operation not in BATCH_OPERATIONS:
+            raise ValueError(
+                f"operation must be one of: {', '.join(BATCH_OPERATIONS)}"
+            )
+        if not file_keys:
+            raise ValueError("No file keys provided")
+        if len(file_keys) > settings.PDF_BATCH_MAX_KEYS:
+            raise ValueError(
+                f"At most {settings.PDF_BATCH_MAX_KEYS} file keys per batch"
+            )
+        return operation, file_keys
+
+    @staticmethod
+    def on_result(operation):
+        """Callback indexing the text of extracted documents for search"""
+        if operation != "extract-text":
+            return None
+
+        def index(file_key, fingerprint, result, pdf_file):
+            if pdf_file is not None or get_indexed_document(fingerprint) is None:
+                index_text_result(fingerprint, result, file_key, pdf_file)
+
+        return index
+
+    def post(self, request, *args, **kwargs):
+        try:
+            operation, file_keys = self.get_inputs(request)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = iter_batch_results(
+            operation, file_keys, on_result=self.on_result(operation)
+        )
+        return StreamingHttpResponse(
+            ndjson_lines(results), content_type="application/x-ndjson"
+        )
+
+
+class PDFJobStatusView(APIView):
+    """Report state, progress and result of an asynchronous job"""
+
+    def get(self, request, job_id, *args, **kwargs):
+        try:
+            job = PDFJob.objects.get(id=job_id)
+        except PDFJob.DoesNotExist:
+            return Response(
+                {"error": "Job not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        return Response({"data": job.to_dict()}, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """Request latency, stage timings, bytes and pages in Prometheus text format"""
+
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request, *args, **kwargs):
+        return Response(
+            render_metrics(),
+            status=status.HTTP_200_OK,
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
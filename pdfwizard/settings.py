@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 from pathlib import Path
@@ -35,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "pdf_tools.middleware.RequestMetricsMiddleware",
+    "pdf_tools.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -143,10 +146,202 @@ MEDIA_URL = "/media/"  # Use environment variable
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 # FILE SIZE
-MAX_PDF_SIZE = os.getenv("MAX_PDF_SIZE")
+# Uploads to the merge, split and compress views are streamed to temporary
+# files by PDFUploadHandler, which refuses files past MAX_PDF_SIZE bytes and
+# request bodies past PDF_UPLOAD_MAX_REQUEST_SIZE bytes (0 disables either limit)
+MAX_PDF_SIZE = int(os.getenv("MAX_PDF_SIZE", 100 * 1024 * 1024))
+PDF_UPLOAD_MAX_REQUEST_SIZE = int(
+    os.getenv("PDF_UPLOAD_MAX_REQUEST_SIZE", 500 * 1024 * 1024)
+)
+
+# Downloaded PDFs stay in memory up to PDF_SPOOL_MAX_MEMORY bytes and are
+# spilled to a temporary file in PDF_SPOOL_DIR (system default if unset) above
+PDF_SPOOL_MAX_MEMORY = int(os.getenv("PDF_SPOOL_MAX_MEMORY", 8 * 1024 * 1024))
+PDF_SPOOL_DIR = os.getenv("PDF_SPOOL_DIR") or None
+# In-memory documents handed to worker processes are written once to
+# PDF_SHARED_DIR (PDF_SPOOL_DIR when it is unset or full) and opened by path
+PDF_SHARED_DIR = os.getenv(
+    "PDF_SHARED_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else ""
+) or None
 
 # AWS
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None  # MinIO / moto
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 50))
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", 5))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", 60))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", 5))
+S3_RETRY_MODE = os.getenv("S3_RETRY_MODE", "adaptive")
+S3_DOWNLOAD_CHUNK_SIZE = int(os.getenv("S3_DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+# Objects are fetched in S3_MULTIPART_CHUNKSIZE ranges; above the threshold
+# the ranges after the first are downloaded in parallel
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 16 * 1024 * 1024))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024))
+S3_TRANSFER_CONCURRENCY = int(os.getenv("S3_TRANSFER_CONCURRENCY", 10))
+# Files downloaded ahead of the consumer when several keys are fetched
+S3_PREFETCH = int(os.getenv("S3_PREFETCH", 2))
+
+# RESULT CACHE
+# Backends are checked in order: "memory" (in-process LRU), "disk" and
+# "django" (uses the Django cache named by PDF_RESULT_CACHE_DJANGO_ALIAS)
+PDF_RESULT_CACHE = {
+    "BACKENDS": os.getenv("PDF_RESULT_CACHE_BACKENDS", "memory disk").split(),
+    "KEY": os.getenv("PDF_RESULT_CACHE_KEY", "etag"),  # "etag" or "sha256"
+    "TTL": int(os.getenv("PDF_RESULT_CACHE_TTL", 24 * 60 * 60)),
+    "MAX_ENTRIES": int(os.getenv("PDF_RESULT_CACHE_MAX_ENTRIES", 256)),
+    "MAX_BYTES": int(os.getenv("PDF_RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+    "DIR": os.getenv(
+        "PDF_RESULT_CACHE_DIR", os.path.join(BASE_DIR, "cache", "results")
+    ),
+    "DISK_MAX_BYTES": int(
+        os.getenv("PDF_RESULT_CACHE_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+    ),
+    "DJANGO_CACHE_ALIAS": os.getenv("PDF_RESULT_CACHE_DJANGO_ALIAS", "default"),
+}
+
+# PARALLEL TEXT EXTRACTION
+# Documents with at least PDF_PARALLEL_MIN_PAGES pages are extracted across
+# PDF_PARALLEL_WORKERS processes (defaults to the number of CPUs)
+PDF_PARALLEL_WORKERS = int(os.getenv("PDF_PARALLEL_WORKERS", 0))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 64))
+PDF_PARALLEL_START_METHOD = os.getenv("PDF_PARALLEL_START_METHOD", "spawn")
+
+# ASYNC VIEWS
+# With PDF_ASYNC_VIEWS the S3-backed endpoints are served by coroutine views
+# (run under ASGI, e.g. `uvicorn pdfwizard.asgi:application`). Their S3
+# requests run on PDF_ASYNC_IO_WORKERS threads (defaults to
+# S3_MAX_POOL_CONNECTIONS) and PyMuPDF/Ghostscript work on
+# PDF_ASYNC_CPU_WORKERS threads (defaults to the number of CPUs)
+PDF_ASYNC_VIEWS = os.getenv("PDF_ASYNC_VIEWS", "False").lower() in ("true", "1")
+PDF_ASYNC_IO_WORKERS = int(os.getenv("PDF_ASYNC_IO_WORKERS", 0))
+PDF_ASYNC_CPU_WORKERS = int(os.getenv("PDF_ASYNC_CPU_WORKERS", 0))
+
+# ASYNC JOBS
+# Jobs are queued in the database and executed by `manage.py run_pdf_workers`
+PDF_JOBS_CONCURRENCY = int(os.getenv("PDF_JOBS_CONCURRENCY", 0))
+PDF_JOBS_TIMEOUT = int(os.getenv("PDF_JOBS_TIMEOUT", 15 * 60))
+PDF_JOBS_MAX_ATTEMPTS = int(os.getenv("PDF_JOBS_MAX_ATTEMPTS", 3))
+PDF_JOBS_POLL_INTERVAL = float(os.getenv("PDF_JOBS_POLL_INTERVAL", 1))
+PDF_JOBS_HEARTBEAT_INTERVAL = float(os.getenv("PDF_JOBS_HEARTBEAT_INTERVAL", 5))
+PDF_JOBS_STALE_AFTER = int(os.getenv("PDF_JOBS_STALE_AFTER", 60))
+# Finished jobs are deleted by the media janitor this many seconds after
+# they finished (0 keeps them)
+PDF_JOBS_RETENTION = int(os.getenv("PDF_JOBS_RETENTION", 7 * 24 * 60 * 60))
+
+# COMPRESSION
+# Ghostscript runs as a separate `gs` process; at most PDF_GS_MAX_CONCURRENCY
+# run at once on a machine (shared through lock files in PDF_GS_LOCK_DIR)
+PDF_GS_BINARY = os.getenv("PDF_GS_BINARY", "gs")
+PDF_GS_MAX_CONCURRENCY = int(os.getenv("PDF_GS_MAX_CONCURRENCY", os.cpu_count() or 1))
+PDF_GS_TIMEOUT = int(os.getenv("PDF_GS_TIMEOUT", 5 * 60))
+PDF_GS_QUEUE_TIMEOUT = int(os.getenv("PDF_GS_QUEUE_TIMEOUT", 60))
+PDF_GS_LOCK_DIR = os.getenv(
+    "PDF_GS_LOCK_DIR", os.path.join(tempfile.gettempdir(), "pdfwizard-gs")
+)
+# With engine "auto", documents whose image streams take at least this share
+# of the file go to Ghostscript, the rest to the faster PyMuPDF engine
+PDF_COMPRESS_IMAGE_SHARE = float(os.getenv("PDF_COMPRESS_IMAGE_SHARE", 0.5))
+
+# ARTIFACT STORE
+# Compress/merge/split outputs and extracted images are stored under
+# MEDIA_ROOT/PDF_ARTIFACTS_SUBDIR keyed by (input hash, operation,
+# parameters) and reused on repeated calls;
+# least recently used artifacts are evicted past PDF_ARTIFACTS_MAX_BYTES
+PDF_ARTIFACTS_SUBDIR = os.getenv("PDF_ARTIFACTS_SUBDIR", "artifacts")
+PDF_ARTIFACTS_MAX_BYTES = int(
+    os.getenv("PDF_ARTIFACTS_MAX_BYTES", 5 * 1024 * 1024 * 1024)
+)
+PDF_ARTIFACTS_TTL = int(os.getenv("PDF_ARTIFACTS_TTL", 7 * 24 * 60 * 60))
+
+# PAGE RENDERING
+# Rendered page images are cached under MEDIA_ROOT/PDF_RENDER_SUBDIR and
+# evicted least recently used first past PDF_RENDER_CACHE_MAX_BYTES.
+# Requests rendering at least PDF_RENDER_PARALLEL_MIN_PAGES pages are spread
+# over the PDF_PARALLEL_WORKERS process pool
+PDF_RENDER_SUBDIR = os.getenv("PDF_RENDER_SUBDIR", "renders")
+PDF_RENDER_CACHE_MAX_BYTES = int(
+    os.getenv("PDF_RENDER_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+)
+PDF_RENDER_CACHE_TTL = int(os.getenv("PDF_RENDER_CACHE_TTL", 7 * 24 * 60 * 60))
+PDF_RENDER_DEFAULT_DPI = int(os.getenv("PDF_RENDER_DEFAULT_DPI", 72))
+PDF_RENDER_MAX_DPI = int(os.getenv("PDF_RENDER_MAX_DPI", 300))
+PDF_RENDER_MAX_DIMENSION = int(os.getenv("PDF_RENDER_MAX_DIMENSION", 4096))
+PDF_RENDER_PARALLEL_MIN_PAGES = int(os.getenv("PDF_RENDER_PARALLEL_MIN_PAGES", 8))
+PDF_RENDER_WEBP_QUALITY = int(os.getenv("PDF_RENDER_WEBP_QUALITY", 80))
+
+# BATCH PROCESSING
+# A batch request holds at most PDF_BATCH_PREFETCH documents at once (being
+# downloaded or processed on the PDF_PARALLEL_WORKERS process pool)
+PDF_BATCH_MAX_KEYS = int(os.getenv("PDF_BATCH_MAX_KEYS", 500))
+PDF_BATCH_PREFETCH = int(os.getenv("PDF_BATCH_PREFETCH", 8))
+
+# OCR
+# With `ocr` text extraction OCRs (Tesseract, through PyMuPDF) the pages with
+# fewer than PDF_OCR_MIN_CHARS characters of text whose images cover at least
+# PDF_OCR_MIN_IMAGE_COVERAGE of the page. PDF_OCR_TESSDATA defaults to the
+# TESSDATA_PREFIX environment variable / PyMuPDF's lookup of the install.
+# With a process pool, pages are read up to PDF_OCR_WINDOW pages (default:
+# 4 per worker) ahead of the one being returned so their OCR runs meanwhile
+PDF_OCR_LANGUAGE = os.getenv("PDF_OCR_LANGUAGE", "eng")
+PDF_OCR_DPI = int(os.getenv("PDF_OCR_DPI", 300))
+PDF_OCR_MIN_CHARS = int(os.getenv("PDF_OCR_MIN_CHARS", 16))
+PDF_OCR_MIN_IMAGE_COVERAGE = float(os.getenv("PDF_OCR_MIN_IMAGE_COVERAGE", 0.5))
+PDF_OCR_TESSDATA = os.getenv("PDF_OCR_TESSDATA") or None
+PDF_OCR_WINDOW = int(os.getenv("PDF_OCR_WINDOW", 0))
+
+# RESPONSES
+# API responses render JSON with orjson. Bodies are compressed with the
+# PDF_RESPONSE_ENCODINGS entry the client accepts with the highest q-value
+# (ties in this order; empty disables compression) once they reach
+# PDF_RESPONSE_COMPRESSION_MIN_SIZE bytes; streams are always compressed
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "pdf_tools.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+PDF_RESPONSE_ENCODINGS = os.getenv("PDF_RESPONSE_ENCODINGS", "zstd gzip").split()
+PDF_RESPONSE_COMPRESSION_MIN_SIZE = int(
+    os.getenv("PDF_RESPONSE_COMPRESSION_MIN_SIZE", 1024)
+)
+PDF_RESPONSE_GZIP_LEVEL = int(os.getenv("PDF_RESPONSE_GZIP_LEVEL", 4))
+PDF_RESPONSE_ZSTD_LEVEL = int(os.getenv("PDF_RESPONSE_ZSTD_LEVEL", 3))
+
+# MEDIA JANITOR
+# Files under each PDF_JANITOR_DIRS directory are deleted once older than its
+# TTL (seconds); artifacts and rendered pages expire through their own stores.
+# When media as a whole grows past PDF_MEDIA_MAX_BYTES the oldest files,
+# artifacts and rendered pages go first. Inputs of queued and running jobs are
+# never deleted. Sweeps run every PDF_JANITOR_INTERVAL seconds in
+# `run_pdf_workers` (0 disables) or through `manage.py clean_media`
+PDF_TEMP_TTL = int(os.getenv("PDF_TEMP_TTL", 60 * 60))
+PDF_OUTPUT_TTL = int(os.getenv("PDF_OUTPUT_TTL", 24 * 60 * 60))
+PDF_JANITOR_DIRS = {
+    "temp": PDF_TEMP_TTL,
+    "images": PDF_TEMP_TTL,
+    "output_pages": PDF_OUTPUT_TTL,
+    "compressed_pdfs": PDF_OUTPUT_TTL,
+    "jobs": PDF_TEMP_TTL,
+}
+PDF_MEDIA_MAX_BYTES = int(os.getenv("PDF_MEDIA_MAX_BYTES", 10 * 1024 * 1024 * 1024))
+PDF_JANITOR_INTERVAL = int(os.getenv("PDF_JANITOR_INTERVAL", 5 * 60))
+
+# LOGGING
+# `pdf_tools.requests` writes one JSON line per request with its stage
+# timings, bytes in/out and page counts
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "pdf_tools": {
+            "handlers": ["console"],
+            "level": os.getenv("PDF_LOG_LEVEL", "INFO"),
+        },
+    },
+}
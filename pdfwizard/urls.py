@@ -3,7 +3,10 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from pdf_tools.views import MetricsView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v1/", include("pdf_tools.urls")),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)